@@ -0,0 +1,76 @@
+"""
+Benchmark MQTT payload compression: CPU cost against bytes saved.
+
+Builds notification payloads shaped like the ones `send_mqtt_message` sends
+(title, body and a `data` dict of growing size) and reports, per codec and
+level, the compressed size, the ratio and the time to compress and decompress
+a single payload.
+
+Usage:
+    python benchmarks/compression_benchmark.py [--repeat <n>]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django_emqx.compression import compress, decompress, zstd_installed
+
+PAYLOAD_SIZES = (256, 1024, 4096, 16384, 65536)
+
+
+def build_payload(size, seed=0):
+    """Return a JSON notification payload of roughly `size` bytes."""
+    rng = random.Random(seed)
+    words = ["status", "update", "device", "sensor", "value", "threshold", "alert", "ok", "battery", "signal"]
+    data = {}
+    index = 0
+    while len(json.dumps(data)) < size:
+        data[f"field_{index}"] = {
+            "id": rng.randint(1, 10 ** 6),
+            "label": " ".join(rng.choice(words) for _ in range(4)),
+            "value": round(rng.random() * 100, 3),
+            "token": "%032x" % rng.getrandbits(128),
+        }
+        index += 1
+    payload = {"msg_id": 1, "title": "Sensor update", "body": "New readings are available", "data": data}
+    return json.dumps(payload).encode()
+
+
+def codecs():
+    yield "zlib", 1
+    yield "zlib", 6
+    yield "zlib", 9
+    if zstd_installed:
+        yield "zstd", 1
+        yield "zstd", 3
+        yield "zstd", 9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per measurement.")
+    args = parser.parse_args()
+
+    print(f"{'size':>7} {'codec':>8} {'bytes':>7} {'ratio':>6} {'compress µs':>12} {'decompress µs':>14}")
+    for size in PAYLOAD_SIZES:
+        data = build_payload(size)
+        for codec, level in codecs():
+            compressed = compress(data, codec, level)
+            compress_time = timeit.timeit(lambda data=data, codec=codec, level=level: compress(data, codec, level), number=args.repeat) / args.repeat
+            decompress_time = timeit.timeit(lambda compressed=compressed, codec=codec: decompress(compressed, codec), number=args.repeat) / args.repeat
+            print(
+                f"{len(data):>7} {codec + '-' + str(level):>8} {len(compressed):>7} "
+                f"{len(compressed) / len(data):>6.2f} {compress_time * 1e6:>12.1f} {decompress_time * 1e6:>14.1f}"
+            )
+    if not zstd_installed:
+        print("zstd not benchmarked: install the 'zstandard' package")
+
+
+if __name__ == "__main__":
+    main()
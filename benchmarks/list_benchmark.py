@@ -0,0 +1,86 @@
+"""
+Benchmark the notification and device lists: DRF serializers against the fast path.
+
+Creates one user with `--rows` notifications and devices in an in-memory
+SQLite database and fetches both lists with `EMQX_LIST_FAST_PATH` off and on.
+The responses are checked to be byte-identical before timing.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=tests.settings python benchmarks/list_benchmark.py [--rows <n>] [--repeat <n>]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+import django
+
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from django_emqx.models import EMQXDevice, Message, Notification
+from django_emqx.views import EMQXDeviceViewSet, NotificationViewSet, orjson_installed
+
+
+def populate(rows):
+    user = get_user_model().objects.create_user(username="bench")
+    messages = Message.objects.bulk_create(
+        Message(title=f"Title {i}", body=f"Body of message {i}", created_by=user) for i in range(rows)
+    )
+    now = timezone.now()
+    Notification.objects.bulk_create(
+        Notification(message=message, recipient=user, delivered_at=now) for message in messages
+    )
+    EMQXDevice.objects.bulk_create(
+        EMQXDevice(client_id=f"device-{i}", user=user, active=True, last_connected_at=now) for i in range(rows)
+    )
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="Notifications and devices of the user.")
+    parser.add_argument("--repeat", type=int, default=10, help="Requests per measurement.")
+    args = parser.parse_args()
+
+    connection.creation.create_test_db(verbosity=0)
+    user = populate(args.rows)
+    factory = APIRequestFactory()
+    views = {
+        "notifications": NotificationViewSet.as_view({"get": "list"}),
+        "devices": EMQXDeviceViewSet.as_view({"get": "list"}),
+    }
+
+    def fetch(name):
+        request = factory.get(f"/api/{name}/", {"limit": args.rows} if name == "devices" else {})
+        force_authenticate(request, user=user)
+        response = views[name](request)
+        if hasattr(response, "render"):
+            response.render()
+        return response.content
+
+    print(f"JSON encoder: {'orjson' if orjson_installed else 'json'}, rows: {args.rows}")
+    print(f"{'list':>14} {'DRF ms':>9} {'fast ms':>9} {'speedup':>8}")
+    with override_settings(EMQX_DEVICE_MAX_PAGE_SIZE=args.rows):
+        for name in views:
+            with override_settings(EMQX_LIST_FAST_PATH=False):
+                expected = fetch(name)
+                drf = timeit.timeit(lambda name=name: fetch(name), number=args.repeat) / args.repeat
+            with override_settings(EMQX_LIST_FAST_PATH=True):
+                if fetch(name) != expected:
+                    sys.exit(f"{name}: fast path output differs from the serializer")
+                fast = timeit.timeit(lambda name=name: fetch(name), number=args.repeat) / args.repeat
+            print(f"{name:>14} {drf * 1e3:>9.1f} {fast * 1e3:>9.1f} {drf / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
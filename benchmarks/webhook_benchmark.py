@@ -0,0 +1,67 @@
+"""
+Benchmark the per-request overhead of the device webhook: DRF against the raw view.
+
+Posts a `client.connected` event to `EMQXDeviceViewSet.create` and to
+`device_webhook` through `RequestFactory`. The event handling itself (database
+writes, signals) is replaced by a no-op, so only the framework overhead of
+each path is measured.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=tests.settings python benchmarks/webhook_benchmark.py [--repeat <n>]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import RequestFactory  # noqa: E402
+
+from django_emqx.conf import emqx_settings  # noqa: E402
+from django_emqx.mixins import ClientEventMixin  # noqa: E402
+from django_emqx.views import EMQXDeviceViewSet, device_webhook, orjson_installed  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20000, help="Requests per measurement.")
+    args = parser.parse_args()
+
+    body = json.dumps({"event": "client.connected", "clientid": "bench", "user_id": "1", "ip_address": "10.0.0.1"})
+    factory = RequestFactory()
+    token = str(emqx_settings.EMQX_WEBHOOK_SECRET)
+    drf_view = EMQXDeviceViewSet.as_view({"post": "create"})
+
+    def request():
+        return factory.post("/api/devices/", body, content_type="application/json", HTTP_X_WEBHOOK_TOKEN=token)
+
+    def run_drf():
+        response = drf_view(request())
+        response.render()
+
+    def run_raw():
+        device_webhook(request())
+
+    with patch.object(ClientEventMixin, "handle_webhook_event", return_value=({"status": "success"}, 200)):
+        build = timeit.timeit(request, number=args.repeat) / args.repeat
+        drf = timeit.timeit(run_drf, number=args.repeat) / args.repeat - build
+        raw = timeit.timeit(run_raw, number=args.repeat) / args.repeat - build
+
+    print(f"JSON decoder: {'orjson' if orjson_installed else 'json'}")
+    print(f"{'view':>8} {'µs/request':>11}")
+    print(f"{'DRF':>8} {drf * 1e6:>11.1f}")
+    print(f"{'raw':>8} {raw * 1e6:>11.1f}")
+    print(f"speedup: {drf / raw:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,15 @@ __version__ = "0.1.0"
 
 
 _mqtt_client = None
+_dispatcher = None
+_ack_buffer = None
+_rate_limiter = None
+_scheduler = None
+_signal_dispatcher = None
+_user_cache = None
+_acl_cache = None
+_idempotency_guard = None
+_tracer = None
 
 def get_mqtt_client():
     global _mqtt_client
@@ -11,4 +20,74 @@ def get_mqtt_client():
         from .conf import emqx_settings
         from .mqtt import MQTTClient
         _mqtt_client = MQTTClient(broker=emqx_settings.EMQX_BROKER, port=emqx_settings.EMQX_PORT)
-    return _mqtt_client
\ No newline at end of file
+    return _mqtt_client
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        from .dispatch import NotificationDispatcher
+        _dispatcher = NotificationDispatcher()
+        _dispatcher.start()
+    return _dispatcher
+
+def get_signal_dispatcher():
+    global _signal_dispatcher
+    if _signal_dispatcher is None:
+        from .events import SignalDispatcher
+        _signal_dispatcher = SignalDispatcher()
+    return _signal_dispatcher
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        from .usercache import UserIdCache
+        _user_cache = UserIdCache()
+    return _user_cache
+
+def get_acl_cache():
+    global _acl_cache
+    if _acl_cache is None:
+        from .authz import AclCache
+        _acl_cache = AclCache()
+    return _acl_cache
+
+def get_idempotency_guard():
+    global _idempotency_guard
+    if _idempotency_guard is None:
+        from .idempotency import IdempotencyGuard
+        _idempotency_guard = IdempotencyGuard()
+    return _idempotency_guard
+
+def get_tracer():
+    global _tracer
+    if _tracer is None:
+        from .tracing import build_tracer
+        _tracer = build_tracer()
+    return _tracer
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        from .scheduler import MessageScheduler
+        _scheduler = MessageScheduler()
+        _scheduler.start()
+    return _scheduler
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        from .ratelimit import RateLimiter
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+def get_ack_buffer():
+    global _ack_buffer
+    if _ack_buffer is None:
+        from .acks import ACK_TOPIC, AckBuffer
+        from .conf import emqx_settings
+        _ack_buffer = AckBuffer()
+        _ack_buffer.start()
+        get_mqtt_client().subscribe(
+            ACK_TOPIC, _ack_buffer.handle_message, qos=1, share_group=emqx_settings.EMQX_ACK_SHARE_GROUP
+        )
+    return _ack_buffer
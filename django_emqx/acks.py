@@ -0,0 +1,212 @@
+## django_emqx/acks.py
+
+"""
+MQTT acknowledgement channel.
+
+Clients acknowledge notifications by publishing `{"msg_id": <id>}` (or
+`{"msg_ids": [...]}`) to `ack/{user_id}` over their existing MQTT connection
+instead of sending one HTTPS request per acknowledgement. The backend
+receives the acks through an EMQX shared subscription, so several Django
+instances split the load, buffers them and applies them periodically with
+set-based UPDATEs: one per acknowledged message and group of at most
+`ACK_UPDATE_SIZE` recipients, so no statement exceeds the parameter limits
+of the database. A group that fails `ACK_MAX_ATTEMPTS` flushes in a row is
+dropped instead of being retried forever.
+"""
+
+import json
+import threading
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .conf import emqx_settings
+
+ACK_TOPIC = "ack/+"
+# Recipients per UPDATE, well below SQLite's limit of 999 parameters
+ACK_UPDATE_SIZE = 500
+ACK_MAX_ATTEMPTS = 3
+
+
+def parse_ack(topic, payload):
+    """
+    Extract the user ID and message IDs from an acknowledgement.
+
+    Args:
+        topic (str): The topic the ack was published to, "ack/{user_id}".
+        payload (bytes or str): JSON with "msg_id" or "msg_ids".
+
+    Returns:
+        tuple: (user_id, list of message IDs).
+
+    Raises:
+        ValueError: If the topic or payload is malformed.
+    """
+    prefix, _, user_id = topic.partition("/")
+    if prefix != "ack" or not user_id.isdigit():
+        raise ValueError(f"Invalid ack topic: '{topic}'")
+
+    try:
+        data = json.loads(payload)
+    except (TypeError, ValueError):
+        raise ValueError("Ack payload is not valid JSON")
+    if not isinstance(data, dict):
+        raise ValueError("Ack payload must be a JSON object")
+
+    message_ids = data.get("msg_ids")
+    if message_ids is None and "msg_id" in data:
+        message_ids = [data["msg_id"]]
+    if not isinstance(message_ids, list) or not message_ids:
+        raise ValueError("Ack payload contains no message IDs")
+
+    try:
+        return int(user_id), [int(message_id) for message_id in message_ids]
+    except (TypeError, ValueError):
+        raise ValueError("Ack message IDs must be integers")
+
+
+class AckBuffer:
+    """
+    Collect acknowledgements and apply them to notifications in batches.
+
+    Args:
+        flush_interval (float, optional): Seconds between flushes. Defaults to `EMQX_ACK_FLUSH_INTERVAL`.
+        batch_size (int, optional): Pending acks that trigger an early flush.
+            Defaults to `EMQX_ACK_BATCH_SIZE`.
+    """
+
+    def __init__(self, flush_interval=None, batch_size=None):
+        self.flush_interval = flush_interval or emqx_settings.EMQX_ACK_FLUSH_INTERVAL
+        self.batch_size = batch_size or emqx_settings.EMQX_ACK_BATCH_SIZE
+        self.received = 0
+        self.acknowledged = 0
+        self._pending = {}
+        self._pending_count = 0
+        # message ID -> consecutive failed flushes
+        self._failures = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def add(self, user_id, message_ids):
+        """
+        Buffer acknowledgements of a user.
+
+        Args:
+            user_id (int): The recipient who acknowledged.
+            message_ids (iterable): IDs of the acknowledged messages.
+        """
+        with self._condition:
+            for message_id in message_ids:
+                self._merge(message_id, {user_id})
+                self.received += 1
+            if self._pending_count >= self.batch_size:
+                self._condition.notify()
+
+    def _merge(self, message_id, user_ids):
+        # Callers hold the lock
+        recipients = self._pending.setdefault(message_id, set())
+        before = len(recipients)
+        recipients |= user_ids
+        self._pending_count += len(recipients) - before
+
+    def handle_message(self, client, userdata, message):
+        """
+        MQTT message callback for the ack topic.
+        """
+        try:
+            user_id, message_ids = parse_ack(message.topic, message.payload)
+        except ValueError as e:
+            print(f"❌ Ignoring ack on '{message.topic}': {e}")
+            return
+        self.add(user_id, message_ids)
+
+    def flush(self):
+        """
+        Apply all buffered acknowledgements, one UPDATE per message and group of recipients.
+
+        Failed groups are put back for the next flush; after `ACK_MAX_ATTEMPTS`
+        failures of a message its acks are dropped.
+
+        Returns:
+            int: The number of notifications that were newly acknowledged.
+        """
+        from .models import Notification
+
+        with self._condition:
+            pending, self._pending = self._pending, {}
+            self._pending_count = 0
+        if not pending:
+            return 0
+
+        acknowledged_at = timezone.now()
+        updated = 0
+        for message_id, user_ids in pending.items():
+            user_ids = sorted(user_ids)
+            failed = set()
+            for start in range(0, len(user_ids), ACK_UPDATE_SIZE):
+                group = user_ids[start:start + ACK_UPDATE_SIZE]
+                try:
+                    updated += Notification.objects.filter(
+                        message_id=message_id, recipient_id__in=group, is_acknowledged=False
+                    ).update(is_acknowledged=True, acknowledged_at=acknowledged_at)
+                except Exception as e:
+                    print(f"❌ Failed to apply {len(group)} acks of message {message_id}: {e}")
+                    failed.update(group)
+            self._retry(message_id, failed)
+
+        self.acknowledged += updated
+        return updated
+
+    def _retry(self, message_id, user_ids):
+        with self._condition:
+            if not user_ids:
+                self._failures.pop(message_id, None)
+                return
+            attempts = self._failures.get(message_id, 0) + 1
+            if attempts >= ACK_MAX_ATTEMPTS:
+                print(f"❌ Dropping {len(user_ids)} acks of message {message_id} after {attempts} failed flushes")
+                self._failures.pop(message_id, None)
+                return
+            self._failures[message_id] = attempts
+            # Acks are idempotent, so putting them back is safe
+            self._merge(message_id, user_ids)
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    if not self._stopping and self._pending_count < self.batch_size:
+                        self._condition.wait(self.flush_interval)
+                    stopping = self._stopping
+                close_old_connections()
+                self.flush()
+                if stopping:
+                    break
+        finally:
+            close_old_connections()
+
+    def start(self):
+        """
+        Start the background flush thread (idempotent).
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="emqx-ack-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the flush thread after a final flush.
+
+        Args:
+            timeout (float, optional): Maximum time to wait for the thread.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -1,9 +1,93 @@
+## django_emqx/admin.py
+
+"""
+Admin pages for the EMQX models.
+
+The device, message and notification tables can grow to millions of rows, so
+the change lists avoid per-row queries (`list_select_related`), never count the
+whole table (`show_full_result_count = False` and `EstimatedCountPaginator`),
+render foreign keys as raw ID inputs instead of loading all choices, and only
+filter and search on indexed columns.
+
+Searches use case-sensitive `exact` and `startswith` lookups: the admin's
+`=` and `^` prefixes compare `UPPER()` of the column on PostgreSQL, which no
+plain index serves. Prefix lookups on PostgreSQL are served by the
+`varchar_pattern_ops` indexes Django creates for indexed `CharField`s and the
+ones declared on `Message`.
+"""
+
 from django.contrib import admin
-from .models import EMQXDevice, Message, Notification
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+from .models import ArchivedEMQXDevice, BulkSendJob, EMQXDevice, EMQXSubscription, Message, Notification
+
+# Below this many rows the exact count is cheap enough
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """
+    Estimate the number of rows of an unfiltered queryset from table statistics.
+
+    Args:
+        queryset (QuerySet): The queryset to count.
+
+    Returns:
+        int or None: The estimate, or None if the queryset is filtered or the
+            database keeps no usable statistics.
+    """
+    if queryset.query.where:
+        return None
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+        params = [connection.ops.quote_name(table)]
+    elif connection.vendor == "mysql":
+        sql = "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s"
+        params = [table]
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables that were never analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes the row count of large unfiltered tables from table
+    statistics instead of running COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables with millions of rows.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(EMQXDevice)
-class EMQXDeviceAdmin(admin.ModelAdmin):
+class EMQXDeviceAdmin(LargeTableAdmin):
     list_display = (
         "client_id",
         "user",
@@ -14,25 +98,73 @@ class EMQXDeviceAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = ("active", "last_status", "created_at")
-    search_fields = ("client_id", "user__username", "ip_address")
+    search_fields = ("client_id__startswith", "user__username__exact")
     readonly_fields = ("created_at", "last_connected_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+
+
+@admin.register(EMQXSubscription)
+class EMQXSubscriptionAdmin(LargeTableAdmin):
+    list_display = (
+        "device",
+        "topic",
+        "qos",
+        "created_at",
+    )
+    search_fields = ("topic__startswith", "device__client_id__exact")
+    list_select_related = ("device",)
+    raw_id_fields = ("device",)
+    readonly_fields = ("created_at",)
+
+
+@admin.register(ArchivedEMQXDevice)
+class ArchivedEMQXDeviceAdmin(LargeTableAdmin):
+    list_display = (
+        "client_id",
+        "user",
+        "last_connected_at",
+        "archived_at",
+    )
+    search_fields = ("client_id__startswith", "user__username__exact")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    readonly_fields = ("archived_at",)
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(LargeTableAdmin):
     list_display = (
         "title",
         "topic",
         "created_by",
         "created_at",
     )
-    search_fields = ("title", "topic", "body", "created_by__username")
+    # Prefix and exact lookups instead of `icontains` scans over `body`; on
+    # PostgreSQL `get_search_results` uses the full-text index instead
+    search_fields = ("title__startswith", "topic__exact", "created_by__username__exact")
     list_filter = ("created_at",)
     readonly_fields = ("created_at",)
+    date_hierarchy = "created_at"
+    list_select_related = ("created_by",)
+    raw_id_fields = ("created_by",)
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and connections[queryset.db].vendor == "postgresql":
+            # Same expression as the `message_search_idx` GIN index
+            table = connections[queryset.db].ops.quote_name(Message._meta.db_table)
+            condition = RawSQL(
+                f"to_tsvector('simple', coalesce({table}.title, '') || ' ' || coalesce({table}.body, ''))"
+                " @@ plainto_tsquery('simple', %s)",
+                [search_term],
+                output_field=BooleanField(),
+            )
+            return queryset.filter(condition), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdmin):
     list_display = (
         "recipient",
         "message",
@@ -41,5 +173,27 @@ class NotificationAdmin(admin.ModelAdmin):
         "acknowledged_at",
     )
     list_filter = ("is_acknowledged", "delivered_at")
-    search_fields = ("recipient__username", "message__title", "message__topic")
+    # Joins are driven by the indexed username, title and topic columns
+    search_fields = ("recipient__username__exact", "message__title__startswith", "message__topic__exact")
     readonly_fields = ("delivered_at", "acknowledged_at")
+    date_hierarchy = "delivered_at"
+    # `Notification.__str__` and the list columns read the recipient and message
+    list_select_related = ("recipient", "message")
+    raw_id_fields = ("recipient", "message")
+
+
+@admin.register(BulkSendJob)
+class BulkSendJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "message",
+        "status",
+        "resolved",
+        "delivered",
+        "failed",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("status",)
+    list_select_related = ("message",)
+    raw_id_fields = ("message", "created_by")
+    readonly_fields = ("resolved", "delivered", "failed", "created_at", "finished_at")
@@ -7,3 +7,24 @@ class DjangoEMQXConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'django_emqx'
     verbose_name = "Django EMQX"
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import m2m_changed, post_delete, post_save
+
+        from .authz import invalidate_user_acl
+        from .usercache import invalidate_user
+
+        # Keep the caches of valid user IDs and ACLs in sync with the user table
+        user_model = get_user_model()
+        post_save.connect(invalidate_user, sender=user_model, dispatch_uid="django_emqx_user_saved")
+        post_delete.connect(invalidate_user, sender=user_model, dispatch_uid="django_emqx_user_deleted")
+
+        # Custom ACL functions may depend on groups and permissions
+        if hasattr(user_model, "groups"):
+            from django.contrib.auth.models import Group
+
+            for relation in (user_model.groups, user_model.user_permissions, Group.permissions):
+                m2m_changed.connect(
+                    invalidate_user_acl, sender=relation.through, dispatch_uid=f"django_emqx_acl_{relation.through.__name__}"
+                )
@@ -0,0 +1,158 @@
+## django_emqx/authz.py
+
+"""
+EMQX HTTP authorization.
+
+With `EMQX_AUTHZ_ENABLED`, access tokens carry no ACL claims and EMQX asks
+the authorization endpoint whether a client may publish or subscribe to a
+topic. Changing a user's rules therefore takes effect without a new token or
+reconnect. Each user's rules are compiled once per action and kept in an LRU
+cache with a short TTL, so authorization checks do not hit the database; the
+cache is evicted when the user or their groups and permissions change. EMQX
+additionally caches decisions per client for `EMQX_AUTHZ_BROKER_CACHE_TTL`.
+"""
+
+from django.contrib.auth import get_user_model
+from django.utils.module_loading import import_string
+
+from .conf import emqx_settings
+from .topics import topic_matches
+from .usercache import LRUCache
+
+ACTIONS = ("publish", "subscribe")
+
+
+class CompiledACL:
+    """
+    ACL rules of one user, pre-split by action.
+
+    Args:
+        rules (list): Rules with "permission", "action" ("publish", "subscribe" or "all")
+            and "topic" (or "topics"), in the order EMQX applies them.
+        default (str, optional): Result if no rule matches. Defaults to "ignore",
+            i.e. EMQX's `no_match` setting decides.
+    """
+
+    __slots__ = ("rules", "default")
+
+    def __init__(self, rules, default="ignore"):
+        self.rules = {action: [] for action in ACTIONS}
+        self.default = default
+        for rule in rules:
+            action = rule.get("action", "all")
+            topics = rule.get("topics") or [rule["topic"]]
+            for name in ACTIONS if action == "all" else (action,):
+                self.rules[name].extend((rule["permission"], topic) for topic in topics)
+
+    def check(self, action, topic):
+        """
+        Decide whether an action on a topic is allowed.
+
+        Args:
+            action (str): "publish" or "subscribe".
+            topic (str): The topic (or topic filter for subscriptions).
+
+        Returns:
+            str: "allow", "deny" or the default result.
+        """
+        for permission, topic_filter in self.rules.get(action, ()):
+            # Wildcards of a subscribed filter only match the same wildcards in a rule
+            if topic_filter == topic or topic_matches(topic_filter, topic):
+                return permission
+        return self.default
+
+
+DENY_ALL = CompiledACL([], default="deny")
+
+
+def load_acl(user_id):
+    """
+    Load and compile the ACL of a user.
+
+    Rules come from the callable named by `EMQX_AUTHZ_ACL_FUNCTION`, called with
+    the user, or from `get_mqtt_acl`. Missing and inactive users are denied everything.
+
+    Args:
+        user_id (int): The user's primary key.
+
+    Returns:
+        CompiledACL: The compiled rules.
+    """
+    from .utils import get_mqtt_acl
+
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None or not getattr(user, "is_active", True):
+        return DENY_ALL
+
+    path = emqx_settings.EMQX_AUTHZ_ACL_FUNCTION
+    acl_function = import_string(path) if path else get_mqtt_acl
+    return CompiledACL(acl_function(user))
+
+
+class AclCache(LRUCache):
+    """
+    LRU/TTL cache of compiled per-user ACLs.
+
+    Args:
+        maxsize (int, optional): Maximum number of cached users. Defaults to `EMQX_AUTHZ_CACHE_SIZE`.
+        ttl (float, optional): Seconds an ACL stays cached. Defaults to `EMQX_AUTHZ_CACHE_TTL`.
+        loader (callable, optional): Returns the `CompiledACL` of a user ID. Defaults to `load_acl`.
+        clock (callable, optional): Returns the current time in seconds.
+    """
+
+    def __init__(self, maxsize=None, ttl=None, loader=None, clock=None):
+        super().__init__(
+            emqx_settings.EMQX_AUTHZ_CACHE_SIZE if maxsize is None else maxsize,
+            emqx_settings.EMQX_AUTHZ_CACHE_TTL if ttl is None else ttl,
+            clock,
+        )
+        self.loader = loader or load_acl
+
+    def authorize(self, username, action, topic):
+        """
+        Decide an EMQX authorization request.
+
+        Args:
+            username (str): The MQTT username, i.e. the user ID or "backend".
+            action (str): "publish" or "subscribe".
+            topic (str): The topic or topic filter.
+
+        Returns:
+            str: "allow", "deny" or "ignore".
+        """
+        if username == "backend":
+            return "allow"
+        if not username or not username.isdigit() or action not in ACTIONS:
+            return "deny"
+
+        user_id = int(username)
+        acl = self.get(user_id)
+        if acl is None:
+            self.misses += 1
+            acl = self.loader(user_id)
+            self.set(user_id, acl)
+        else:
+            self.hits += 1
+        return acl.check(action, topic)
+
+
+def invalidate_user_acl(sender, instance, action, pk_set, **kwargs):
+    """
+    Receiver for `m2m_changed` of users' groups and permissions, and of group permissions.
+    """
+    from django.contrib.auth.models import Group
+
+    from . import get_acl_cache
+
+    if not action.startswith("post_"):
+        return
+    cache = get_acl_cache()
+    if isinstance(instance, get_user_model()):
+        cache.discard(instance.pk)
+    elif sender is Group.permissions.through or not pk_set:
+        # A group's permissions changed, which may affect any of its members
+        cache.clear()
+    else:
+        # Users were added to or removed from a group or permission
+        for user_id in pk_set:
+            cache.discard(user_id)
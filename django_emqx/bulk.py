@@ -0,0 +1,275 @@
+## django_emqx/bulk.py
+
+"""
+Bulk sends of one message to a server-side audience.
+
+Instead of loading users and looping over them, callers describe the
+audience: explicit user IDs, a group, or a named filter registered in
+`EMQX_BULK_AUDIENCES`. `send_bulk` validates the audience, stores the message
+and a `BulkSendJob` and returns right away. The recipients are resolved
+page by page with keyset queries in a background thread, or in the dispatcher
+workers if `EMQX_DISPATCH_ENABLED`, and delivered chunk by chunk while the
+job's progress counters are updated.
+"""
+
+import threading
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .conf import emqx_settings
+
+
+class AudienceError(ValueError):
+    """
+    Raised when an audience spec is malformed or names an unknown filter.
+    """
+
+
+class AudienceIterator:
+    """
+    Iterate over user IDs in ascending order with one keyset query per page.
+
+    Each page is fetched with `pk__gt=<last ID>` by the thread that asks for
+    it, so no database cursor stays open between pages or is shared by the
+    dispatcher workers that take a job's chunks one after another.
+
+    Args:
+        users (QuerySet): The users of the audience.
+        page_size (int, optional): IDs per query. Defaults to `EMQX_DISPATCH_CHUNK_SIZE`.
+    """
+
+    def __init__(self, users, page_size=None):
+        self.user_ids = users.order_by("pk").values_list("pk", flat=True)
+        self.page_size = page_size or emqx_settings.EMQX_DISPATCH_CHUNK_SIZE
+        self._page = []
+        self._index = 0
+        self._last_id = None
+        self._exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._index == len(self._page):
+            if self._exhausted:
+                raise StopIteration
+            user_ids = self.user_ids if self._last_id is None else self.user_ids.filter(pk__gt=self._last_id)
+            self._page = list(user_ids[:self.page_size])
+            self._index = 0
+            self._exhausted = len(self._page) < self.page_size
+            if not self._page:
+                raise StopIteration
+            self._last_id = self._page[-1]
+        user_id = self._page[self._index]
+        self._index += 1
+        return user_id
+
+
+def resolve_audience(audience):
+    """
+    Turn an audience spec into a lazy iterator of the IDs of active users.
+
+    Exactly one of these keys selects the users:
+
+    - "user_ids": a list of user IDs,
+    - "group": the name of a group,
+    - "filter": the name of an `EMQX_BULK_AUDIENCES` entry, called with the optional "params".
+
+    Args:
+        audience (dict): The audience spec.
+
+    Returns:
+        AudienceIterator: User IDs in ascending order; no query runs before the first ID is requested.
+
+    Raises:
+        AudienceError: If the spec is invalid.
+    """
+    User = get_user_model()
+    if not isinstance(audience, dict):
+        raise AudienceError("The audience must be an object")
+    selectors = [key for key in ("user_ids", "group", "filter") if key in audience]
+    if len(selectors) != 1:
+        raise AudienceError("The audience needs exactly one of 'user_ids', 'group' or 'filter'")
+
+    if "user_ids" in audience:
+        user_ids = audience["user_ids"]
+        if not isinstance(user_ids, list) or not all(
+            isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in user_ids
+        ):
+            raise AudienceError("'user_ids' must be a list of integers")
+        users = User.objects.filter(pk__in=user_ids)
+    elif "group" in audience:
+        if not isinstance(audience["group"], str) or not audience["group"]:
+            raise AudienceError("'group' must be a group name")
+        if not any(field.name == "groups" for field in User._meta.get_fields()):
+            raise AudienceError("The user model has no groups")
+        users = User.objects.filter(groups__name=audience["group"])
+    else:
+        name = audience["filter"]
+        path = emqx_settings.EMQX_BULK_AUDIENCES.get(name) if isinstance(name, str) else None
+        if path is None:
+            raise AudienceError(f"Unknown audience filter: '{name}'")
+        params = audience.get("params") or {}
+        if not isinstance(params, dict):
+            raise AudienceError("'params' must be an object")
+        try:
+            users = import_string(path)(**params)
+        except TypeError as e:
+            raise AudienceError(f"Invalid params for audience filter '{name}': {e}")
+
+    if any(field.name == "is_active" for field in User._meta.get_fields()):
+        users = users.filter(is_active=True)
+    return AudienceIterator(users)
+
+
+def record_progress(job_pk, message, resolved, delivered, failed, done):
+    """
+    Add one chunk's counts to a `BulkSendJob` and set its status.
+
+    The dispatcher reports `done` only with the last chunk of a job to finish,
+    so every resolved recipient has been delivered, failed or collapsed by
+    then. A job that is already done or expired keeps its status; only the
+    counters change.
+
+    Args:
+        job_pk (int): The job's primary key.
+        message (Message): The message being sent.
+        resolved (int): Recipients taken from the audience.
+        delivered (int): Recipients delivered to.
+        failed (int): Recipients whose delivery failed.
+        done (bool): Whether the audience is exhausted.
+    """
+    from .models import BulkSendJob
+
+    jobs = BulkSendJob.objects.filter(pk=job_pk)
+    jobs.update(
+        resolved=F("resolved") + resolved,
+        delivered=F("delivered") + delivered,
+        failed=F("failed") + failed,
+    )
+    pending = jobs.exclude(status__in=(BulkSendJob.STATUS_DONE, BulkSendJob.STATUS_EXPIRED))
+    if done:
+        status = BulkSendJob.STATUS_EXPIRED if message.is_expired else BulkSendJob.STATUS_DONE
+        pending.update(status=status, finished_at=timezone.now())
+    else:
+        pending.exclude(status=BulkSendJob.STATUS_RUNNING).update(status=BulkSendJob.STATUS_RUNNING)
+
+
+def run_bulk_job(job_pk, message, recipient_ids, chunk_size=None):
+    """
+    Deliver a bulk send chunk by chunk in the calling thread.
+
+    Used when the dispatcher is disabled; stops early once the message expires.
+
+    Args:
+        job_pk (int): The job's primary key.
+        message (Message): The message to send.
+        recipient_ids (iterator): User IDs of the recipients.
+        chunk_size (int, optional): Recipients per chunk. Defaults to `EMQX_DISPATCH_CHUNK_SIZE`.
+    """
+    from .mixins import NotificationSenderMixin
+
+    sender = NotificationSenderMixin()
+    chunk_size = chunk_size or emqx_settings.EMQX_DISPATCH_CHUNK_SIZE
+    while True:
+        if message.is_expired:
+            record_progress(job_pk, message, 0, 0, 0, True)
+            return
+        chunk = list(islice(recipient_ids, chunk_size))
+        done = len(chunk) < chunk_size
+        delivered = failed = 0
+        if chunk:
+            try:
+                sender.send_notification_chunk(message, chunk)
+                delivered = len(chunk)
+            except Exception as e:
+                print(f"❌ Failed to deliver message {message.pk} to {len(chunk)} recipients: {e}")
+                failed = len(chunk)
+        record_progress(job_pk, message, len(chunk), delivered, failed, done)
+        if done:
+            return
+
+
+def _run_in_thread(job_pk, message, recipient_ids):
+    try:
+        run_bulk_job(job_pk, message, recipient_ids)
+    except Exception as e:
+        print(f"❌ Bulk send {job_pk} failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def _submit_in_thread(job_pk, message, recipient_ids, on_progress):
+    from . import get_dispatcher
+
+    try:
+        get_dispatcher().submit(message, recipient_ids, on_progress=on_progress)
+    except Exception as e:
+        print(f"❌ Bulk send {job_pk} failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def start_bulk_job(job, recipient_ids):
+    """
+    Hand a stored job to the dispatcher or a background thread.
+
+    Args:
+        job (BulkSendJob): The job.
+        recipient_ids (iterator): User IDs of the recipients.
+    """
+    message = job.message
+    if emqx_settings.EMQX_DISPATCH_ENABLED:
+        from . import get_dispatcher
+
+        def on_progress(resolved, delivered, failed, done):
+            record_progress(job.pk, message, resolved, delivered, failed, done)
+
+        if not message.collapse_key:
+            get_dispatcher().submit(message, recipient_ids, on_progress=on_progress)
+            return
+        # The dispatcher resolves all recipients of a collapsing message on submit,
+        # so keep that off the caller
+        thread = threading.Thread(
+            target=_submit_in_thread, args=(job.pk, message, recipient_ids, on_progress),
+            name=f"emqx-bulk-{job.pk}", daemon=True,
+        )
+        thread.start()
+        return
+
+    thread = threading.Thread(
+        target=_run_in_thread, args=(job.pk, message, recipient_ids), name=f"emqx-bulk-{job.pk}", daemon=True
+    )
+    thread.start()
+
+
+def send_bulk(message, audience, created_by=None):
+    """
+    Send a message to an audience in the background.
+
+    The audience is validated here; recipients are resolved and delivered once
+    the current transaction commits, so the call itself does not depend on the
+    audience size.
+
+    Args:
+        message (Message): A saved message.
+        audience (dict): The audience spec, see `resolve_audience`.
+        created_by (User, optional): The user who started the send.
+
+    Returns:
+        BulkSendJob: The job whose counters report the progress.
+
+    Raises:
+        AudienceError: If the audience spec is invalid.
+    """
+    from .models import BulkSendJob
+
+    recipient_ids = resolve_audience(audience)
+    job = BulkSendJob.objects.create(message=message, audience=audience, created_by=created_by)
+    transaction.on_commit(lambda: start_bulk_job(job, recipient_ids))
+    return job
@@ -0,0 +1,102 @@
+## django_emqx/compression.py
+
+"""
+Optional compression of MQTT payloads.
+
+Payloads at or above a size threshold are compressed with zlib or, if the
+`zstandard` package is installed, zstd. Compression is skipped whenever it
+would not make the payload smaller. See `benchmarks/compression_benchmark.py`
+for CPU cost against bytes saved at typical payload sizes.
+"""
+
+import zlib
+
+try:
+    import zstandard
+    zstd_installed = True
+except ImportError:
+    zstd_installed = False
+
+CODECS = ("zlib", "zstd")
+
+
+def resolve_codec(codec):
+    """
+    Return the codec that is actually used for the requested one.
+
+    Args:
+        codec (str): "zlib" or "zstd".
+
+    Returns:
+        str: The requested codec, or "zlib" if zstd is requested but not installed.
+
+    Raises:
+        ValueError: If the codec is unknown.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec: '{codec}'")
+    if codec == "zstd" and not zstd_installed:
+        return "zlib"
+    return codec
+
+
+def compress(data, codec="zlib", level=None):
+    """
+    Compress bytes with the given codec.
+
+    Args:
+        data (bytes): The data to compress.
+        codec (str, optional): "zlib" or "zstd". Defaults to "zlib".
+        level (int, optional): The compression level. Defaults to the codec's default.
+
+    Returns:
+        bytes: The compressed data.
+    """
+    codec = resolve_codec(codec)
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor() if level is None else zstandard.ZstdCompressor(level=level)
+        return compressor.compress(data)
+    return zlib.compress(data, -1 if level is None else level)
+
+
+def decompress(data, codec):
+    """
+    Decompress bytes produced by `compress`.
+
+    Args:
+        data (bytes): The compressed data.
+        codec (str): The codec the data was compressed with.
+
+    Returns:
+        bytes: The original data.
+    """
+    if codec == "zstd":
+        if not zstd_installed:
+            raise ValueError("zstd payloads require the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown compression codec: '{codec}'")
+
+
+def maybe_compress(data, threshold, codec="zlib", level=None):
+    """
+    Compress data if it is at least `threshold` bytes and compression pays off.
+
+    Args:
+        data (bytes): The payload.
+        threshold (int or None): Minimum size in bytes; None disables compression.
+        codec (str, optional): "zlib" or "zstd". Defaults to "zlib".
+        level (int, optional): The compression level.
+
+    Returns:
+        tuple: (payload, codec) where codec is None if the payload was left uncompressed.
+    """
+    if threshold is None or len(data) < threshold:
+        return data, None
+
+    codec = resolve_codec(codec)
+    compressed = compress(data, codec, level)
+    if len(compressed) >= len(data):
+        return data, None
+    return compressed, codec
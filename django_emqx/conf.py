@@ -24,9 +24,108 @@ Settings:
         Default is 10.
     EMQX_RETRY_DELAY (int): Delay in seconds between retry attempts for starting up 'MQTTClient'.
         Default is 3 seconds.
+    EMQX_API_URL (str or None): Root of the EMQX v5 REST API, used by `reconcile_emqx_presence`.
+        Default is None (http://<EMQX_BROKER>:18083/api/v5).
+    EMQX_API_KEY (str or None): EMQX API key. Default is None.
+    EMQX_API_SECRET (str or None): EMQX API secret. Default is None.
     EMQX_TLS_ENABLED (bool): Whether TLS is enabled for the EMQX connection. Default is False.
     EMQX_TLS_CA_CERTS (str or None): Path to the CA certificates file for TLS verification.
         Default is None (no verification).
+    EMQX_DEVICE_PAGE_SIZE (int): Default number of devices returned per page by the device list.
+        Default is 100.
+    EMQX_DEVICE_MAX_PAGE_SIZE (int): Upper bound for the `limit` query parameter of the device list.
+        Default is 1000.
+    EMQX_MQTT_V5 (bool): Whether the backend `MQTTClient` connects with MQTT v5 (topic aliases,
+        user properties, message expiry). Falls back to MQTT 3.1.1 if the broker refuses. Default is False.
+    EMQX_MQTT_SESSION_EXPIRY_INTERVAL (int): MQTT v5 session expiry interval in seconds requested
+        by the backend client. Default is 0 (session ends with the connection).
+    EMQX_MQTT_TOPIC_ALIAS_MAXIMUM (int): Upper bound for the number of MQTT v5 topic aliases the
+        backend client uses (the broker's limit applies as well). Default is 1024.
+    EMQX_COMPRESSION_THRESHOLD (int or None): MQTT payloads of at least this many bytes are compressed.
+        Default is None (no compression).
+    EMQX_COMPRESSION_CODEC (str): "zlib" or "zstd" (requires the `zstandard` package, otherwise
+        zlib is used). Default is "zlib".
+    EMQX_COMPRESSION_LEVEL (int or None): Compression level. Default is None (codec default).
+    EMQX_ACK_ENABLED (bool): Whether clients may acknowledge notifications by publishing to
+        `ack/{user_id}` and the backend consumes these acks. Default is False.
+    EMQX_ACK_SHARE_GROUP (str): EMQX shared subscription group the backend instances consume acks
+        with. Default is "django_emqx".
+    EMQX_ACK_FLUSH_INTERVAL (float): Seconds between batched ack UPDATEs. Default is 1.0.
+    EMQX_ACK_BATCH_SIZE (int): Number of buffered acks that triggers an early flush. Default is 1000.
+    EMQX_RATE_LIMIT_ENABLED (bool): Whether MQTT publishes are rate limited by token buckets.
+        Default is False.
+    EMQX_RATE_LIMIT_PER_RECIPIENT (dict or None): Refill `rate` (tokens per second) and `burst`
+        (capacity) of each recipient's bucket; `rate` must be above 0 and `burst` at least 1.
+        Default is {"rate": 1, "burst": 10}.
+    EMQX_RATE_LIMIT_GLOBAL (dict or None): Refill `rate` and `burst` of the bucket shared by all
+        publishes. Default is {"rate": 1000, "burst": 2000}.
+    EMQX_RATE_LIMIT_POLICY (str): What happens to a throttled publish: "delay", "drop" or "coalesce"
+        (only the newest message per recipient is published later). Default is "delay".
+    EMQX_RATE_LIMIT_MAX_DELAY (float): Longest wait in seconds of the "delay" policy before the
+        publish is dropped. Default is 5.0.
+    EMQX_RATE_LIMIT_CACHE (str or None): Name of a Django cache holding the buckets, so that all
+        processes share them. Default is None (buckets in process memory).
+    EMQX_COLLAPSE_RETAINED (bool): Whether messages with a `collapse_key` are published as retained
+        messages to `user/{user_id}/collapse/{collapse_key}`, so the broker keeps only the latest
+        one per key. Default is False (published to the user topic like other messages).
+    EMQX_SCHEDULER_ENABLED (bool): Whether this process runs the `MessageScheduler` that delivers
+        messages with a future `send_at`. Alternatively run `python manage.py run_message_scheduler`.
+        Default is False.
+    EMQX_SCHEDULER_WINDOW (float): Seconds of upcoming scheduled messages the scheduler loads per
+        database query. Default is 60.
+    EMQX_SIGNAL_DISPATCH (str): How device signals are sent from the webhook: "sync" (inline) or
+        "async" (on a bounded thread pool after the transaction commits). Default is "sync".
+    EMQX_SIGNAL_WORKERS (int): Threads of the "async" signal pool. Default is 4.
+    EMQX_SIGNAL_QUEUE_SIZE (int): Signals that may wait for the pool before receivers run inline
+        again. Default is 1000.
+    EMQX_SIGNAL_BATCH_SIZE (int): Collected events that trigger an early batch signal. Default is 500.
+    EMQX_SIGNAL_BATCH_INTERVAL (float): Seconds between batch signals. Default is 1.0.
+    EMQX_WEBHOOK_FAST_PATH (bool): Whether webhook events posted to the device list URL are handled by a
+        plain Django view instead of DRF (read when the URLconf is loaded). Default is False.
+    EMQX_WEBHOOK_MAX_BODY_SIZE (int): Largest webhook body in bytes the fast path accepts.
+        Default is 65536.
+    EMQX_LIST_FAST_PATH (bool): Whether the notification and device lists are rendered from `values()`
+        rows with precompiled field conversions instead of the DRF serializers. Same JSON output.
+        Default is False.
+    EMQX_USER_CACHE_SIZE (int): Number of valid user IDs the webhook keeps in its LRU cache instead
+        of querying the user table per event; 0 disables the cache. Default is 10000.
+    EMQX_USER_CACHE_TTL (float): Seconds a cached user ID stays valid. Default is 300.
+    EMQX_IDEMPOTENCY_WINDOW (float): Seconds a webhook `event_id` is remembered to drop retried
+        events. Default is 300.
+    EMQX_IDEMPOTENCY_CACHE_SIZE (int): Event IDs remembered per process. Default is 100000.
+    EMQX_IDEMPOTENCY_CACHE (str or None): Alias of a Django cache (e.g. Redis) shared by all
+        processes for deduplication; None keeps the window per process. Default is None.
+    EMQX_TRACING_ENABLED (bool): Whether spans are recorded for webhook requests, notification chunks,
+        MQTT publishes and Firebase calls. Default is False.
+    EMQX_TRACING_BACKEND (str): "builtin" or "opentelemetry" (requires `opentelemetry-api`; sampling and
+        export are then configured with the OpenTelemetry SDK). Default is "builtin".
+    EMQX_TRACING_SAMPLE_RATE (float): Probability that the builtin tracer records a new trace; spans
+        continuing a trace follow its decision. Default is 1.0.
+    EMQX_TRACING_EXPORTER (str or None): Dotted path of a class or factory creating the builtin tracer's
+        exporter, a callable receiving each finished span. Default is None (`InMemoryExporter`).
+    EMQX_AUTHZ_ENABLED (bool): Whether EMQX asks the authorization endpoint (`authz/`) for publish and
+        subscribe permissions instead of reading ACL claims from the access token. `generate_emqx_config`
+        then emits the matching HTTP authorization source. Default is False.
+    EMQX_AUTHZ_ACL_FUNCTION (str or None): Dotted path of a callable returning a user's ACL rules in
+        EMQX's format. Default is None (the rules of `get_mqtt_acl`).
+    EMQX_AUTHZ_CACHE_SIZE (int): Number of users whose compiled ACLs are cached. Default is 10000.
+    EMQX_AUTHZ_CACHE_TTL (float): Seconds a compiled ACL stays cached. Default is 30.
+    EMQX_AUTHZ_BROKER_CACHE_TTL (int): Seconds EMQX caches authorization decisions per client, the
+        upper bound for how long a revoked permission is still applied. Default is 60.
+    EMQX_TEMPLATE_FIELDS (list): User model fields personalized message templates may refer to.
+        Default is ["username", "first_name", "last_name"].
+    EMQX_BULK_AUDIENCES (dict): Named server-side audiences for bulk sends, mapping a name to the dotted
+        path of a callable that takes the audience's `params` as keyword arguments and returns a user
+        queryset. Default is {}.
+    EMQX_DISPATCH_ENABLED (bool): Whether `send_all_notifications` hands messages to the background
+        `NotificationDispatcher` instead of sending them inline. Default is False.
+    EMQX_DISPATCH_WORKERS (int): Number of dispatcher worker threads. Default is 4.
+    EMQX_DISPATCH_CHUNK_SIZE (int): Number of recipients delivered per unit of dispatcher work.
+        Default is 500.
+    EMQX_DISPATCH_WEIGHTS (dict): Weighted fair scheduling share of each priority lane.
+        Default is {"critical": 8, "normal": 3, "bulk": 1}.
+    EMQX_DISPATCH_RESERVED_WORKERS (dict): Workers kept free for a lane and all lanes above it, i.e.
+        lower lanes may never occupy them. Default is {"critical": 1, "normal": 1}.
 
 To override any of these settings, define them in your Django project's `settings.py`.
 Access settings via `emqx_settings.<SETTING_NAME>`.
@@ -40,8 +139,61 @@ DEFAULTS = {
     'EMQX_NODE_COOKIE': settings.SECRET_KEY,
     'EMQX_MAX_RETRIES': 10,
     'EMQX_RETRY_DELAY': 3,
+    'EMQX_API_URL': None,
+    'EMQX_API_KEY': None,
+    'EMQX_API_SECRET': None,
     'EMQX_TLS_ENABLED': False,
     'EMQX_TLS_CA_CERTS': None,
+    'EMQX_DEVICE_PAGE_SIZE': 100,
+    'EMQX_DEVICE_MAX_PAGE_SIZE': 1000,
+    'EMQX_MQTT_V5': False,
+    'EMQX_MQTT_SESSION_EXPIRY_INTERVAL': 0,
+    'EMQX_MQTT_TOPIC_ALIAS_MAXIMUM': 1024,
+    'EMQX_COMPRESSION_THRESHOLD': None,
+    'EMQX_COMPRESSION_CODEC': "zlib",
+    'EMQX_COMPRESSION_LEVEL': None,
+    'EMQX_ACK_ENABLED': False,
+    'EMQX_ACK_SHARE_GROUP': "django_emqx",
+    'EMQX_ACK_FLUSH_INTERVAL': 1.0,
+    'EMQX_ACK_BATCH_SIZE': 1000,
+    'EMQX_RATE_LIMIT_ENABLED': False,
+    'EMQX_RATE_LIMIT_PER_RECIPIENT': {"rate": 1, "burst": 10},
+    'EMQX_RATE_LIMIT_GLOBAL': {"rate": 1000, "burst": 2000},
+    'EMQX_RATE_LIMIT_POLICY': "delay",
+    'EMQX_RATE_LIMIT_MAX_DELAY': 5.0,
+    'EMQX_RATE_LIMIT_CACHE': None,
+    'EMQX_COLLAPSE_RETAINED': False,
+    'EMQX_SCHEDULER_ENABLED': False,
+    'EMQX_SCHEDULER_WINDOW': 60,
+    'EMQX_SIGNAL_DISPATCH': "sync",
+    'EMQX_SIGNAL_WORKERS': 4,
+    'EMQX_SIGNAL_QUEUE_SIZE': 1000,
+    'EMQX_SIGNAL_BATCH_SIZE': 500,
+    'EMQX_SIGNAL_BATCH_INTERVAL': 1.0,
+    'EMQX_WEBHOOK_FAST_PATH': False,
+    'EMQX_WEBHOOK_MAX_BODY_SIZE': 65536,
+    'EMQX_LIST_FAST_PATH': False,
+    'EMQX_USER_CACHE_SIZE': 10000,
+    'EMQX_USER_CACHE_TTL': 300,
+    'EMQX_IDEMPOTENCY_WINDOW': 300,
+    'EMQX_IDEMPOTENCY_CACHE_SIZE': 100000,
+    'EMQX_IDEMPOTENCY_CACHE': None,
+    'EMQX_TRACING_ENABLED': False,
+    'EMQX_TRACING_BACKEND': "builtin",
+    'EMQX_TRACING_SAMPLE_RATE': 1.0,
+    'EMQX_TRACING_EXPORTER': None,
+    'EMQX_AUTHZ_ENABLED': False,
+    'EMQX_AUTHZ_ACL_FUNCTION': None,
+    'EMQX_AUTHZ_CACHE_SIZE': 10000,
+    'EMQX_AUTHZ_CACHE_TTL': 30,
+    'EMQX_AUTHZ_BROKER_CACHE_TTL': 60,
+    'EMQX_TEMPLATE_FIELDS': ["username", "first_name", "last_name"],
+    'EMQX_BULK_AUDIENCES': {},
+    'EMQX_DISPATCH_ENABLED': False,
+    'EMQX_DISPATCH_WORKERS': 4,
+    'EMQX_DISPATCH_CHUNK_SIZE': 500,
+    'EMQX_DISPATCH_WEIGHTS': {"critical": 8, "normal": 3, "bulk": 1},
+    'EMQX_DISPATCH_RESERVED_WORKERS': {"critical": 1, "normal": 1},
 }
 
 class EMQXSettings:
@@ -0,0 +1,387 @@
+## django_emqx/dispatch.py
+
+"""
+Background notification dispatcher with priority lanes.
+
+Messages are queued per priority lane (critical, normal, bulk) and delivered
+by a pool of worker threads in chunks of recipients. Workers pick the next
+lane by smooth weighted round-robin, so a large bulk broadcast keeps draining
+while critical messages overtake it, and a configurable number of workers is
+reserved for the higher lanes so they never wait for a free worker.
+
+Messages that pass their `expires_at` while queued are dropped before any
+further recipient is resolved, encoded or published. For messages with a
+`collapse_key`, a newer queued message with the same key replaces an older
+one for every recipient both are addressed to.
+"""
+
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+from django.db import close_old_connections
+
+from . import get_tracer
+from .conf import emqx_settings
+
+LANES = ("critical", "normal", "bulk")
+LATENCY_SAMPLES = 1000
+
+
+class DispatchJob:
+    """
+    A queued message together with the recipients it still has to be delivered to.
+
+    The recipients are consumed lazily, chunk by chunk, so a job can be backed
+    by a streaming iterator of user IDs instead of a materialized list.
+    `on_progress`, if given, is called after every chunk as
+    `on_progress(resolved, delivered, failed, done)`. Chunks of one job may be
+    delivered concurrently; `done` is only True for the report of the last
+    chunk to finish once the recipients are exhausted (or the message expired),
+    so all counts have been reported by then. The trace context of the
+    submitter is kept, so the spans of the chunks continue its trace.
+    """
+
+    def __init__(self, message, recipient_ids, lane, on_progress=None):
+        self.message = message
+        self.lane = lane
+        self.on_progress = on_progress
+        self.enqueued_at = time.monotonic()
+        self.trace_context = get_tracer().current_context()
+        self._recipient_ids = recipient_ids
+        self._iterator = None
+        # Guarded by the dispatcher's lock
+        self._in_flight = 0
+        self._exhausted = False
+
+    def take(self, size):
+        """Return the next chunk of at most `size` recipient IDs."""
+        if self._iterator is None:
+            # Evaluated on first use, i.e. in the worker thread.
+            self._iterator = iter(self._recipient_ids)
+        return list(islice(self._iterator, size))
+
+
+class LaneMetrics:
+    """
+    Counters and latency samples of a single priority lane.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.expired = 0
+        self.collapsed = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self, queued, busy):
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return {
+            "queued": queued,
+            "busy": busy,
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "expired": self.expired,
+            "collapsed": self.collapsed,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+class NotificationDispatcher:
+    """
+    Deliver messages to recipients in the background, ordered by priority lane.
+
+    Args:
+        deliver (callable, optional): Called as `deliver(message, recipient_ids)` for
+            every chunk. Defaults to `NotificationSenderMixin.send_notification_chunk`.
+        workers (int, optional): Number of worker threads. Defaults to `EMQX_DISPATCH_WORKERS`.
+        chunk_size (int, optional): Recipients per chunk. Defaults to `EMQX_DISPATCH_CHUNK_SIZE`.
+        weights (dict, optional): Scheduling weight per lane. Defaults to `EMQX_DISPATCH_WEIGHTS`.
+        reserved (dict, optional): Workers reserved per lane. Defaults to `EMQX_DISPATCH_RESERVED_WORKERS`.
+    """
+
+    def __init__(self, deliver=None, workers=None, chunk_size=None, weights=None, reserved=None):
+        if deliver is None:
+            from .mixins import NotificationSenderMixin
+            deliver = NotificationSenderMixin().send_notification_chunk
+
+        self.deliver = deliver
+        self.workers = workers or emqx_settings.EMQX_DISPATCH_WORKERS
+        self.chunk_size = chunk_size or emqx_settings.EMQX_DISPATCH_CHUNK_SIZE
+        weights = weights or emqx_settings.EMQX_DISPATCH_WEIGHTS
+        reserved = emqx_settings.EMQX_DISPATCH_RESERVED_WORKERS if reserved is None else reserved
+
+        self.weights = {lane: max(1, int(weights.get(lane, 1))) for lane in LANES}
+        # A lane may only run while fewer than `limit` workers are busy with it and
+        # the lanes below it; the difference to `workers` is kept for higher lanes.
+        self.limits = {}
+        for index, lane in enumerate(LANES):
+            held_back = sum(reserved.get(higher, 0) for higher in LANES[:index])
+            self.limits[lane] = max(1, self.workers - held_back)
+
+        self._queues = {lane: deque() for lane in LANES}
+        self._busy = {lane: 0 for lane in LANES}
+        self._credits = {lane: 0 for lane in LANES}
+        self._metrics = {lane: LaneMetrics() for lane in LANES}
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        # (collapse key, recipient ID) -> primary key of the newest queued message
+        self._latest = {}
+
+    def submit(self, message, recipient_ids, lane=None, on_progress=None):
+        """
+        Queue a message for delivery to the given recipients.
+
+        Args:
+            message (Message): The message to deliver.
+            recipient_ids (iterable): User IDs of the recipients; may be a lazy iterator,
+                except for messages with a collapse key, whose recipients are resolved here,
+                in the caller's thread.
+            lane (str, optional): The priority lane. Defaults to `message.priority`.
+            on_progress (callable, optional): Progress callback, see `DispatchJob`.
+
+        Returns:
+            DispatchJob: The queued job.
+        """
+        lane = lane or getattr(message, "priority", None) or "normal"
+        if lane not in self._queues:
+            raise ValueError(f"Unknown dispatch lane: '{lane}'")
+
+        collapse_key = getattr(message, "collapse_key", None)
+        if collapse_key:
+            recipient_ids = list(recipient_ids)
+
+        job = DispatchJob(message, recipient_ids, lane, on_progress)
+        with self._condition:
+            if collapse_key:
+                for recipient_id in recipient_ids:
+                    self._latest[(collapse_key, recipient_id)] = message.pk
+            self._queues[lane].append(job)
+            self._metrics[lane].submitted += 1
+            self._condition.notify()
+        return job
+
+    def _eligible_lanes(self):
+        eligible = []
+        for index, lane in enumerate(LANES):
+            if not self._queues[lane]:
+                continue
+            busy_at_or_below = sum(self._busy[lower] for lower in LANES[index:])
+            if busy_at_or_below < self.limits[lane]:
+                eligible.append(lane)
+        return eligible
+
+    def _pick_lane(self):
+        """Smooth weighted round-robin over the lanes that may run now."""
+        eligible = self._eligible_lanes()
+        if not eligible:
+            return None
+
+        total = 0
+        for lane in eligible:
+            self._credits[lane] += self.weights[lane]
+            total += self.weights[lane]
+        lane = max(eligible, key=lambda candidate: self._credits[candidate])
+        self._credits[lane] -= total
+        return lane
+
+    def _acquire(self, block, timeout=None):
+        with self._condition:
+            lane = self._pick_lane()
+            while lane is None and block and not self._stopping:
+                if not self._condition.wait(timeout):
+                    return None, None
+                lane = self._pick_lane()
+            if lane is None:
+                return None, None
+            self._busy[lane] += 1
+            job = self._queues[lane].popleft()
+            job._in_flight += 1
+            return lane, job
+
+    def _requeue(self, job):
+        with self._condition:
+            self._queues[job.lane].append(job)
+            self._condition.notify()
+
+    def _collapse(self, job, chunk):
+        """Remove recipients for whom a newer message with the same collapse key is queued."""
+        collapse_key = getattr(job.message, "collapse_key", None)
+        if not collapse_key:
+            return chunk
+
+        current = []
+        with self._condition:
+            for recipient_id in chunk:
+                key = (collapse_key, recipient_id)
+                if self._latest.get(key) == job.message.pk:
+                    del self._latest[key]
+                    current.append(recipient_id)
+            self._metrics[job.lane].collapsed += len(chunk) - len(current)
+        return current
+
+    def _forget(self, job):
+        """Drop the collapse entries of a job that ends before all its recipients were collapsed."""
+        collapse_key = getattr(job.message, "collapse_key", None)
+        if not collapse_key:
+            return
+
+        with self._condition:
+            # Recipients of collapsing jobs are a list, see `submit`
+            for recipient_id in job._recipient_ids:
+                key = (collapse_key, recipient_id)
+                if self._latest.get(key) == job.message.pk:
+                    del self._latest[key]
+
+    def _finish_chunk(self, job, exhausted):
+        """Return whether the job is done: exhausted, with no other chunk in flight."""
+        with self._condition:
+            job._in_flight -= 1
+            job._exhausted = job._exhausted or exhausted
+            return job._exhausted and job._in_flight == 0
+
+    def _release(self, lane, delivered, failed, latency):
+        with self._condition:
+            self._busy[lane] -= 1
+            metrics = self._metrics[lane]
+            metrics.delivered += delivered
+            metrics.failed += failed
+            if latency is not None:
+                metrics.latencies.append(latency)
+            self._condition.notify_all()
+
+    def process_next(self, block=False, timeout=None):
+        """
+        Deliver the next chunk of the next job, chosen by lane weight and reservation.
+
+        Args:
+            block (bool, optional): Wait for work if no lane can run right now.
+            timeout (float, optional): Maximum time to wait when blocking.
+
+        Returns:
+            bool: True if a chunk was processed.
+        """
+        lane, job = self._acquire(block, timeout)
+        if job is None:
+            return False
+
+        if getattr(job.message, "is_expired", False):
+            with self._condition:
+                self._metrics[lane].expired += 1
+            self._release(lane, 0, 0, None)
+            self._forget(job)
+            self._report(job, 0, 0, 0, self._finish_chunk(job, True))
+            return True
+
+        chunk = []
+        resolved = delivered = failed = 0
+        done = True
+        collapsed = False
+        try:
+            chunk = job.take(self.chunk_size)
+            resolved = len(chunk)
+            if len(chunk) == self.chunk_size:
+                # Put the rest of the job back at the end of its lane before delivering,
+                # so other jobs of the same lane get their turn in between.
+                done = False
+                self._requeue(job)
+            chunk = self._collapse(job, chunk)
+            collapsed = True
+            if chunk:
+                span = get_tracer().span("emqx.dispatch_chunk", parent=job.trace_context, lane=lane, recipients=len(chunk))
+                with span:
+                    self.deliver(job.message, chunk)
+                delivered = len(chunk)
+        except Exception as e:
+            print(f"❌ Failed to deliver message {job.message.pk} to {len(chunk)} recipients: {e}")
+            failed = len(chunk)
+        finally:
+            latency = time.monotonic() - job.enqueued_at if chunk else None
+            self._release(lane, delivered, failed, latency)
+            if done and not collapsed:
+                self._forget(job)
+            self._report(job, resolved, delivered, failed, self._finish_chunk(job, done))
+        return True
+
+    def _report(self, job, resolved, delivered, failed, done):
+        if job.on_progress is None:
+            return
+        try:
+            job.on_progress(resolved, delivered, failed, done)
+        except Exception as e:
+            print(f"❌ Progress callback of message {job.message.pk} failed: {e}")
+
+    def drain(self):
+        """
+        Deliver all queued work in the calling thread.
+
+        Returns:
+            int: The number of processed chunks.
+        """
+        processed = 0
+        while self.process_next():
+            processed += 1
+        return processed
+
+    def metrics(self):
+        """
+        Return per-lane queue depth, counters and delivery latencies in seconds.
+
+        Latency is measured from submission of a message to the delivery of
+        each of its chunks, over the last `LATENCY_SAMPLES` chunks of a lane.
+
+        Returns:
+            dict: A snapshot of the metrics keyed by lane.
+        """
+        with self._condition:
+            return {
+                lane: self._metrics[lane].snapshot(len(self._queues[lane]), self._busy[lane])
+                for lane in LANES
+            }
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                close_old_connections()
+                self.process_next(block=True, timeout=1.0)
+        finally:
+            close_old_connections()
+
+    def start(self):
+        """
+        Start the worker threads (idempotent).
+        """
+        with self._condition:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"emqx-dispatch-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker threads after their current chunk. Queued work is kept.
+
+        Args:
+            timeout (float, optional): Maximum time to wait per thread.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
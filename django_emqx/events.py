@@ -0,0 +1,163 @@
+## django_emqx/events.py
+
+"""
+Dispatch of device event signals off the webhook request path.
+
+In "sync" mode the device signals are sent inline, as before. In "async"
+mode their receivers run on a bounded thread pool once the webhook's
+transaction has committed, so slow receivers no longer delay the response
+to EMQX. If the pool is saturated, the receivers run inline again instead
+of queueing without bound.
+
+Independently of the mode, events are collected for the batch signals
+(e.g. `emqx_devices_connected_batch`) whenever those have receivers, and
+delivered as lists from a background thread, so receivers can handle
+reconnect storms with bulk queries.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+
+from .conf import emqx_settings
+from .signals import BATCH_SIGNALS
+
+MODES = ("sync", "async")
+
+
+class SignalDispatcher:
+    """
+    Send device signals inline or on a thread pool and collect batch signals.
+
+    Args:
+        mode (str, optional): "sync" or "async". Defaults to `EMQX_SIGNAL_DISPATCH`.
+        workers (int, optional): Pool threads. Defaults to `EMQX_SIGNAL_WORKERS`.
+        queue_size (int, optional): Signals pending on the pool before receivers run inline.
+            Defaults to `EMQX_SIGNAL_QUEUE_SIZE`.
+        batch_size (int, optional): Events that trigger an early batch. Defaults to `EMQX_SIGNAL_BATCH_SIZE`.
+        batch_interval (float, optional): Seconds between batches. Defaults to `EMQX_SIGNAL_BATCH_INTERVAL`.
+    """
+
+    def __init__(self, mode=None, workers=None, queue_size=None, batch_size=None, batch_interval=None):
+        self.mode = mode or emqx_settings.EMQX_SIGNAL_DISPATCH
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown signal dispatch mode: '{self.mode}'")
+        self.workers = workers or emqx_settings.EMQX_SIGNAL_WORKERS
+        self.batch_size = batch_size or emqx_settings.EMQX_SIGNAL_BATCH_SIZE
+        self.batch_interval = batch_interval or emqx_settings.EMQX_SIGNAL_BATCH_INTERVAL
+
+        self._slots = threading.BoundedSemaphore(queue_size or emqx_settings.EMQX_SIGNAL_QUEUE_SIZE)
+        self._executor = None
+        self._batches = {}
+        self._batched = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def send(self, signal, sender, **kwargs):
+        """
+        Send a device signal according to the dispatch mode and queue it for its batch signal.
+
+        Args:
+            signal (Signal): The signal, e.g. `emqx_device_connected`.
+            sender: The sender passed on to the receivers.
+            **kwargs: The keyword arguments passed on to the receivers.
+        """
+        batch_signal = BATCH_SIGNALS.get(signal)
+        if batch_signal is not None and batch_signal.has_listeners(sender):
+            self._add_to_batch(batch_signal, sender, kwargs)
+
+        if not signal.has_listeners(sender):
+            return
+        if self.mode == "sync":
+            signal.send(sender=sender, **kwargs)
+        else:
+            transaction.on_commit(lambda: self._submit(signal, sender, kwargs))
+
+    def _submit(self, signal, sender, kwargs):
+        if not self._slots.acquire(blocking=False):
+            # Backpressure: the pool is saturated, so this caller waits for the receivers
+            self._send_robust(signal, sender, kwargs)
+            return
+        if self._executor is None:
+            with self._condition:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="emqx-signals")
+        self._executor.submit(self._run, signal, sender, kwargs)
+
+    def _run(self, signal, sender, kwargs):
+        try:
+            close_old_connections()
+            self._send_robust(signal, sender, kwargs)
+        finally:
+            close_old_connections()
+            self._slots.release()
+
+    def _send_robust(self, signal, sender, kwargs):
+        # Nobody is waiting for the result, so failing receivers are reported here
+        for receiver, result in signal.send_robust(sender=sender, **kwargs):
+            if isinstance(result, Exception):
+                print(f"❌ Signal receiver {getattr(receiver, '__name__', receiver)} failed: {result}")
+
+    def _add_to_batch(self, batch_signal, sender, kwargs):
+        with self._condition:
+            self._batches.setdefault((batch_signal, sender), []).append(kwargs)
+            self._batched += 1
+            if self._thread is None:
+                self._start()
+            if self._batched >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self):
+        """
+        Send all collected events to the batch signals.
+
+        Returns:
+            int: The number of delivered events.
+        """
+        with self._condition:
+            batches, self._batches = self._batches, {}
+            self._batched = 0
+        delivered = 0
+        for (batch_signal, sender), events in batches.items():
+            self._send_robust(batch_signal, sender, {"events": events})
+            delivered += len(events)
+        return delivered
+
+    def _flush_loop(self):
+        try:
+            while True:
+                with self._condition:
+                    if not self._stopping and self._batched < self.batch_size:
+                        self._condition.wait(self.batch_interval)
+                    stopping = self._stopping
+                close_old_connections()
+                self.flush()
+                if stopping:
+                    break
+        finally:
+            close_old_connections()
+
+    def _start(self):
+        # Callers hold the lock
+        self._stopping = False
+        self._thread = threading.Thread(target=self._flush_loop, name="emqx-signal-batches", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Deliver pending batches and wait for running receivers.
+
+        Args:
+            timeout (float, optional): Maximum time to wait for the batch thread.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
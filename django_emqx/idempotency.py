@@ -0,0 +1,73 @@
+## django_emqx/idempotency.py
+
+"""
+Deduplication of retried webhook events.
+
+EMQX retries webhook calls that time out, although the first call may have
+been applied already. Events carrying an `event_id` are claimed in a bounded
+in-process LRU window and, if `EMQX_IDEMPOTENCY_CACHE` names a Django cache,
+in that shared cache with an atomic `add()`. A retry of an event seen within
+`EMQX_IDEMPOTENCY_WINDOW` seconds is acknowledged without touching the
+database. Events whose processing failed are released again, so a retry is
+applied.
+"""
+
+import threading
+
+from django.core.cache import caches
+
+from .conf import emqx_settings
+from .usercache import LRUCache
+
+KEY_PREFIX = "emqx:idempotency:"
+
+
+class IdempotencyGuard:
+    """
+    Remember recently seen idempotency keys.
+
+    Args:
+        window (float, optional): Seconds a key is remembered. Defaults to `EMQX_IDEMPOTENCY_WINDOW`.
+        maxsize (int, optional): Keys kept in process. Defaults to `EMQX_IDEMPOTENCY_CACHE_SIZE`.
+        cache_alias (str, optional): Django cache shared between processes, or None.
+            Defaults to `EMQX_IDEMPOTENCY_CACHE`.
+        clock (callable, optional): Returns the current time in seconds.
+    """
+
+    def __init__(self, window=None, maxsize=None, cache_alias=None, clock=None):
+        self.window = emqx_settings.EMQX_IDEMPOTENCY_WINDOW if window is None else window
+        maxsize = emqx_settings.EMQX_IDEMPOTENCY_CACHE_SIZE if maxsize is None else maxsize
+        self.local = LRUCache(maxsize, self.window, clock)
+        cache_alias = cache_alias or emqx_settings.EMQX_IDEMPOTENCY_CACHE
+        self.shared = caches[cache_alias] if cache_alias else None
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """
+        Claim a key for processing.
+
+        Args:
+            key (str): The idempotency key.
+
+        Returns:
+            bool: True if the key was not seen within the window, False for a duplicate.
+        """
+        with self._lock:
+            if self.local.get(key) is not None:
+                self.duplicates += 1
+                return False
+            self.local.set(key, True)
+        if self.shared is not None and not self.shared.add(KEY_PREFIX + key, 1, timeout=self.window):
+            # Seen by another process; the local entry spares the next lookup
+            self.duplicates += 1
+            return False
+        return True
+
+    def release(self, key):
+        """
+        Forget a claimed key, e.g. because processing it failed.
+        """
+        self.local.discard(key)
+        if self.shared is not None:
+            self.shared.delete(KEY_PREFIX + key)
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_emqx import get_ack_buffer
+from django_emqx.conf import emqx_settings
+
+
+class Command(BaseCommand):
+    """
+    Management command to consume notification acknowledgements published via MQTT.
+
+    Subscribes to `ack/+` through the EMQX shared subscription group
+    `EMQX_ACK_SHARE_GROUP`, so any number of instances can run side by side,
+    and applies the buffered acks in batched UPDATEs until interrupted.
+
+    Usage:
+        python manage.py consume_mqtt_acks [--stats-interval <seconds>]
+
+    Arguments:
+        --stats-interval  Seconds between progress reports. Defaults to 60; 0 disables them.
+    """
+
+    help = 'Consume notification acknowledgements published via MQTT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stats-interval',
+            type=float,
+            default=60,
+            help='Seconds between progress reports; 0 disables them.',
+        )
+
+    def handle(self, *args, **options):
+        if not emqx_settings.EMQX_ACK_ENABLED:
+            raise CommandError("Set EMQX_ACK_ENABLED = True to consume MQTT acknowledgements.")
+
+        ack_buffer = get_ack_buffer()
+        self.stdout.write(self.style.SUCCESS("Consuming MQTT acknowledgements, press Ctrl+C to stop"))
+
+        interval = options['stats_interval']
+        try:
+            while True:
+                time.sleep(interval or 3600)
+                if interval:
+                    self.stdout.write(
+                        f"{ack_buffer.received} acks received, {ack_buffer.acknowledged} notifications acknowledged"
+                    )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ack_buffer.stop()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stopped after acknowledging {ack_buffer.acknowledged} notifications"
+        ))
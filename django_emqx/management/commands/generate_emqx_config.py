@@ -1,14 +1,36 @@
+import difflib
 import os
 
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from django_emqx.conf import emqx_settings
+from django_emqx.tuning import PROFILES, build_tuning
 from django.urls import reverse
 
 from importlib import resources
 from jinja2 import Environment, BaseLoader
 
 
+def connection_limit(value):
+    """Parse 'infinity' or a positive integer."""
+    return value if value == 'infinity' else int(value)
+
+
+# Options overriding single tuning values: (option, type, help)
+TUNING_OPTIONS = (
+    ('--acceptors', int, 'Acceptor processes per listener.'),
+    ('--active-n', int, 'TCP packets read per socket before flow control (active_n).'),
+    ('--tcp-buffer', str, 'TCP socket buffer size, e.g. 4KB.'),
+    ('--high-watermark', str, 'Queued outgoing bytes per connection before it is suspended, e.g. 1MB.'),
+    ('--max-connections', connection_limit, 'Connection limit per listener, or "infinity".'),
+    ('--max-conn-rate', str, 'Accepted connections per listener, e.g. 1000/s, or "infinity".'),
+    ('--webhook-pool-size', int, 'HTTP connections of each webhook connector.'),
+    ('--webhook-pipelining', int, 'Requests in flight per webhook connection.'),
+    ('--action-workers', int, 'Buffer workers of each webhook rule action.'),
+    ('--action-inflight-window', int, 'Requests each webhook rule action keeps in flight.'),
+)
+
+
 def load_template_from_package():
     # Path: django_emqx/templates/emqx/emqx.conf.j2
     with resources.files('django_emqx.templates.emqx').joinpath('emqx.conf.j2').open('r') as f:
@@ -28,16 +50,36 @@ class Command(BaseCommand):
 
     Usage:
         python manage.py generate_emqx_config [--output <path>] [--base-url <url>] [--enable-tls --keyfile <path> --certfile <path>]
+            [--profile <name>] [--connections <n>] [--cores <n>] [--acceptors <n>] ...
+            [--nodes <host,...> [--discovery static|dns --dns-name <name>]] [--dry-run]
 
     Arguments:
         --output      Path to save the generated EMQX config file. Defaults to <BASE_DIR>/config/generated/emqx.conf.
         --base-url    Base URL to use for webhook endpoints. Defaults to http://localhost:8000.
+                      A comma-separated list spreads the nodes of a cluster over several backends.
         --enable-tls  Enable TLS in the config. Requires --keyfile and --certfile.
         --keyfile     Path to the TLS private key file.
         --certfile    Path to the TLS certificate file.
+        --profile     Tuning profile: small, large-fanout or high-churn. Defaults to EMQX's defaults.
+        --connections Expected concurrent connections per broker, used to derive connection limits.
+        --cores       CPU cores of the broker, used to derive acceptors and pool sizes.
+        --nodes       Comma-separated hosts of a cluster. One config per node is written next to
+                      --output, e.g. emqx-<host>.conf, with node name emqx@<host>.
+        --discovery   Cluster discovery: static (the nodes are the seeds) or dns. Defaults to static.
+        --dns-name    Domain name resolving to the nodes, for DNS discovery.
+        --dns-record-type  a, aaaa or srv. Defaults to a.
+        --cluster-name  Name of the cluster. Defaults to emqxcl.
+        --dry-run     Show a diff against the existing files instead of writing them.
+
+    Individual tuning values (listener acceptors, TCP buffers, connection limits,
+    webhook connector pool size and pipelining, rule action workers) can be
+    overridden with their own options; see `django_emqx.tuning`.
 
     The rendered config includes EMQX-specific secrets and webhook settings, including
-    a device webhook URL resolved from Django's URL routing.
+    a device webhook URL resolved from Django's URL routing. With `EMQX_AUTHZ_ENABLED`,
+    it also contains an HTTP authorization source pointing at the `authz/` endpoint, and
+    JWT authentication requires the MQTT username to match the token's `username` claim,
+    since the authorization endpoint trusts the username.
     """
     
     help = 'Generate EMQX config from Django settings'
@@ -70,6 +112,56 @@ class Command(BaseCommand):
             type=str,
             help='Path to TLS certificate file to include in the config.',
         )
+        parser.add_argument(
+            '--profile',
+            choices=sorted(PROFILES),
+            help='Tuning profile for the expected load. Defaults to EMQX\'s defaults.',
+        )
+        parser.add_argument(
+            '--connections',
+            type=int,
+            help='Expected concurrent connections per broker; derives max_connections and max_conn_rate.',
+        )
+        parser.add_argument(
+            '--cores',
+            type=int,
+            help='CPU cores of the broker; derives listener acceptors and webhook pool sizes.',
+        )
+        for option, kind, help_text in TUNING_OPTIONS:
+            parser.add_argument(option, type=kind, help=help_text)
+        parser.add_argument(
+            '--nodes',
+            type=str,
+            help='Comma-separated hosts of an EMQX cluster; writes one config per node.',
+        )
+        parser.add_argument(
+            '--discovery',
+            choices=['static', 'dns'],
+            default='static',
+            help='Cluster discovery strategy. Defaults to static.',
+        )
+        parser.add_argument(
+            '--dns-name',
+            type=str,
+            help='Domain name resolving to the cluster nodes, required for DNS discovery.',
+        )
+        parser.add_argument(
+            '--dns-record-type',
+            choices=['a', 'aaaa', 'srv'],
+            default='a',
+            help='DNS record type of --dns-name. Defaults to a.',
+        )
+        parser.add_argument(
+            '--cluster-name',
+            type=str,
+            default='emqxcl',
+            help='Name of the EMQX cluster. Defaults to emqxcl.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print a diff against the existing config files instead of writing them.',
+        )
 
     def handle(self, *args, **options):
         output_path = options['output']
@@ -82,27 +174,89 @@ class Command(BaseCommand):
         if enable_tls and (not keyfile or not certfile):
             raise CommandError("TLS is enabled, but --keyfile and --certfile must be provided.")
 
+        # Option "--active-n" is stored as "active_n", the name of the tuning value
+        overrides = {name: options[name] for name in (option[2:].replace('-', '_') for option, _, _ in TUNING_OPTIONS)}
+        try:
+            tuning = build_tuning(options['profile'], options['connections'], options['cores'], overrides)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        nodes = [node.strip() for node in (options['nodes'] or '').split(',') if node.strip()]
+        if len(set(nodes)) != len(nodes):
+            raise CommandError("--nodes contains duplicate hosts.")
+        if options['discovery'] == 'dns' and nodes and not options['dns_name']:
+            raise CommandError("DNS discovery requires --dns-name.")
+
+        cluster = None
+        if nodes:
+            cluster = {
+                'name': options['cluster_name'],
+                'discovery': options['discovery'],
+                'seeds': [f"emqx@{node}" for node in nodes],
+                'dns_name': options['dns_name'],
+                'dns_record_type': options['dns_record_type'],
+            }
+            root, ext = os.path.splitext(output_path)
+            targets = [(f"emqx@{node}", f"{root}-{node}{ext}") for node in nodes]
+        else:
+            targets = [("emqx@127.0.0.1", output_path)]
+
         # Ensure no trailing slash
-        base_url = base_url.rstrip('/')
-        device_webhook_url = f"{base_url}{reverse('devices-list')}"
+        base_urls = [url.strip().rstrip('/') for url in base_url.split(',') if url.strip()]
+        if not base_urls:
+            raise CommandError("--base-url must not be empty.")
 
         template = load_template_from_package()
-    
-        config = template.render({
-            'EMQX_NODE_COOKIE': emqx_settings.EMQX_NODE_COOKIE,
-            'EMQX_WEBHOOK_SECRET': emqx_settings.EMQX_WEBHOOK_SECRET,
-            'SIMPLE_JWT_SIGNING_KEY': settings.SIMPLE_JWT['SIGNING_KEY'],
-            'EMQX_TLS_CA_CERTS': emqx_settings.EMQX_TLS_CA_CERTS,
-            'DEVICE_WEBHOOK_URL': device_webhook_url,
-            'ENABLE_TLS': enable_tls,
-            'TLS_KEYFILE': keyfile,
-            'TLS_CERTFILE': certfile,
-        })
-
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-        with open(output_path, 'w') as f:
-            f.write(config)
-
-        self.stdout.write(self.style.SUCCESS(f"Generated EMQX config at {output_path}"))
+
+        for index, (node_name, path) in enumerate(targets):
+            # EMQX connectors take a single URL, so nodes are spread round-robin over the backends
+            node_base_url = base_urls[index % len(base_urls)]
+            device_webhook_url = f"{node_base_url}{reverse('devices-list')}"
+            authz_url = f"{node_base_url}{reverse('emqx-authz')}" if emqx_settings.EMQX_AUTHZ_ENABLED else None
+
+            config = template.render({
+                'EMQX_NODE_COOKIE': emqx_settings.EMQX_NODE_COOKIE,
+                'EMQX_WEBHOOK_SECRET': emqx_settings.EMQX_WEBHOOK_SECRET,
+                'SIMPLE_JWT_SIGNING_KEY': settings.SIMPLE_JWT['SIGNING_KEY'],
+                'EMQX_TLS_CA_CERTS': emqx_settings.EMQX_TLS_CA_CERTS,
+                'DEVICE_WEBHOOK_URL': device_webhook_url,
+                'AUTHZ_URL': authz_url,
+                'AUTHZ_CACHE_TTL': emqx_settings.EMQX_AUTHZ_BROKER_CACHE_TTL,
+                'ENABLE_TLS': enable_tls,
+                'TLS_KEYFILE': keyfile,
+                'TLS_CERTFILE': certfile,
+                'TUNING': tuning,
+                'NODE_NAME': node_name,
+                'CLUSTER': cluster,
+            })
+
+            if options['dry_run']:
+                self.show_diff(path, config)
+                continue
+
+            # Ensure output directory exists
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(path, 'w') as f:
+                f.write(config)
+
+            self.stdout.write(self.style.SUCCESS(f"Generated EMQX config at {path}"))
+
+    def show_diff(self, path, config):
+        """
+        Print a unified diff of a rendered config against the file at `path`.
+        """
+        if not os.path.exists(path):
+            self.stdout.write(f"{path} does not exist and would be created")
+            return
+
+        with open(path) as f:
+            current = f.read()
+        if current == config:
+            self.stdout.write(f"{path} is up to date")
+            return
+
+        diff = difflib.unified_diff(
+            current.splitlines(keepends=True), config.splitlines(keepends=True), fromfile=path, tofile=f"{path} (generated)"
+        )
+        self.stdout.write(''.join(diff), ending='')
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_emqx.models import Message
+
+
+class Command(BaseCommand):
+    """
+    Management command to delete expired messages and their notifications.
+
+    Messages are deleted in chunks of primary keys, so the command can run
+    against a busy database without holding long locks.
+
+    Usage:
+        python manage.py purge_expired_messages [--chunk-size <n>] [--sleep <seconds>] [--dry-run]
+
+    Arguments:
+        --chunk-size  Number of messages deleted per transaction. Defaults to 1000.
+        --sleep       Seconds to pause between chunks. Defaults to 0.
+        --dry-run     Only report how many messages would be deleted.
+    """
+
+    help = 'Delete expired messages and their notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of messages deleted per transaction.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='Seconds to pause between chunks.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many messages would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        expired = Message.objects.expired()
+
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} expired messages would be deleted")
+            return
+
+        deleted = 0
+        while True:
+            ids = list(expired.order_by('id').values_list('id', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            Message.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired messages"))
@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from django_emqx.presence import EMQXAPIClient, EMQXAPIError, reconcile_presence
+
+
+class Command(BaseCommand):
+    """
+    Management command to fix device presence that drifted from EMQX.
+
+    Pages through the clients connected to EMQX over one keep-alive connection
+    to the REST API, diffs them against `EMQXDevice` in primary-key chunks and
+    marks drifted devices online or offline with bulk updates. Devices about to
+    be marked offline are checked individually first, so clients missed while
+    paging are not affected.
+
+    Usage:
+        python manage.py reconcile_emqx_presence [--api-url <url>] [--page-size <n>] [--chunk-size <n>]
+            [--no-verify] [--dry-run]
+
+    Arguments:
+        --api-url     Root of the EMQX v5 REST API. Defaults to `EMQX_API_URL`.
+        --page-size   Clients fetched per API request. Defaults to 10000.
+        --chunk-size  Devices compared and updated per query. Defaults to 5000.
+        --no-verify   Do not check devices individually before marking them offline.
+        --dry-run     Only report the drift.
+    """
+
+    help = 'Reconcile EMQXDevice presence with the clients connected to EMQX'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--api-url',
+            type=str,
+            help='Root of the EMQX v5 REST API, e.g. http://emqx:18083/api/v5.',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=10000,
+            help='Clients fetched per API request.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Devices compared and updated per query.',
+        )
+        parser.add_argument(
+            '--no-verify',
+            action='store_true',
+            help='Do not check devices individually before marking them offline.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the drift.',
+        )
+
+    def handle(self, *args, **options):
+        client = EMQXAPIClient(base_url=options['api_url'])
+        started_at = timezone.now()
+        start = time.monotonic()
+        try:
+            connected = set(client.iter_connected_clients(page_size=options['page_size']))
+            self.stdout.write(f"{len(connected)} clients connected to EMQX")
+
+            stats = reconcile_presence(
+                connected,
+                verify=None if options['no_verify'] else client.is_connected,
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+                started_at=started_at,
+            )
+        except EMQXAPIError as e:
+            raise CommandError(str(e))
+        finally:
+            client.close()
+
+        verb = "would be marked" if options['dry_run'] else "marked"
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {stats['checked']} devices in {time.monotonic() - start:.1f}s: "
+            f"{stats['marked_online']} {verb} online, {stats['marked_offline']} {verb} offline, "
+            f"{stats['unknown']} connected clients without a device"
+        ))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_emqx.scheduler import MessageScheduler
+
+
+class Command(BaseCommand):
+    """
+    Management command to deliver scheduled messages when they are due.
+
+    Runs a `MessageScheduler` in the foreground until interrupted. Several
+    instances may run side by side; every message is delivered only once.
+
+    Usage:
+        python manage.py run_message_scheduler [--window <seconds>] [--once]
+
+    Arguments:
+        --window  Seconds of upcoming messages loaded per database query. Defaults to EMQX_SCHEDULER_WINDOW.
+        --once    Deliver the messages that are due now and exit.
+    """
+
+    help = 'Deliver scheduled messages when they are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            type=float,
+            default=None,
+            help='Seconds of upcoming messages loaded per database query.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Deliver the messages that are due now and exit.',
+        )
+
+    def handle(self, *args, **options):
+        scheduler = MessageScheduler(window=options['window'])
+
+        if options['once']:
+            scheduler.run_pending()
+            self.stdout.write(self.style.SUCCESS(f"Delivered {scheduler.fired} scheduled messages"))
+            return
+
+        self.stdout.write(self.style.SUCCESS("Delivering scheduled messages, press Ctrl+C to stop"))
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.stop()
+        self.stdout.write(self.style.SUCCESS(f"Stopped after delivering {scheduler.fired} scheduled messages"))
@@ -0,0 +1,172 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from django_emqx.models import ArchivedEMQXDevice, EMQXDevice
+from django_emqx.presence import EMQXAPIClient, EMQXAPIError
+
+ARCHIVED_FIELDS = ("id", "client_id", "user_id", "ip_address", "last_connected_at", "created_at", "updated_at")
+
+
+class Command(BaseCommand):
+    """
+    Management command to mark silent devices offline and remove long inactive ones.
+
+    Clients that reinstall the app get new client IDs, so without sweeping the
+    device table grows forever. The command walks the table in fixed primary-key
+    ranges: every statement touches at most `--chunk-size` consecutive IDs and
+    runs in its own short transaction, so it can run against a busy database.
+
+    Devices are judged by their last connect or disconnect event (`last_event_at`).
+    A device that stays connected sends no events, so online devices past the
+    heartbeat timeout are checked against the EMQX REST API first and only marked
+    offline if EMQX no longer knows them as connected. Marking a device offline
+    bumps `updated_at`, so cached device lists see the change.
+
+    Usage:
+        python manage.py sweep_emqx_devices [--heartbeat-timeout <seconds>] [--inactive-days <n> [--archive]]
+            [--api-url <url>] [--no-verify] [--chunk-size <n>] [--sleep <seconds>] [--dry-run]
+
+    Arguments:
+        --heartbeat-timeout  Mark devices offline whose last event is older than this and that are not
+                             connected to EMQX.
+        --inactive-days      Delete inactive devices whose last event is older than this many days.
+        --archive            Copy deleted devices to `ArchivedEMQXDevice` first.
+        --api-url            Root of the EMQX v5 REST API. Defaults to `EMQX_API_URL`.
+        --no-verify          Do not ask EMQX before marking devices offline; only safe if clients
+                             produce events regularly.
+        --chunk-size         Width of the primary-key range per statement. Defaults to 1000.
+        --sleep              Seconds to pause between chunks. Defaults to 0.
+        --dry-run            Only report how many devices would be changed.
+    """
+
+    help = 'Mark silent devices offline and delete or archive long inactive devices'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--heartbeat-timeout',
+            type=float,
+            help='Seconds without events after which an online device is marked offline.',
+        )
+        parser.add_argument(
+            '--inactive-days',
+            type=int,
+            help='Days without events after which an inactive device is deleted.',
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            help='Copy deleted devices to ArchivedEMQXDevice.',
+        )
+        parser.add_argument(
+            '--api-url',
+            type=str,
+            help='Root of the EMQX v5 REST API, e.g. http://emqx:18083/api/v5.',
+        )
+        parser.add_argument(
+            '--no-verify',
+            action='store_true',
+            help='Do not check silent devices with EMQX before marking them offline.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Width of the primary-key range handled per statement.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='Seconds to pause between chunks.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many devices would be changed.',
+        )
+
+    def handle(self, *args, **options):
+        heartbeat_timeout = options['heartbeat_timeout']
+        inactive_days = options['inactive_days']
+        if heartbeat_timeout is None and inactive_days is None:
+            raise CommandError("Pass --heartbeat-timeout and/or --inactive-days.")
+        if options['archive'] and inactive_days is None:
+            raise CommandError("--archive requires --inactive-days.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        now = timezone.now()
+        silent = inactive = None
+        if heartbeat_timeout is not None:
+            silent = Q(last_status="online", last_activity__lt=now - timedelta(seconds=heartbeat_timeout))
+        if inactive_days is not None:
+            inactive = Q(active=False, last_activity__lt=now - timedelta(days=inactive_days))
+
+        client = None
+        if silent is not None and not options['no_verify']:
+            client = EMQXAPIClient(base_url=options['api_url'])
+
+        bounds = EMQXDevice.objects.aggregate(low=Min('id'), high=Max('id'))
+        marked_offline = removed = 0
+        try:
+            if bounds['low'] is not None:
+                chunk_size = options['chunk_size']
+                for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+                    devices = EMQXDevice.objects.filter(id__gte=start, id__lt=start + chunk_size).annotate(
+                        # Rows written before `last_event_at` existed fall back to older clocks
+                        last_activity=Coalesce('last_event_at', 'updated_at', 'last_connected_at', 'created_at')
+                    )
+                    if silent is not None:
+                        marked_offline += self.mark_offline(devices.filter(silent), client, options['dry_run'])
+                    if inactive is not None:
+                        removed += self.remove(devices.filter(inactive), options['archive'], options['dry_run'])
+                    if options['sleep']:
+                        time.sleep(options['sleep'])
+        except EMQXAPIError as e:
+            raise CommandError(str(e))
+        finally:
+            if client is not None:
+                client.close()
+
+        verb = "would be" if options['dry_run'] else "were"
+        action = "archived" if options['archive'] else "deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{marked_offline} devices {verb} marked offline, {removed} inactive devices {verb} {action}"
+        ))
+
+    def mark_offline(self, devices, client, dry_run):
+        if client is not None:
+            # Long-lived connections send no events; only devices EMQX does not know as connected are silent
+            candidates = devices.values_list('id', 'client_id')
+            # Still filtered by status and last event, so a device reconnecting after its
+            # check is left alone by the UPDATE
+            devices = devices.filter(
+                id__in=[pk for pk, client_id in candidates if not client.is_connected(client_id)]
+            )
+        if dry_run:
+            return devices.count()
+        # `updated_at` is set explicitly, since `update()` bypasses `auto_now`; the inactivity
+        # clock `last_event_at` keeps counting from the device's last real event
+        return devices.update(active=False, last_status="offline", updated_at=timezone.now())
+
+    def remove(self, devices, archive, dry_run):
+        if dry_run:
+            return devices.count()
+        with transaction.atomic():
+            # Locked, so a device reconnecting meanwhile waits and is created anew afterwards
+            rows = list(devices.select_for_update().values(*ARCHIVED_FIELDS))
+            if not rows:
+                return 0
+            if archive:
+                ArchivedEMQXDevice.objects.bulk_create([
+                    ArchivedEMQXDevice(device_id=row["id"], **{field: row[field] for field in ARCHIVED_FIELDS[1:]})
+                    for row in rows
+                ])
+            EMQXDevice.objects.filter(id__in=[row["id"] for row in rows]).delete()
+        return len(rows)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emqxdevice",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                help_text="Timestamp of the last change to the device",
+                null=True,
+                verbose_name="Last updated at",
+            ),
+        ),
+    ]
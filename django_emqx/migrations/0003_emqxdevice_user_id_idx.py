@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0002_emqxdevice_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="emqxdevice",
+            index=models.Index(fields=["user", "id"], name="emqxdevice_user_id_idx"),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0003_emqxdevice_user_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EMQXSubscription",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "topic",
+                    models.CharField(
+                        help_text="Topic filter the device is subscribed to",
+                        max_length=255,
+                        verbose_name="Topic filter",
+                    ),
+                ),
+                (
+                    "qos",
+                    models.PositiveSmallIntegerField(
+                        default=0,
+                        help_text="QoS level of the subscription",
+                        verbose_name="QoS",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Creation date"
+                    ),
+                ),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="subscriptions",
+                        to="django_emqx.emqxdevice",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["topic"], name="emqxsubscription_topic_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("device", "topic"),
+                        name="emqxsubscription_device_topic_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
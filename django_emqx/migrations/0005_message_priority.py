@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0004_emqxsubscription"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="priority",
+            field=models.CharField(
+                choices=[
+                    ("critical", "Critical"),
+                    ("normal", "Normal"),
+                    ("bulk", "Bulk"),
+                ],
+                default="normal",
+                help_text="Dispatch lane: critical messages overtake normal and bulk ones.",
+                max_length=10,
+            ),
+        ),
+    ]
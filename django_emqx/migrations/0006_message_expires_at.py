@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0005_message_priority"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="expires_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                help_text="Optional expiry time. Expired messages are neither published nor listed.",
+                null=True,
+            ),
+        ),
+    ]
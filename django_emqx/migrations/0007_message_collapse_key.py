@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:29
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0006_message_expires_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="collapse_key",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="Optional key for state updates where only the latest message matters, e.g. 'unread-count'.",
+                max_length=64,
+                null=True,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        "^[^/+#]*$",
+                        "The collapse key must not contain '/', '+' or '#'.",
+                    )
+                ],
+            ),
+        ),
+    ]
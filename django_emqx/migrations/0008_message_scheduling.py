@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0007_message_collapse_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduledNotification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="dispatched_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Timestamp when the scheduled message was handed over for delivery.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="send_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Optional time at which the message is delivered. Leave empty to send immediately.",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                condition=models.Q(
+                    ("dispatched_at__isnull", True), ("send_at__isnull", False)
+                ),
+                fields=["send_at"],
+                name="message_due_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="schedulednotification",
+            name="message",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="scheduled_notifications",
+                to="django_emqx.message",
+            ),
+        ),
+        migrations.AddField(
+            model_name="schedulednotification",
+            name="recipient",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="scheduled_notifications",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="schedulednotification",
+            constraint=models.UniqueConstraint(
+                fields=("message", "recipient"), name="schedulednotification_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0008_message_scheduling"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedEMQXDevice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("device_id", models.IntegerField(verbose_name="Device ID")),
+                (
+                    "client_id",
+                    models.CharField(
+                        db_index=True, max_length=255, verbose_name="EMQX Client ID"
+                    ),
+                ),
+                (
+                    "ip_address",
+                    models.GenericIPAddressField(
+                        blank=True, null=True, verbose_name="Last known IP address"
+                    ),
+                ),
+                (
+                    "last_connected_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Last connected at"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(null=True, verbose_name="Creation date"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(null=True, verbose_name="Last updated at"),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Archived at"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_emqx_devices",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Full-text index for searching messages in the admin, PostgreSQL only. The
+# expression must match the one in `MessageAdmin.get_search_results`.
+SEARCH_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS message_search_idx ON django_emqx_message "
+    "USING gin (to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(body, '')))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(SEARCH_INDEX_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS message_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0009_archivedemqxdevice"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["created_at"], name="message_created_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["delivered_at"], name="notification_delivered_idx"
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0011_bulksendjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="personalized",
+            field=models.BooleanField(
+                default=False,
+                help_text="Whether title and body are Jinja2 templates, e.g. 'Hi {{ first_name }}', rendered per recipient.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="context",
+            field=models.JSONField(
+                blank=True,
+                help_text="Template variables the personalized message was rendered with for this recipient.",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_notifications(apps, schema_editor):
+    # Keep the oldest notification per message and recipient, so the unique constraint can be added
+    Notification = apps.get_model("django_emqx", "Notification")
+    duplicates = (
+        Notification.objects.values("message_id", "recipient_id")
+        .annotate(count=Count("id"), keep=Min("id"))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        Notification.objects.filter(message_id=row["message_id"], recipient_id=row["recipient_id"]).exclude(
+            id=row["keep"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0012_personalized_messages"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Optional key of the send request; a retried request with the same key is not sent again.",
+                max_length=255,
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.RunPython(delete_duplicate_notifications, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                fields=("message", "recipient"), name="notification_uniq"
+            ),
+        ),
+    ]
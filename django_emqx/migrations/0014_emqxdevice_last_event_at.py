@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:37
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_timestamps(apps, schema_editor):
+    # Devices older than migration 0002 have no `updated_at`; both clocks fall back to the
+    # newest known timestamp, so the sweeper can judge every device
+    EMQXDevice = apps.get_model("django_emqx", "EMQXDevice")
+    EMQXDevice.objects.filter(updated_at__isnull=True).update(
+        updated_at=Coalesce("last_connected_at", "created_at")
+    )
+    EMQXDevice.objects.filter(last_event_at__isnull=True).update(
+        last_event_at=Coalesce("updated_at", "last_connected_at", "created_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0013_idempotency"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emqxdevice",
+            name="last_event_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Timestamp of the last connect or disconnect event",
+                null=True,
+                verbose_name="Last event at",
+            ),
+        ),
+        migrations.RunPython(backfill_timestamps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_emqx", "0014_emqxdevice_last_event_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="emqxdevice",
+            index=models.Index(fields=["created_at"], name="emqxdevice_created_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["title"],
+                name="message_title_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["topic"],
+                name="message_topic_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    ]
@@ -1,17 +1,30 @@
 ## django_emqx/mixins.py
 
+import hashlib
+
+from django.db.models import Count, Max
 from django.utils import timezone
-from django.contrib.auth import get_user_model
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 
 # Check if Firebase is available
 try:
     from fcm_django.models import FCMDevice
-    from firebase_admin.messaging import Notification as FCMNotification, Message as FCMMessage
+    from firebase_admin.messaging import (
+        AndroidConfig, APNSConfig, Notification as FCMNotification, Message as FCMMessage
+    )
     firebase_installed = True
 except ImportError:
     firebase_installed = False
 
-from .models import Notification, EMQXDevice
+from . import (
+    get_dispatcher, get_idempotency_guard, get_scheduler, get_signal_dispatcher, get_tracer, get_user_cache,
+)
+from .conf import emqx_settings
+from .models import Notification, EMQXDevice, EMQXSubscription, ScheduledNotification
+from .signals import emqx_device_connected, new_emqx_device_connected, emqx_device_disconnected
+from .templating import PersonalizedMessage, recipient_contexts
+from .tracing import traced
 from .utils import send_mqtt_message
 
 
@@ -24,23 +37,231 @@ class NotificationSenderMixin:
         """
         Send notifications to all recipients via MQTT and Firebase (if available).
 
+        Messages with a future `send_at` are scheduled instead, see
+        `schedule_notifications`. If `EMQX_DISPATCH_ENABLED` is set, the message is
+        handed to the background dispatcher and delivered in the priority lane given
+        by `message.priority`; otherwise it is sent inline.
+
+        Args:
+            message (Message): The message to send.
+            recipients (QuerySet or list): The recipient users.
+
+        Returns:
+            DispatchJob or None: The queued job if the dispatcher is enabled.
+        """
+        if message.is_expired:
+            # Nobody is notified of an expired message, neither now nor later
+            return None
+
+        if message.send_at is not None and message.dispatched_at is None and message.send_at > timezone.now():
+            self.schedule_notifications(message, recipients)
+            return None
+
+        if emqx_settings.EMQX_DISPATCH_ENABLED:
+            if hasattr(recipients, "values_list"):
+                recipient_ids = recipients.values_list("id", flat=True)
+            else:
+                recipient_ids = [recipient.id for recipient in recipients]
+            return get_dispatcher().submit(message, recipient_ids)
+
+        if message.personalized:
+            # Rendered per chunk, against the recipients' columns fetched in one query
+            recipient_ids = [getattr(recipient, "id", recipient) for recipient in recipients]
+            chunk_size = emqx_settings.EMQX_DISPATCH_CHUNK_SIZE
+            for start in range(0, len(recipient_ids), chunk_size):
+                self.send_notification_chunk(message, recipient_ids[start:start + chunk_size])
+            return None
+
+        tracer = get_tracer()
+        with tracer.span("emqx.send_all", message_id=message.pk):
+            if message.collapse_key:
+                recipients = list(recipients)
+                self.collapse_notifications(message, [recipient.id for recipient in recipients])
+
+            for recipient in recipients:
+                with tracer.span("db.insert_notifications"):
+                    _, created = Notification.objects.get_or_create(message=message, recipient=recipient)
+                if not created:
+                    # Already delivered, e.g. by a retried send
+                    continue
+
+                # Send a notification via MQTT
+                send_mqtt_message(recipient, message)
+
+                # Send a notification to Firebase devices if Firebase is installed
+                if firebase_installed:
+                    with tracer.span("fcm.send"):
+                        devices = FCMDevice.objects.filter(user=recipient)
+                        devices.send_message(self.build_fcm_message(message))
+
+    def schedule_notifications(self, message, recipients, batch_size=1000):
+        """
+        Store the recipients of a message with a future `send_at` for later delivery.
+
+        The message is delivered by a `MessageScheduler` once it is due; with
+        `EMQX_SCHEDULER_ENABLED` the scheduler of this process is notified.
+
+        Args:
+            message (Message): A saved message with `send_at` set.
+            recipients (QuerySet or list): The recipient users.
+            batch_size (int, optional): Rows inserted per query. Defaults to 1000.
+        """
+        if hasattr(recipients, "values_list"):
+            recipient_ids = recipients.values_list("id", flat=True)
+        else:
+            recipient_ids = [recipient.id for recipient in recipients]
+        ScheduledNotification.objects.bulk_create(
+            (ScheduledNotification(message=message, recipient_id=recipient_id) for recipient_id in recipient_ids),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+        if emqx_settings.EMQX_SCHEDULER_ENABLED:
+            get_scheduler().schedule(message)
+
+    def exclude_notified(self, message, recipient_ids):
+        """
+        Drop recipients who already have a notification of the message.
+
+        Together with the unique constraint on (message, recipient), this makes
+        retried chunks skip the database inserts and publishes already done.
+
+        Args:
+            message (Message): The message to send.
+            recipient_ids (list): User IDs of the recipients.
+
+        Returns:
+            list: The recipients still to be notified, in their original order.
+        """
+        notified = set(
+            Notification.objects.filter(message=message, recipient_id__in=recipient_ids)
+            .values_list("recipient_id", flat=True)
+        )
+        if not notified:
+            return list(recipient_ids)
+        return [recipient_id for recipient_id in recipient_ids if recipient_id not in notified]
+
+    def collapse_notifications(self, message, recipient_ids):
+        """
+        Delete pending notifications superseded by a message with the same collapse key.
+
+        Unacknowledged notifications of older messages with `message.collapse_key`
+        are removed for the given recipients, so only the latest state is stored.
+
+        Args:
+            message (Message): The new message.
+            recipient_ids (list): User IDs of the recipients of the new message.
+
+        Returns:
+            int: The number of deleted notifications.
+        """
+        if not message.collapse_key:
+            return 0
+        deleted, _ = Notification.objects.filter(
+            message__collapse_key=message.collapse_key,
+            recipient_id__in=recipient_ids,
+            is_acknowledged=False,
+        ).exclude(message=message).delete()
+        return deleted
+
+    def build_fcm_message(self, message):
+        """
+        Build the Firebase message for a message, passing on its collapse key.
+
+        Args:
+            message (Message): The message to send.
+
+        Returns:
+            firebase_admin.messaging.Message: The Firebase message.
+        """
+        notification = FCMNotification(title=message.title, body=message.body)
+        if not message.collapse_key:
+            return FCMMessage(notification=notification)
+        return FCMMessage(
+            notification=notification,
+            android=AndroidConfig(collapse_key=message.collapse_key),
+            apns=APNSConfig(headers={"apns-collapse-id": message.collapse_key}),
+        )
+
+    def send_notification_chunk(self, message, recipient_ids):
+        """
+        Deliver a message to a chunk of recipients with set-based database writes.
+
+        Used by the background dispatcher: notifications are bulk-inserted and
+        Firebase devices of all recipients are fetched with a single query.
+        Recipients who already have a notification of the message are skipped, and
+        nothing is sent once the message has expired. Personalized messages are
+        rendered per recipient, see `send_personalized_chunk`.
+
         Args:
-            message (Notification): The notification message to send.
-            recipients (QuerySet): A queryset of recipient users.
-            mqtt_client (object): The MQTT client instance.
-            title (str): The title of the notification.
-            body (str): The body of the notification.
+            message (Message): The message to send.
+            recipient_ids (list): User IDs of the recipients.
         """
-        for recipient in recipients:
-            Notification.objects.create(message=message, recipient=recipient)
+        if message.is_expired:
+            return
+
+        if message.personalized:
+            self.send_personalized_chunk(message, recipient_ids)
+            return
 
-            # Send a notification via MQTT
-            send_mqtt_message(recipient, message)
+        tracer = get_tracer()
+        with tracer.span("emqx.send_chunk", message_id=message.pk, recipients=len(recipient_ids)):
+            recipient_ids = self.exclude_notified(message, recipient_ids)
+            if not recipient_ids:
+                return
+            with tracer.span("db.insert_notifications", rows=len(recipient_ids)):
+                self.collapse_notifications(message, recipient_ids)
+                Notification.objects.bulk_create(
+                    [Notification(message=message, recipient_id=recipient_id) for recipient_id in recipient_ids],
+                    ignore_conflicts=True,
+                )
+
+            for recipient_id in recipient_ids:
+                send_mqtt_message(recipient_id, message)
 
-            # Send a notification to Firebase devices if Firebase is installed
             if firebase_installed:
-                devices = FCMDevice.objects.filter(user=recipient)
-                devices.send_message(FCMMessage(notification=FCMNotification(title=message.title, body=message.body)))
+                with tracer.span("fcm.send"):
+                    devices = FCMDevice.objects.filter(user_id__in=recipient_ids)
+                    devices.send_message(self.build_fcm_message(message))
+
+    def send_personalized_chunk(self, message, recipient_ids):
+        """
+        Render a personalized message for a chunk of recipients and deliver it.
+
+        The template variables of all recipients are fetched with one query and
+        stored on their notifications; recipients that no longer exist are skipped.
+
+        Args:
+            message (Message): A message with `personalized=True`.
+            recipient_ids (list): User IDs of the recipients.
+        """
+        tracer = get_tracer()
+        with tracer.span("emqx.send_chunk", message_id=message.pk, recipients=len(recipient_ids), personalized=True):
+            recipient_ids = self.exclude_notified(message, recipient_ids)
+            if not recipient_ids:
+                return
+            contexts = recipient_contexts(message, recipient_ids)
+            recipient_ids = [recipient_id for recipient_id in recipient_ids if recipient_id in contexts]
+            with tracer.span("db.insert_notifications", rows=len(recipient_ids)):
+                self.collapse_notifications(message, recipient_ids)
+                Notification.objects.bulk_create(
+                    [
+                        Notification(message=message, recipient_id=recipient_id, context=contexts[recipient_id])
+                        for recipient_id in recipient_ids
+                    ],
+                    ignore_conflicts=True,
+                )
+
+            personalized = {
+                recipient_id: PersonalizedMessage(message, contexts[recipient_id]) for recipient_id in recipient_ids
+            }
+            for recipient_id, rendered in personalized.items():
+                send_mqtt_message(recipient_id, rendered)
+
+            if firebase_installed:
+                for device in FCMDevice.objects.filter(user_id__in=recipient_ids):
+                    with tracer.span("fcm.send"):
+                        device.send_message(self.build_fcm_message(personalized[device.user_id]))
 
 
 class ClientEventMixin:
@@ -48,6 +269,91 @@ class ClientEventMixin:
     Mixin to handle client connection and disconnection events.
     """
 
+    def handle_webhook_event(self, data):
+        """
+        Apply a decoded EMQX webhook event: client connections and disconnections
+        and topic subscriptions (`session.subscribed` / `session.unsubscribed`, with either a
+        single `topic` or a `topics` list).
+
+        Events with an `event_id` are deduplicated: a retry of an event that was
+        already applied within `EMQX_IDEMPOTENCY_WINDOW` is acknowledged without
+        database work or signals.
+
+        Args:
+            data (dict): The JSON body of the webhook request.
+
+        Returns:
+            tuple: The response data (dict) and the HTTP status code.
+        """
+        if not isinstance(data, dict):
+            return {"error": "Invalid data"}, 400
+
+        event = data.get("event")
+        client_id = data.get("clientid")
+        user_id = data.get("user_id")
+        ip_address = data.get("ip_address", None)
+
+        if not client_id or not user_id:
+            return {"error": "Invalid data"}, 400
+
+        if user_id == "backend":
+            return {"status": "success"}, 200
+
+        # Retried events are acknowledged without being applied again
+        event_id = data.get("event_id")
+        # Subscriptions of several topics may share a timestamp
+        key = f"{event}:{client_id}:{event_id}:{data.get('topic') or ''}" if event_id else None
+        if key and not get_idempotency_guard().claim(key):
+            return {"status": "success"}, 200
+
+        try:
+            result = self.apply_webhook_event(event, data, user_id, client_id, ip_address)
+        except Exception:
+            if key:
+                get_idempotency_guard().release(key)
+            raise
+        if key and result[1] != 200:
+            get_idempotency_guard().release(key)
+        return result
+
+    def apply_webhook_event(self, event, data, user_id, client_id, ip_address):
+        """
+        Apply a validated webhook event, see `handle_webhook_event`.
+
+        Returns:
+            tuple: The response data (dict) and the HTTP status code.
+        """
+        if event == "client.connected":
+            created = self.handle_client_connected(user_id, client_id, ip_address)
+            signal = new_emqx_device_connected if created else emqx_device_connected
+            get_signal_dispatcher().send(signal, EMQXDevice, user_id=user_id, client_id=client_id, ip_address=ip_address)
+        elif event == "client.disconnected":
+            updated = self.handle_client_disconnected(user_id, client_id)
+            if updated:
+                get_signal_dispatcher().send(
+                    emqx_device_disconnected, EMQXDevice, user_id=user_id, client_id=client_id, ip_address=ip_address
+                )
+        elif event in ("session.subscribed", "session.unsubscribed"):
+            topics = data.get("topics") or ([data["topic"]] if data.get("topic") else [])
+            if not topics:
+                return {"error": "Invalid data"}, 400
+
+            if event == "session.subscribed":
+                try:
+                    qos = int(data.get("qos") or 0)
+                except (TypeError, ValueError):
+                    return {"error": "Invalid data"}, 400
+                if qos not in (0, 1, 2):
+                    return {"error": "Invalid data"}, 400
+                self.handle_client_subscribed(user_id, client_id, topics, qos=qos)
+            else:
+                self.handle_client_unsubscribed(user_id, client_id, topics)
+        else:
+            return {"error": "Unknown event"}, 400
+
+        return {"status": "success"}, 200
+
+    @traced("emqx.client_connected")
     def handle_client_connected(self, user_id, client_id, ip_address=None):
         """
         Handle the event when a client connects.
@@ -57,22 +363,25 @@ class ClientEventMixin:
             client_id (str): The unique identifier of the client.
             ip_address (str, optional): The IP address of the client. Defaults to None.
         """
-        user = get_user_model().objects.filter(id=int(user_id)).first()
-        if not user:
+        user_id = int(user_id)
+        if not get_user_cache().exists(user_id):
             return
 
+        now = timezone.now()
         device, created = EMQXDevice.objects.update_or_create(
             client_id=client_id,
             defaults={
-                "user": user,
+                "user_id": user_id,
                 "active": True,
                 "last_status": "online",
-                "last_connected_at": timezone.now(),
+                "last_connected_at": now,
+                "last_event_at": now,
                 "ip_address": ip_address,
             },
         )
         return created
 
+    @traced("emqx.client_disconnected")
     def handle_client_disconnected(self, user_id, client_id):
         """
         Handle the event when a client disconnects.
@@ -81,12 +390,115 @@ class ClientEventMixin:
             user_id (int): The ID of the user associated with the client.
             client_id (str): The unique identifier of the device.
         """
-        user = get_user_model().objects.filter(id=int(user_id)).first()
-        if not user:
-            return
-
-        updated = EMQXDevice.objects.filter(client_id=client_id, user=user).update(
+        # A device of a missing user does not exist, so no user lookup is needed
+        now = timezone.now()
+        updated = EMQXDevice.objects.filter(client_id=client_id, user_id=int(user_id)).update(
             active=False,
             last_status="offline",
+            updated_at=now,
+            last_event_at=now,
         )
         return updated
+
+    @traced("emqx.client_subscribed")
+    def handle_client_subscribed(self, user_id, client_id, topics, qos=0):
+        """
+        Handle the event when a client subscribes to one or more topic filters.
+
+        Args:
+            user_id (int): The ID of the user associated with the client.
+            client_id (str): The unique identifier of the device.
+            topics (list): The subscribed topic filters.
+            qos (int, optional): The granted QoS level. Defaults to 0.
+
+        Returns:
+            int: The number of recorded subscriptions.
+        """
+        device_id = (
+            EMQXDevice.objects.filter(client_id=client_id, user_id=int(user_id)).values_list("id", flat=True).first()
+        )
+        if device_id is None:
+            return 0
+
+        subscriptions = EMQXSubscription.objects.bulk_create(
+            [EMQXSubscription(device_id=device_id, topic=topic, qos=qos) for topic in topics],
+            update_conflicts=True,
+            unique_fields=["device", "topic"],
+            update_fields=["qos"],
+        )
+        return len(subscriptions)
+
+    @traced("emqx.client_unsubscribed")
+    def handle_client_unsubscribed(self, user_id, client_id, topics):
+        """
+        Handle the event when a client unsubscribes from one or more topic filters.
+
+        Args:
+            user_id (int): The ID of the user associated with the client.
+            client_id (str): The unique identifier of the device.
+            topics (list): The unsubscribed topic filters.
+
+        Returns:
+            int: The number of removed subscriptions.
+        """
+        deleted, _ = EMQXSubscription.objects.filter(
+            device__client_id=client_id, device__user_id=int(user_id), topic__in=topics
+        ).delete()
+        return deleted
+
+
+class ConditionalListMixin:
+    """
+    Mixin to answer conditional GET requests (ETag) for list endpoints.
+
+    The ETag is derived from a single aggregate query over the listed
+    queryset (row count, highest primary key and the latest value of each
+    timestamp field), so a matching `If-None-Match` is answered with
+    `304 Not Modified` without loading or serializing any rows.
+
+    No `Last-Modified` is sent: a deleted row or a second change within the
+    same second leaves the latest timestamp unchanged, so `If-Modified-Since`
+    would answer 304 for a list that changed.
+    """
+
+    def get_list_etag(self, request, queryset, timestamp_fields):
+        """
+        Compute the ETag of a queryset.
+
+        Args:
+            request: The HTTP request object.
+            queryset (QuerySet): The queryset that is about to be listed.
+            timestamp_fields (tuple): Fields whose maximum acts as a high-water mark.
+
+        Returns:
+            str: The quoted ETag.
+        """
+        aggregates = queryset.order_by().aggregate(
+            _count=Count("pk"),
+            _max_pk=Max("pk"),
+            **{field: Max(field) for field in timestamp_fields},
+        )
+        fingerprint = repr((request.user.pk, sorted(aggregates.items())))
+        return quote_etag(hashlib.sha1(fingerprint.encode("utf-8")).hexdigest())
+
+    def conditional_list_response(self, request, queryset, timestamp_fields, render):
+        """
+        Return `304 Not Modified` if the client's ETag matches, otherwise render the list.
+
+        Args:
+            request: The HTTP request object.
+            queryset (QuerySet): The queryset the validators are computed from.
+            timestamp_fields (tuple): Fields whose maximum acts as a high-water mark.
+            render (callable): Called without arguments to build the full response.
+
+        Returns:
+            HttpResponse: The not-modified or the rendered response, carrying the ETag.
+        """
+        etag = self.get_list_etag(request, queryset, timestamp_fields)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render()
+
+        response.headers["ETag"] = etag
+        return response
@@ -1,5 +1,8 @@
 ## django_emqx/models.py
 
+import math
+
+from django.core.validators import RegexValidator
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -19,8 +22,13 @@ class EMQXDevice(models.Model):
         last_connected_at (DateTimeField): Timestamp of the last successful connection.
         last_status (CharField): Last known status of the device (e.g., online, offline, error).
         subscribed_topics (TextField): Comma-separated list of topics the device subscribes to.
+            Deprecated, subscriptions are tracked in `EMQXSubscription`.
         ip_address (GenericIPAddressField): Last known IP address of the device.
         created_at (DateTimeField): Timestamp when the device was created.
+        updated_at (DateTimeField): Timestamp of the last change to the device.
+        last_event_at (DateTimeField): Timestamp of the last connect or disconnect event, the
+            inactivity clock of `sweep_emqx_devices`. Unlike `updated_at`, it is not touched by
+            the sweeper or by presence reconciliation.
     """
     id = models.AutoField(
         verbose_name="ID",
@@ -72,11 +80,139 @@ class EMQXDevice(models.Model):
     created_at = models.DateTimeField(
         verbose_name="Creation date", auto_now_add=True, null=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name="Last updated at",
+        auto_now=True,
+        null=True,
+        help_text="Timestamp of the last change to the device"
+    )
+    last_event_at = models.DateTimeField(
+        verbose_name="Last event at",
+        null=True,
+        blank=True,
+        help_text="Timestamp of the last connect or disconnect event"
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's devices: WHERE user_id = ? AND id > ? ORDER BY id
+            models.Index(fields=["user", "id"], name="emqxdevice_user_id_idx"),
+            # Date filter in the admin
+            models.Index(fields=["created_at"], name="emqxdevice_created_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.client_id} ({'Active' if self.active else 'Inactive'}) - {self.ip_address or 'No IP'}"
 
 
+class EMQXSubscription(models.Model):
+    """
+    Represents a topic filter an EMQX device is subscribed to.
+
+    Rows are kept in sync from the EMQX `session.subscribed` and
+    `session.unsubscribed` webhook events, so questions like "which devices
+    subscribe to topic X" are answered by an index lookup instead of scanning
+    `EMQXDevice.subscribed_topics`.
+
+    Fields:
+        device (ForeignKey): The subscribing device.
+        topic (CharField): The subscribed topic filter (may contain `+` and `#` wildcards).
+        qos (PositiveSmallIntegerField): The QoS level granted for the subscription.
+        created_at (DateTimeField): Timestamp when the subscription was recorded.
+    """
+    device = models.ForeignKey(
+        EMQXDevice,
+        on_delete=models.CASCADE,
+        related_name="subscriptions",
+    )
+    topic = models.CharField(
+        verbose_name="Topic filter",
+        max_length=255,
+        help_text="Topic filter the device is subscribed to"
+    )
+    qos = models.PositiveSmallIntegerField(
+        verbose_name="QoS",
+        default=0,
+        help_text="QoS level of the subscription"
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Creation date", auto_now_add=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "topic"], name="emqxsubscription_device_topic_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["topic"], name="emqxsubscription_topic_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} → {self.topic}"
+
+
+class ArchivedEMQXDevice(models.Model):
+    """
+    A device removed by `sweep_emqx_devices --archive`.
+
+    Archived rows keep the history of a device without occupying the
+    `client_id` unique index of `EMQXDevice`.
+
+    Fields:
+        device_id (IntegerField): Primary key the device had in `EMQXDevice`.
+        client_id (CharField): The MQTT client ID of the device.
+        user (ForeignKey): Reference to the user who owned the device.
+        ip_address (GenericIPAddressField): Last known IP address of the device.
+        last_connected_at (DateTimeField): Timestamp of the last successful connection.
+        created_at (DateTimeField): Timestamp when the device was created.
+        updated_at (DateTimeField): Timestamp of the last change to the device.
+        archived_at (DateTimeField): Timestamp when the device was archived.
+    """
+    device_id = models.IntegerField(verbose_name="Device ID")
+    client_id = models.CharField(verbose_name="EMQX Client ID", max_length=255, db_index=True)
+    user = models.ForeignKey(
+        get_user_model(),
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name="archived_emqx_devices",
+    )
+    ip_address = models.GenericIPAddressField(verbose_name="Last known IP address", blank=True, null=True)
+    last_connected_at = models.DateTimeField(verbose_name="Last connected at", null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name="Creation date", null=True)
+    updated_at = models.DateTimeField(verbose_name="Last updated at", null=True)
+    archived_at = models.DateTimeField(verbose_name="Archived at", auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.client_id} (archived {self.archived_at:%Y-%m-%d})"
+
+
+class MessageQuerySet(models.QuerySet):
+    """
+    QuerySet for messages with helpers for expiry and scheduling.
+    """
+
+    def expired(self):
+        """Messages whose expiry time has passed."""
+        return self.filter(expires_at__lte=timezone.now())
+
+    def unexpired(self):
+        """Messages without expiry time or whose expiry time lies in the future."""
+        return self.filter(models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now()))
+
+    def scheduled(self, before=None):
+        """
+        Scheduled messages that have not been dispatched yet.
+
+        Args:
+            before (datetime, optional): Only messages due before this time.
+        """
+        queryset = self.filter(send_at__isnull=False, dispatched_at__isnull=True)
+        if before is not None:
+            queryset = queryset.filter(send_at__lt=before)
+        return queryset
+
+
 class BaseMessage(models.Model):
     """
     Abstract base model for messages.
@@ -86,9 +222,25 @@ class BaseMessage(models.Model):
         - title: Optional title for display purposes.
         - body: Optional body text.
         - data: Optional payload (structured JSON).
+        - priority: Dispatch lane of the message (critical, normal or bulk).
+        - expires_at: Optional time after which the message is no longer delivered or listed.
+        - collapse_key: Optional key; a newer message with the same key supersedes pending older ones.
+        - personalized: Whether title and body are templates rendered per recipient.
+        - idempotency_key: Optional client-chosen key; sending again with the same key returns the first send.
+        - send_at: Optional time at which the message is delivered instead of immediately.
+        - dispatched_at: Timestamp when a scheduled message was handed over for delivery.
         - created_at: Timestamp when the message was created.
         - created_by: Optional user who created the message.
     """
+    PRIORITY_CRITICAL = "critical"
+    PRIORITY_NORMAL = "normal"
+    PRIORITY_BULK = "bulk"
+    PRIORITY_CHOICES = [
+        (PRIORITY_CRITICAL, "Critical"),
+        (PRIORITY_NORMAL, "Normal"),
+        (PRIORITY_BULK, "Bulk"),
+    ]
+
     topic = models.CharField(
         max_length=255,
         null=True,
@@ -115,6 +267,54 @@ class BaseMessage(models.Model):
         help_text="Optional structured payload (e.g., for app actions or push notifications)."
     )
 
+    priority = models.CharField(
+        max_length=10,
+        choices=PRIORITY_CHOICES,
+        default=PRIORITY_NORMAL,
+        help_text="Dispatch lane: critical messages overtake normal and bulk ones."
+    )
+
+    expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Optional expiry time. Expired messages are neither published nor listed."
+    )
+
+    collapse_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        validators=[RegexValidator(r"^[^/+#]*$", "The collapse key must not contain '/', '+' or '#'.")],
+        help_text="Optional key for state updates where only the latest message matters, e.g. 'unread-count'."
+    )
+
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Optional key of the send request; a retried request with the same key is not sent again."
+    )
+
+    personalized = models.BooleanField(
+        default=False,
+        help_text="Whether title and body are Jinja2 templates, e.g. 'Hi {{ first_name }}', rendered per recipient."
+    )
+
+    send_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Optional time at which the message is delivered. Leave empty to send immediately."
+    )
+
+    dispatched_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Timestamp when the scheduled message was handed over for delivery."
+    )
+
     created_at = models.DateTimeField(
         auto_now_add=True,
         help_text="Timestamp when the message was created."
@@ -129,9 +329,30 @@ class BaseMessage(models.Model):
         help_text="Optional user who created or sent the message."
     )
 
+    objects = MessageQuerySet.as_manager()
+
     class Meta:
         abstract = True
 
+    @property
+    def is_expired(self):
+        """Whether the message has passed its expiry time."""
+        return self.expires_at is not None and self.expires_at <= timezone.now()
+
+    def remaining_ttl(self):
+        """
+        Return the remaining time to live in whole seconds, rounded up.
+
+        Rounding up keeps the result consistent with `is_expired`: a message with
+        less than a second left still gets a TTL of 1 instead of counting as expired.
+
+        Returns:
+            int or None: Seconds until expiry (0 if already expired), or None if the message never expires.
+        """
+        if self.expires_at is None:
+            return None
+        return max(0, math.ceil((self.expires_at - timezone.now()).total_seconds()))
+
     def __str__(self):
         if self.title:
             return self.title
@@ -152,6 +373,7 @@ class BaseNotification(models.Model):
         - delivered_at: Timestamp when the notification was delivered.
         - acknowledged_at: Timestamp when the user acknowledged the notification.
         - is_acknowledged: Boolean flag indicating if the notification was acknowledged.
+        - context: Template variables of the recipient, for personalized messages.
     """
     message = models.ForeignKey(
         'django_emqx.Message',
@@ -183,6 +405,12 @@ class BaseNotification(models.Model):
         help_text="Indicates whether the user has acknowledged the notification."
     )
 
+    context = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Template variables the personalized message was rendered with for this recipient."
+    )
+
     class Meta:
         abstract = True
 
@@ -204,6 +432,20 @@ class Message(BaseMessage):
     """
     class Meta:
         abstract = False
+        indexes = [
+            # Only pending scheduled messages are indexed, so the index stays small
+            models.Index(
+                fields=["send_at"],
+                name="message_due_idx",
+                condition=models.Q(send_at__isnull=False, dispatched_at__isnull=True),
+            ),
+            # Date drill-down and default ordering in the admin
+            models.Index(fields=["created_at"], name="message_created_at_idx"),
+            # Admin search by title prefix and exact topic; the operator class makes the
+            # indexes usable for LIKE 'prefix%' on PostgreSQL and is ignored elsewhere
+            models.Index(fields=["title"], name="message_title_idx", opclasses=["varchar_pattern_ops"]),
+            models.Index(fields=["topic"], name="message_topic_idx", opclasses=["varchar_pattern_ops"]),
+        ]
 
 class Notification(BaseNotification):
     """
@@ -211,3 +453,92 @@ class Notification(BaseNotification):
     """
     class Meta:
         abstract = False
+        indexes = [
+            # Date drill-down in the admin
+            models.Index(fields=["delivered_at"], name="notification_delivered_idx"),
+        ]
+        constraints = [
+            # A message reaches each recipient once, however often its delivery is retried
+            models.UniqueConstraint(fields=["message", "recipient"], name="notification_uniq"),
+        ]
+
+
+class ScheduledNotification(models.Model):
+    """
+    A recipient of a scheduled message that has not been delivered yet.
+
+    Rows are created when a message with a future `send_at` is sent and
+    deleted once the scheduler delivers it, so schedules survive restarts.
+
+    Fields:
+        message (ForeignKey): The scheduled message.
+        recipient (ForeignKey): The user who will receive it.
+    """
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name="scheduled_notifications",
+    )
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="scheduled_notifications",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["message", "recipient"], name="schedulednotification_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.message} to {self.recipient} at {self.message.send_at}"
+
+
+class BulkSendJob(models.Model):
+    """
+    Progress of a message sent to a server-side audience (see `bulk.send_bulk`).
+
+    Fields:
+        message (ForeignKey): The message being sent.
+        audience (JSONField): The audience spec the recipients are resolved from.
+        status (CharField): "queued", "running", "done" or "expired".
+        resolved (PositiveIntegerField): Recipients resolved so far.
+        delivered (PositiveIntegerField): Recipients delivered to so far.
+        failed (PositiveIntegerField): Recipients whose delivery failed.
+        created_by (ForeignKey): Optional user who started the send.
+        created_at (DateTimeField): When the send was requested.
+        finished_at (DateTimeField): When all recipients were processed.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_EXPIRED = "expired"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_EXPIRED, "Expired"),
+    ]
+
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name="bulk_jobs",
+    )
+    audience = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    resolved = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="bulk_jobs",
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Bulk send of {self.message} ({self.status})"
@@ -2,20 +2,87 @@
 
 import time
 import ssl
+import threading
+from collections import OrderedDict
 
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 
+from . import get_tracer
 from .conf import emqx_settings
 from .utils import generate_backend_mqtt_token
 
+# Return / reason codes meaning the credentials were rejected
+# (MQTT 3.1.1 CONNACK: bad username or password, not authorized)
+AUTH_FAILURE_CODES_V311 = (4, 5)
+# (MQTT v5 CONNACK and DISCONNECT: bad user name or password, not authorized)
+AUTH_FAILURE_CODES_V5 = (0x86, 0x87)
+SESSION_TAKEN_OVER = 0x8E
+
+
+class TopicAliasMap:
+    """
+    Assign MQTT v5 topic aliases to recently used topics.
+
+    The first publish to a topic sends the full topic name together with a
+    new alias; later publishes only send the two-byte alias. When all aliases
+    allowed by the broker are taken, the least recently used one is rebound.
+    """
+
+    def __init__(self, maximum=0):
+        self.maximum = maximum
+        self._aliases = OrderedDict()
+
+    def reset(self, maximum=None):
+        """
+        Forget all aliases, e.g. after a reconnect.
+
+        Args:
+            maximum (int, optional): The new number of usable aliases.
+        """
+        if maximum is not None:
+            self.maximum = maximum
+        self._aliases.clear()
+
+    def resolve(self, topic):
+        """
+        Return the topic name to send and the alias to attach.
+
+        Args:
+            topic (str): The topic to publish to.
+
+        Returns:
+            tuple: (topic name or "" if the alias is already bound, alias or None).
+        """
+        if self.maximum <= 0:
+            return topic, None
+
+        alias = self._aliases.get(topic)
+        if alias is not None:
+            self._aliases.move_to_end(topic)
+            return "", alias
+
+        if len(self._aliases) < self.maximum:
+            alias = len(self._aliases) + 1
+        else:
+            _, alias = self._aliases.popitem(last=False)
+        self._aliases[topic] = alias
+        return topic, alias
+
 
 class MQTTClient:
     """
-    A wrapper class for managing MQTT client connections, publishing messages, 
+    A wrapper class for managing MQTT client connections, publishing messages,
     and handling reconnections using the Paho MQTT library.
+
+    With `EMQX_MQTT_V5` enabled the client speaks MQTT v5: it uses topic
+    aliases for repeated publishes, attaches message metadata as properties,
+    requests a session expiry interval and evaluates broker reason codes. If
+    the broker rejects MQTT v5, it falls back to MQTT 3.1.1 automatically.
     """
 
-    def __init__(self, broker, port=1883, keepalive=60):
+    def __init__(self, broker, port=1883, keepalive=60, protocol=None):
         """
         Initialize the MQTT client and attempt to connect to the broker.
 
@@ -23,8 +90,36 @@ class MQTTClient:
             broker (str): The MQTT broker address.
             port (int, optional): The port to connect to. Defaults to 1883.
             keepalive (int, optional): The keepalive interval in seconds. Defaults to 60.
+            protocol (int, optional): `mqtt.MQTTv5` or `mqtt.MQTTv311`.
+                Defaults to MQTT v5 if `EMQX_MQTT_V5` is set, otherwise MQTT 3.1.1.
         """
-        self.client = mqtt.Client()
+        if protocol is None:
+            protocol = mqtt.MQTTv5 if emqx_settings.EMQX_MQTT_V5 else mqtt.MQTTv311
+
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.topic_aliases = TopicAliasMap()
+        self._publish_lock = threading.Lock()
+        # mid -> full topic of unacknowledged publishes sent with a topic alias
+        self._aliased = {}
+        self._publish_failures = {}
+        self._subscriptions = {}
+
+        self._setup_client(protocol)
+        self._connect()
+
+    def _setup_client(self, protocol):
+        self.protocol = protocol
+        if protocol == mqtt.MQTTv5:
+            # The version 2 callback API passes PUBACK reason codes to on_publish
+            self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2, protocol=protocol)
+            self.client.on_disconnect = self._on_disconnect_v2
+            self.client.on_publish = self._on_publish_v2
+        else:
+            self.client = mqtt.Client(protocol=protocol)
+            self.client.on_disconnect = self.on_disconnect
+
         if emqx_settings.EMQX_TLS_ENABLED:
             if emqx_settings.EMQX_TLS_CA_CERTS:
                 self.client.tls_set(ca_certs=emqx_settings.EMQX_TLS_CA_CERTS)
@@ -33,15 +128,22 @@ class MQTTClient:
                 self.client.tls_set_context(ssl.create_default_context())
 
         self.client.on_connect = self.on_connect
-        self.client.on_disconnect = self.on_disconnect
+        for topic, _, callback in self._subscriptions.values():
+            self.client.message_callback_add(topic, callback)
 
         mqtt_token = generate_backend_mqtt_token()
         self.client.username_pw_set(username='backend', password=mqtt_token)  # Use JWT as password
-        
+
+    def _connect(self):
         for attempt in range(emqx_settings.EMQX_MAX_RETRIES):
             try:
                 print(f"🔄 Attempt {attempt + 1}: Connecting to MQTT broker...")
-                self.client.connect(broker, port, keepalive)
+                if self.protocol == mqtt.MQTTv5:
+                    properties = Properties(PacketTypes.CONNECT)
+                    properties.SessionExpiryInterval = emqx_settings.EMQX_MQTT_SESSION_EXPIRY_INTERVAL
+                    self.client.connect(self.broker, self.port, self.keepalive, properties=properties)
+                else:
+                    self.client.connect(self.broker, self.port, self.keepalive)
                 self.client.loop_start()
                 print("✅ Successfully connected to MQTT broker!")
                 return
@@ -51,7 +153,25 @@ class MQTTClient:
 
         print("❌ Failed to connect after multiple attempts. Check EMQX logs.")
 
-    def on_connect(self, client, userdata, flags, rc):
+    def _is_auth_failure(self, rc):
+        codes = AUTH_FAILURE_CODES_V5 if self.protocol == mqtt.MQTTv5 else AUTH_FAILURE_CODES_V311
+        return rc in codes
+
+    def _refresh_credentials(self, client):
+        # The backend token may have expired; the next (re)connect uses a fresh one
+        client.username_pw_set(username='backend', password=generate_backend_mqtt_token())
+
+    def _fall_back_to_v311(self):
+        print("↩️ Broker does not support MQTT v5, falling back to MQTT 3.1.1")
+        old_client = self.client
+        old_client.on_disconnect = None
+        old_client.loop_stop()
+        old_client.disconnect()
+        self.topic_aliases.reset(0)
+        self._setup_client(mqtt.MQTTv311)
+        self._connect()
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         """
         Callback for when the client connects to the broker.
 
@@ -59,41 +179,169 @@ class MQTTClient:
             client: The MQTT client instance.
             userdata: User-defined data of any type.
             flags: Response flags sent by the broker.
-            rc (int): The connection result code.
+            rc (int or ReasonCode): The connection result code.
+            properties (Properties, optional): The CONNACK properties (MQTT v5 only).
         """
         if rc == 0:
             print("✅ MQTT connected successfully")
+            # Subscriptions do not survive a new session, so restore them on every connect
+            for subscription, (_, qos, _) in self._subscriptions.items():
+                client.subscribe(subscription, qos)
+            if self.protocol == mqtt.MQTTv5:
+                broker_maximum = getattr(properties, "TopicAliasMaximum", 0) if properties else 0
+                with self._publish_lock:
+                    self.topic_aliases.reset(min(broker_maximum, emqx_settings.EMQX_MQTT_TOPIC_ALIAS_MAXIMUM))
+                    self._unalias_in_flight(client)
+        elif self.protocol == mqtt.MQTTv5 and rc == "Unsupported protocol version":
+            # Rebuilding the client joins the network thread, so leave this callback first
+            threading.Thread(target=self._fall_back_to_v311, daemon=True).start()
+        elif self._is_auth_failure(rc):
+            print(f"❌ MQTT failed to connect, return code {rc}; refreshing backend token")
+            self._refresh_credentials(client)
         else:
             print(f"❌ MQTT failed to connect, return code {rc}")
 
-    def on_disconnect(self, client, userdata, rc):
+    def on_disconnect(self, client, userdata, rc, properties=None):
         """
         Callback for when the client disconnects from the broker.
 
         Args:
             client: The MQTT client instance.
             userdata: User-defined data of any type.
-            rc (int): The disconnection result code.
+            rc (int or ReasonCode): The disconnection result code.
+            properties (Properties, optional): The DISCONNECT properties (MQTT v5 only).
         """
+        # Topic aliases only live as long as the network connection; the lock keeps a
+        # concurrent publish from resolving against the old map
+        with self._publish_lock:
+            self.topic_aliases.reset()
+
+        if self.protocol == mqtt.MQTTv5:
+            if rc == SESSION_TAKEN_OVER:
+                print("❌ MQTT session taken over by another client, not reconnecting")
+                return
+            if self._is_auth_failure(rc):
+                self._refresh_credentials(client)
+
         print("🔄 MQTT disconnected, attempting to reconnect...")
         self.client.reconnect()  # Automatically try to reconnect
 
-    def publish(self, topic, payload, qos=1):
+    def _unalias_in_flight(self, client):
+        """
+        Give unacknowledged aliased publishes their full topic back.
+
+        Paho resends them after `on_connect` returns, but their aliases are not
+        bound on the new connection, so the broker would reject an empty topic.
+        Callers hold `_publish_lock`.
+        """
+        with client._out_message_mutex:
+            for mid, topic in self._aliased.items():
+                message = client._out_messages.get(mid)
+                if message is None:
+                    continue
+                message.topic = topic.encode("utf-8")
+                if hasattr(message.properties, "TopicAlias"):
+                    del message.properties.TopicAlias
+
+    def _on_disconnect_v2(self, client, userdata, flags, rc, properties):
+        self.on_disconnect(client, userdata, rc, properties)
+
+    def _on_publish_v2(self, client, userdata, mid, rc, properties):
+        if rc.is_failure:
+            self._publish_failures[mid] = rc
+
+    def publish(self, topic, payload, qos=1, expiry_interval=None, user_properties=None, content_type=None,
+                retain=False):
         """
         Publish a message to a specific MQTT topic.
 
+        The MQTT v5 only arguments are ignored when connected with MQTT 3.1.1.
+
         Args:
             topic (str): The topic to publish the message to.
             payload (str): The message payload.
             qos (int, optional): The Quality of Service level. Defaults to 1.
+            expiry_interval (int, optional): Seconds after which the broker discards
+                the message if it was not yet delivered. Only sent with MQTT v5.
+            user_properties (dict, optional): Metadata sent as MQTT v5 user properties.
+            content_type (str, optional): MIME type of the payload, sent with MQTT v5.
+            retain (bool, optional): Whether the broker keeps the message as the topic's
+                latest value for future subscribers. Defaults to False.
+
+        Returns:
+            bool: Whether the message was published (and, for MQTT v5, accepted by the broker).
         """
-        info = self.client.publish(topic, payload, qos)
-        info.wait_for_publish()  # Blocks until publish is complete
+        # With tracing, spans cover the whole publish and its enqueue and PUBACK wait;
+        # the trace context travels as MQTT v5 user property `traceparent`
+        tracer = get_tracer()
+        with tracer.span("mqtt.publish", topic=topic, qos=qos) as span:
+            properties = None
+            if self.protocol == mqtt.MQTTv5:
+                properties = Properties(PacketTypes.PUBLISH)
+                if expiry_interval is not None:
+                    properties.MessageExpiryInterval = expiry_interval
+                if content_type:
+                    properties.ContentType = content_type
+                for key, value in (user_properties or {}).items():
+                    properties.UserProperty = (key, str(value))
+                if tracer.enabled:
+                    # Receivers may continue the trace from the user properties
+                    for key, value in tracer.inject({}).items():
+                        properties.UserProperty = (key, value)
 
-        if info.rc == mqtt.MQTT_ERR_SUCCESS:
-            print("✅ Message published successfully")
-        else:
-            print(f"❌ Failed to publish message, return code: {info.rc}")
+            options = {"retain": True} if retain else {}
+            with tracer.span("mqtt.enqueue"):
+                if properties is None:
+                    info = self.client.publish(topic, payload, qos, **options)
+                else:
+                    # Aliases must reach the broker in the order they were bound
+                    with self._publish_lock:
+                        topic_name, alias = self.topic_aliases.resolve(topic)
+                        if alias is not None:
+                            properties.TopicAlias = alias
+                        info = self.client.publish(topic_name, payload, qos, properties=properties, **options)
+                        if alias is not None and qos > 0:
+                            self._aliased[info.mid] = topic
+            try:
+                with tracer.span("mqtt.puback", mid=info.mid):
+                    info.wait_for_publish()  # Blocks until publish is complete
+            finally:
+                if info.mid in self._aliased:
+                    with self._publish_lock:
+                        self._aliased.pop(info.mid, None)
+
+            reason = self._publish_failures.pop(info.mid, None)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS and reason is None:
+                print("✅ Message published successfully")
+                return True
+            elif reason is not None:
+                print(f"❌ Broker rejected message, reason: {reason}")
+                span.set_attribute("reason_code", str(reason))
+            else:
+                print(f"❌ Failed to publish message, return code: {info.rc}")
+                span.set_attribute("rc", info.rc)
+            span.set_attribute("published", False)
+            return False
+
+    def subscribe(self, topic, callback, qos=1, share_group=None):
+        """
+        Subscribe to a topic filter and route its messages to a callback.
+
+        The subscription is restored whenever the client (re)connects.
+
+        Args:
+            topic (str): The topic filter, e.g. "ack/+".
+            callback (callable): Called as `callback(client, userdata, message)`.
+            qos (int, optional): The Quality of Service level. Defaults to 1.
+            share_group (str, optional): Subscribe as EMQX shared subscription
+                `$share/{share_group}/{topic}`, so each message reaches only one
+                subscriber of the group.
+        """
+        subscription = f"$share/{share_group}/{topic}" if share_group else topic
+        self._subscriptions[subscription] = (topic, qos, callback)
+        # Incoming messages carry the plain topic, so the callback is bound to the filter without prefix
+        self.client.message_callback_add(topic, callback)
+        self.client.subscribe(subscription, qos)
 
     def disconnect(self):
         """
@@ -0,0 +1,190 @@
+## django_emqx/presence.py
+
+"""
+Reconciliation of device presence with the EMQX REST API.
+
+Webhooks that EMQX gives up on leave `EMQXDevice.last_status` wrong until
+the device connects or disconnects again. `reconcile_presence` compares the
+devices with the clients EMQX reports as connected: devices are read in
+primary-key chunks, diffed against the set of connected client IDs and fixed
+with one UPDATE per chunk and direction. Rows changed by a webhook while the
+reconciliation runs are left alone.
+"""
+
+import base64
+import http.client
+import json
+from urllib.parse import quote, urlencode, urlsplit
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .conf import emqx_settings
+
+
+class EMQXAPIError(Exception):
+    """
+    Raised when the EMQX REST API answers with an unexpected status.
+    """
+
+
+class EMQXAPIClient:
+    """
+    Minimal client of the EMQX v5 REST API over a single keep-alive connection.
+
+    Args:
+        base_url (str, optional): API root, e.g. "http://emqx:18083/api/v5". Defaults to `EMQX_API_URL`.
+        api_key (str, optional): API key, sent as basic auth user. Defaults to `EMQX_API_KEY`.
+        api_secret (str, optional): API secret. Defaults to `EMQX_API_SECRET`.
+        timeout (float, optional): Socket timeout in seconds. Defaults to 30.
+    """
+
+    def __init__(self, base_url=None, api_key=None, api_secret=None, timeout=30):
+        base_url = base_url or emqx_settings.EMQX_API_URL or f"http://{emqx_settings.EMQX_BROKER}:18083/api/v5"
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.path = url.path.rstrip("/")
+        self.timeout = timeout
+        self.headers = {"Accept": "application/json", "Connection": "keep-alive"}
+        api_key = api_key or emqx_settings.EMQX_API_KEY
+        api_secret = api_secret or emqx_settings.EMQX_API_SECRET
+        if api_key:
+            credentials = base64.b64encode(f"{api_key}:{api_secret or ''}".encode()).decode()
+            self.headers["Authorization"] = f"Basic {credentials}"
+        self._connection = None
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return connection_class(self.host, timeout=self.timeout)
+
+    def request(self, path, params=None):
+        """
+        Send a GET request and decode the JSON response.
+
+        Args:
+            path (str): Path below the API root, e.g. "/clients".
+            params (dict, optional): Query parameters.
+
+        Returns:
+            tuple: The HTTP status and the decoded body (None if empty).
+
+        Raises:
+            EMQXAPIError: If the connection fails twice.
+        """
+        url = self.path + path + (f"?{urlencode(params)}" if params else "")
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.request("GET", url, headers=self.headers)
+                response = self._connection.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                # The broker may have closed the idle keep-alive connection, retry once on a new one
+                self.close()
+                if attempt:
+                    raise EMQXAPIError(f"Request to EMQX API failed: {e}")
+        return response.status, (json.loads(body) if body else None)
+
+    def iter_connected_clients(self, page_size=10000):
+        """
+        Yield the IDs of all clients connected to the cluster, page by page.
+
+        Args:
+            page_size (int, optional): Clients per request. Defaults to 10000 (EMQX's maximum).
+        """
+        page = 1
+        while True:
+            status, body = self.request("/clients", {"page": page, "limit": page_size, "conn_state": "connected"})
+            if status != 200:
+                raise EMQXAPIError(f"EMQX API returned {status} for page {page} of /clients")
+            for client in body.get("data", []):
+                yield client["clientid"]
+            if not body.get("meta", {}).get("hasnext"):
+                break
+            page += 1
+
+    def is_connected(self, client_id):
+        """
+        Check whether a single client is currently connected.
+        """
+        status, body = self.request(f"/clients/{quote(client_id, safe='')}")
+        if status == 404:
+            return False
+        if status != 200:
+            raise EMQXAPIError(f"EMQX API returned {status} for client '{client_id}'")
+        return bool(body.get("connected", True))
+
+    def close(self):
+        """Close the connection."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def reconcile_presence(connected, verify=None, chunk_size=5000, dry_run=False, started_at=None):
+    """
+    Fix `EMQXDevice.active` and `last_status` to match the connected clients.
+
+    Args:
+        connected (set): IDs of the clients EMQX reports as connected.
+        verify (callable, optional): Called with a client ID before a device is marked
+            offline; returning True keeps it online. Guards against clients missed while
+            paging through a changing client list.
+        chunk_size (int, optional): Devices read and updated per query. Defaults to 5000.
+        dry_run (bool, optional): Only count the drift. Defaults to False.
+        started_at (datetime, optional): Devices updated after this time, e.g. by webhooks
+            during the reconciliation, are left alone. Defaults to now.
+
+    Returns:
+        dict: Number of devices "checked", "marked_online" and "marked_offline", and the
+            number of connected clients without a device ("unknown").
+    """
+    from .models import EMQXDevice
+
+    started_at = started_at or timezone.now()
+    stats = {"checked": 0, "marked_online": 0, "marked_offline": 0, "unknown": 0}
+    known_connected = 0
+    last_id = 0
+
+    while True:
+        rows = list(
+            EMQXDevice.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "client_id", "last_status")[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        stats["checked"] += len(rows)
+
+        online_ids, offline_ids = [], []
+        for pk, client_id, last_status in rows:
+            if client_id in connected:
+                known_connected += 1
+                if last_status != "online":
+                    online_ids.append(pk)
+            elif last_status == "online" and not (verify and verify(client_id)):
+                offline_ids.append(pk)
+
+        if dry_run:
+            stats["marked_online"] += len(online_ids)
+            stats["marked_offline"] += len(offline_ids)
+            continue
+
+        # `updated_at` is set explicitly, since `update()` bypasses `auto_now`
+        now = timezone.now()
+        stale = EMQXDevice.objects.filter(Q(updated_at__lt=started_at) | Q(updated_at__isnull=True))
+        if online_ids:
+            stats["marked_online"] += stale.filter(id__in=online_ids).update(
+                active=True, last_status="online", updated_at=now
+            )
+        if offline_ids:
+            stats["marked_offline"] += stale.filter(id__in=offline_ids).update(
+                active=False, last_status="offline", updated_at=now
+            )
+
+    stats["unknown"] = len(connected) - known_connected
+    return stats
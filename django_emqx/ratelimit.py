@@ -0,0 +1,243 @@
+## django_emqx/ratelimit.py
+
+"""
+Token-bucket rate limiting of MQTT publishes.
+
+Every publish takes a token from the recipient's bucket and from a global
+bucket. Buckets hold up to `burst` tokens and refill at `rate` tokens per
+second. When a bucket is empty the configured policy applies:
+
+- "delay": wait for the next token (at most `max_delay` seconds, then drop),
+- "drop": skip the publish,
+- "coalesce": keep only the newest message per recipient and publish it as
+  soon as a token is available.
+
+Skipped publishes only affect MQTT; the notification itself is still stored
+and can be fetched through the API. Buckets live in process memory, or in a
+Django cache shared by all processes if `EMQX_RATE_LIMIT_CACHE` is set.
+"""
+
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .conf import emqx_settings
+
+POLICIES = ("delay", "drop", "coalesce")
+
+
+class LocalBucketStore:
+    """
+    Token buckets in process memory.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        """
+        Take a token from a bucket.
+
+        Args:
+            key (str): The bucket name.
+            rate (float): Tokens added per second.
+            burst (int): Bucket capacity.
+            now (float): The current time in seconds.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until the next token.
+        """
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def give_back(self, key, burst):
+        """Return a token taken from a bucket."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + 1), updated)
+
+
+class CacheBucketStore(LocalBucketStore):
+    """
+    Token buckets in a Django cache, shared by all processes using it.
+
+    Read-modify-write on the cache is not atomic, so concurrent processes may
+    occasionally let a few extra messages through; the limits are meant as a
+    safety net, not an exact quota.
+
+    Args:
+        alias (str): The name of the cache in `CACHES`.
+    """
+
+    def __init__(self, alias):
+        from django.core.cache import caches
+
+        super().__init__()
+        self._cache = caches[alias]
+
+    def take(self, key, rate, burst, now):
+        cache_key = f"emqx:ratelimit:{key}"
+        tokens, updated = self._cache.get(cache_key) or (burst, now)
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        # Idle buckets expire once they would be full again anyway
+        self._cache.set(cache_key, (tokens, now), timeout=int(burst / rate) + 1)
+        return wait
+
+    def give_back(self, key, burst):
+        cache_key = f"emqx:ratelimit:{key}"
+        state = self._cache.get(cache_key)
+        if state is not None:
+            tokens, updated = state
+            self._cache.set(cache_key, (min(burst, tokens + 1), updated))
+
+
+class RateLimiter:
+    """
+    Per-recipient and global token buckets with a policy for throttled publishes.
+
+    Args:
+        per_recipient (dict, optional): {"rate", "burst"} of each recipient's bucket, None to disable.
+            Defaults to `EMQX_RATE_LIMIT_PER_RECIPIENT`.
+        global_limit (dict, optional): {"rate", "burst"} of the global bucket, None to disable.
+            Defaults to `EMQX_RATE_LIMIT_GLOBAL`.
+        policy (str, optional): "delay", "drop" or "coalesce". Defaults to `EMQX_RATE_LIMIT_POLICY`.
+        max_delay (float, optional): Longest wait of the "delay" policy. Defaults to `EMQX_RATE_LIMIT_MAX_DELAY`.
+        store (LocalBucketStore, optional): Where buckets are kept. Defaults to the cache named by
+            `EMQX_RATE_LIMIT_CACHE`, or process memory.
+        clock (callable, optional): Returns the current time in seconds.
+        sleep (callable, optional): Used to wait by the "delay" policy.
+
+    Raises:
+        ImproperlyConfigured: If a bucket's rate is not positive or its burst is below 1.
+    """
+
+    _unset = object()
+
+    def __init__(self, per_recipient=_unset, global_limit=_unset, policy=None, max_delay=None,
+                 store=None, clock=None, sleep=None):
+        self.per_recipient = emqx_settings.EMQX_RATE_LIMIT_PER_RECIPIENT if per_recipient is self._unset else per_recipient
+        self.global_limit = emqx_settings.EMQX_RATE_LIMIT_GLOBAL if global_limit is self._unset else global_limit
+        for name, limit in (("EMQX_RATE_LIMIT_PER_RECIPIENT", self.per_recipient), ("EMQX_RATE_LIMIT_GLOBAL", self.global_limit)):
+            # Buckets divide by the rate and need room for at least one token
+            if limit and not (limit.get("rate", 0) > 0 and limit.get("burst", 0) >= 1):
+                raise ImproperlyConfigured(f"{name} needs a 'rate' above 0 and a 'burst' of at least 1, got {limit}")
+        self.policy = policy or emqx_settings.EMQX_RATE_LIMIT_POLICY
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown rate limit policy: '{self.policy}'")
+        self.max_delay = emqx_settings.EMQX_RATE_LIMIT_MAX_DELAY if max_delay is None else max_delay
+
+        if store is None:
+            alias = emqx_settings.EMQX_RATE_LIMIT_CACHE
+            store = CacheBucketStore(alias) if alias else LocalBucketStore()
+        self.store = store
+        # Shared cache buckets need a clock that is the same in every process
+        self.clock = clock or (time.time if isinstance(store, CacheBucketStore) else time.monotonic)
+        self.sleep = sleep or time.sleep
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._metrics = {"allowed": 0, "delayed": 0, "dropped": 0, "coalesced": 0, "delay_seconds": 0.0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _take(self, recipient_id):
+        now = self.clock()
+        wait = 0
+        if self.per_recipient:
+            wait = self.store.take(f"user:{recipient_id}", self.per_recipient["rate"], self.per_recipient["burst"], now)
+            if wait:
+                return wait
+        if self.global_limit:
+            wait = self.store.take("global", self.global_limit["rate"], self.global_limit["burst"], now)
+            if wait and self.per_recipient:
+                # The publish does not happen now, so the recipient keeps its token
+                self.store.give_back(f"user:{recipient_id}", self.per_recipient["burst"])
+        return wait
+
+    def admit(self, recipient_id, message, send):
+        """
+        Decide whether a message may be published to a recipient now.
+
+        Args:
+            recipient_id (int): The recipient's user ID.
+            message (Message): The message to publish.
+            send (callable): Called as `send(recipient_id, message)` when the
+                "coalesce" policy publishes a held-back message later.
+
+        Returns:
+            bool: True if the caller should publish now.
+        """
+        if self.policy == "coalesce":
+            with self._lock:
+                # A newer message replaces the held-back one instead of overtaking it
+                if recipient_id in self._pending:
+                    self._pending[recipient_id] = (message, send)
+                    self._metrics["coalesced"] += 1
+                    return False
+
+        wait = self._take(recipient_id)
+        if not wait:
+            self._count("allowed")
+            return True
+
+        if self.policy == "delay":
+            waited = 0
+            while wait and waited + wait <= self.max_delay:
+                self.sleep(wait)
+                waited += wait
+                wait = self._take(recipient_id)
+            if not wait:
+                self._count("delayed")
+                self._count("delay_seconds", waited)
+                return True
+            self._count("dropped")
+            print(f"🚦 Rate limit: dropped MQTT notification {message.id} for user {recipient_id}")
+            return False
+
+        if self.policy == "coalesce":
+            with self._lock:
+                replaced = recipient_id in self._pending
+                self._pending[recipient_id] = (message, send)
+            if replaced:
+                self._count("coalesced")
+            else:
+                timer = threading.Timer(wait, self._flush_pending, args=(recipient_id,))
+                timer.daemon = True
+                timer.start()
+            return False
+
+        self._count("dropped")
+        print(f"🚦 Rate limit: dropped MQTT notification {message.id} for user {recipient_id}")
+        return False
+
+    def _flush_pending(self, recipient_id):
+        with self._lock:
+            message, send = self._pending.pop(recipient_id, (None, None))
+        if message is not None:
+            # Goes through `admit` again and is held back once more if still limited
+            send(recipient_id, message)
+
+    def metrics(self):
+        """
+        Return counters of throttled publishes.
+
+        Returns:
+            dict: allowed, delayed, dropped and coalesced publishes, total delay in
+                seconds and the number of messages currently held back.
+        """
+        with self._lock:
+            return {**self._metrics, "pending": len(self._pending)}
@@ -0,0 +1,436 @@
+## django_emqx/scheduler.py
+
+"""
+Scheduled message delivery.
+
+Messages with a future `send_at` are persisted together with their
+recipients (`ScheduledNotification`) and delivered by `MessageScheduler`.
+The scheduler loads messages due within the next time window through the
+partial index on `send_at` and keeps them in a hierarchical `TimerWheel`, so
+scheduling is O(1), firing is precise to the millisecond and neither the
+wheel nor the database is scanned per tick. Because the schedule lives in
+the database, it survives restarts; overdue messages fire on the next load.
+Several processes may run a scheduler: each message is claimed atomically.
+
+The claim is committed on its own and delivery runs outside of any
+transaction, since publishes cannot be rolled back. Recipient rows are only
+deleted once they were delivered, chunk by chunk when sending inline. A
+failed delivery hands the message back to the schedule with the rows still
+left, and messages claimed by a process that exited mid-delivery are released
+again after one window.
+"""
+
+import heapq
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .conf import emqx_settings
+
+WHEEL_TICK = 0.001
+WHEEL_SLOTS = (256, 64, 64, 64)
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel.
+
+    Level 0 has one slot per tick; each higher level has slots spanning a
+    whole revolution of the level below. Items are placed on the lowest level
+    that covers their due time and cascade down as time advances. Stretches
+    without items are skipped instead of stepped through tick by tick.
+
+    Args:
+        start (float): The current time in seconds.
+        tick (float, optional): Resolution in seconds. Defaults to 1 ms.
+        slots (tuple, optional): Number of slots per level.
+    """
+
+    def __init__(self, start, tick=WHEEL_TICK, slots=WHEEL_SLOTS):
+        self.tick = tick
+        self.slots = slots
+        self.spans = [1]
+        for count in slots[:-1]:
+            self.spans.append(self.spans[-1] * count)
+        # Items due further ahead (in ticks) wait in a heap until they fit on the wheel
+        self.horizon = self.spans[-1] * slots[-1]
+        self.current = int(start / tick)
+        self._levels = [[[] for _ in range(count)] for count in slots]
+        self._counts = [0] * len(slots)
+        self._ready = []
+        self._overflow = []
+        self._sequence = 0
+
+    def __len__(self):
+        return sum(self._counts) + len(self._ready) + len(self._overflow)
+
+    def schedule(self, due, item):
+        """
+        Add an item that is due at `due` (seconds, same clock as `start`).
+        """
+        self._place(math.ceil(due / self.tick - 1e-9), item)
+
+    def _place(self, due_tick, item):
+        delta = due_tick - self.current
+        if delta < 0:
+            self._ready.append(item)
+            return
+        for level, (count, span) in enumerate(zip(self.slots, self.spans)):
+            if delta < span * count:
+                self._levels[level][(due_tick // span) % count].append((due_tick, item))
+                self._counts[level] += 1
+                return
+        self._sequence += 1
+        heapq.heappush(self._overflow, (due_tick, self._sequence, item))
+
+    def _cascade(self, level):
+        slot = self._levels[level][(self.current // self.spans[level]) % self.slots[level]]
+        entries = slot[:]
+        slot.clear()
+        self._counts[level] -= len(entries)
+        for due_tick, item in entries:
+            self._place(due_tick, item)
+
+    def advance(self, now):
+        """
+        Move the wheel forward to `now` and return the items that became due.
+
+        Args:
+            now (float): The current time in seconds.
+
+        Returns:
+            list: Due items in order of their due time (within one tick in insertion order).
+        """
+        target = int(now / self.tick)
+        while self.current <= target:
+            while self._overflow and self._overflow[0][0] - self.current < self.horizon:
+                due_tick, _, item = heapq.heappop(self._overflow)
+                self._place(due_tick, item)
+
+            for level in range(len(self.slots) - 1, 0, -1):
+                if self.current % self.spans[level] == 0 and self._counts[level]:
+                    self._cascade(level)
+
+            slot = self._levels[0][self.current % self.slots[0]]
+            if slot:
+                self._counts[0] -= len(slot)
+                self._ready.extend(item for _, item in slot)
+                slot.clear()
+
+            self.current = min(target + 1, self._next_stop())
+
+        ready, self._ready = self._ready, []
+        return ready
+
+    def _next_stop(self):
+        """The next tick at which anything can happen."""
+        if self._counts[0]:
+            # The next occupied level-0 slot, or the next cascade into level 0
+            boundary = (self.current // self.spans[1] + 1) * self.spans[1] if len(self.slots) > 1 else math.inf
+            slots = self._levels[0]
+            tick = self.current + 1
+            while tick < boundary and not slots[tick % self.slots[0]]:
+                tick += 1
+            return tick
+        for level in range(1, len(self.slots)):
+            if self._counts[level]:
+                span = self.spans[level]
+                return (self.current // span + 1) * span
+        if self._overflow:
+            return max(self.current + 1, self._overflow[0][0] - self.horizon + 1)
+        return math.inf
+
+    def next_due(self):
+        """
+        Return the due time of the earliest item, or None if the wheel is empty.
+        """
+        if self._ready:
+            return self.current * self.tick
+
+        earliest = self._overflow[0][0] if self._overflow else math.inf
+        for level, (count, span) in enumerate(zip(self.slots, self.spans)):
+            if not self._counts[level]:
+                continue
+            # The first occupied slot holds the earliest items of this level
+            bucket = self.current // span
+            for offset in range(count + 1):
+                slot = self._levels[level][(bucket + offset) % count]
+                if slot:
+                    earliest = min(earliest, min(due_tick for due_tick, _ in slot))
+                    break
+        return None if earliest == math.inf else earliest * self.tick
+
+
+class DispatchTracker:
+    """
+    Finish a scheduled message once the dispatcher handled all of its recipients.
+
+    Used as `on_progress` callback of the dispatch job. After a complete delivery
+    the recipient rows are deleted; if a chunk failed, the message is released
+    with its rows, so it fires again (recipients already notified are skipped).
+
+    Args:
+        scheduler (MessageScheduler): The scheduler that fired the message.
+        message (Message): The message.
+        total (int): The number of recipients handed to the dispatcher.
+    """
+
+    def __init__(self, scheduler, message, total):
+        self.scheduler = scheduler
+        self.message = message
+        self.total = total
+        self.resolved = 0
+        self.failed = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def __call__(self, resolved, delivered, failed, done):
+        with self._lock:
+            self.resolved += resolved
+            self.failed += failed
+            # Finished once every recipient was handled, or the last chunk ended after expiry
+            if self.finished or (self.resolved < self.total and not (done and self.message.is_expired)):
+                return
+            self.finished = True
+
+        if self.failed:
+            self.scheduler.release(self.message.pk)
+        else:
+            self.scheduler.complete(self.message.pk)
+
+
+class MessageScheduler:
+    """
+    Deliver scheduled messages when they are due.
+
+    Args:
+        deliver (callable, optional): Called as `deliver(message, recipient_ids)` for
+            each due message. Defaults to the dispatcher if `EMQX_DISPATCH_ENABLED`,
+            otherwise `NotificationSenderMixin.send_notification_chunk`. If it returns a
+            `DispatchJob`, the message is finished by the job's progress callback.
+        window (float, optional): Seconds of upcoming messages loaded per database query.
+            Defaults to `EMQX_SCHEDULER_WINDOW`.
+        clock (callable, optional): Returns the current Unix time in seconds.
+    """
+
+    def __init__(self, deliver=None, window=None, clock=None):
+        self.deliver = deliver or self._deliver
+        self.window = window or emqx_settings.EMQX_SCHEDULER_WINDOW
+        self.clock = clock or time.time
+        self.wheel = TimerWheel(self.clock())
+        self.fired = 0
+        self._loaded = set()
+        self._loaded_until = None
+        self._held = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopping = False
+
+    def _deliver(self, message, recipient_ids):
+        if emqx_settings.EMQX_DISPATCH_ENABLED:
+            from . import get_dispatcher
+            with self._lock:
+                self._held.add(message.pk)
+            return get_dispatcher().submit(
+                message, recipient_ids, on_progress=DispatchTracker(self, message, len(recipient_ids))
+            )
+
+        from .mixins import NotificationSenderMixin
+        from .models import Message, ScheduledNotification
+        sender = NotificationSenderMixin()
+        chunk_size = emqx_settings.EMQX_DISPATCH_CHUNK_SIZE
+        for start in range(0, len(recipient_ids), chunk_size):
+            chunk = recipient_ids[start:start + chunk_size]
+            sender.send_notification_chunk(message, chunk)
+            # A retry only resends the chunks left; renewing the claim keeps a long
+            # delivery from being released as stale by another process
+            ScheduledNotification.objects.filter(message=message, recipient_id__in=chunk).delete()
+            Message.objects.filter(pk=message.pk).update(dispatched_at=timezone.now())
+
+    def schedule(self, message):
+        """
+        Put a message on the wheel right away if it is due within the loaded window.
+
+        Messages due later are picked up by a later load.
+
+        Args:
+            message (Message): A saved message with `send_at`.
+        """
+        with self._lock:
+            if self._loaded_until is None or message.send_at >= self._loaded_until:
+                return
+            if message.pk in self._loaded:
+                return
+            self._loaded.add(message.pk)
+            self.wheel.schedule(message.send_at.timestamp(), message.pk)
+        self._wakeup.set()
+
+    def load(self):
+        """
+        Load the messages due before the end of the next window onto the wheel.
+
+        Messages claimed more than a window ago whose recipients were not all
+        delivered, e.g. because their process exited, are released first.
+
+        Returns:
+            int: The number of newly loaded messages.
+        """
+        from .models import Message
+
+        now = datetime.fromtimestamp(self.clock(), tz=dt_timezone.utc)
+        self.release_stale(before=now - timedelta(seconds=self.window))
+
+        until = now + timedelta(seconds=self.window)
+        due = Message.objects.scheduled(before=until).order_by("send_at").values_list("pk", "send_at")
+        loaded = 0
+        with self._lock:
+            for pk, send_at in due.iterator(chunk_size=10000):
+                if pk not in self._loaded:
+                    self._loaded.add(pk)
+                    self.wheel.schedule(send_at.timestamp(), pk)
+                    loaded += 1
+            self._loaded_until = until
+        return loaded
+
+    def release_stale(self, before):
+        """
+        Release messages claimed before the given time that still have undelivered recipients.
+
+        Messages whose dispatch job is still held by this process are kept.
+
+        Returns:
+            int: The number of released messages.
+        """
+        from .models import Message, ScheduledNotification
+
+        with self._lock:
+            held = list(self._held)
+        pending = ScheduledNotification.objects.filter(message__dispatched_at__lt=before).values("message_id")
+        return Message.objects.filter(pk__in=pending).exclude(pk__in=held).update(dispatched_at=None)
+
+    def fire(self, pk):
+        """
+        Claim a scheduled message and deliver it to its recipients.
+
+        The claim is committed before delivery, which runs outside of a
+        transaction. If delivery fails, the message is released with the
+        recipient rows not delivered yet and fires again.
+
+        Args:
+            pk (int): The primary key of the message.
+
+        Returns:
+            bool: False if the message was already dispatched, e.g. by another process.
+        """
+        from .dispatch import DispatchJob
+        from .models import Message, ScheduledNotification
+
+        with transaction.atomic():
+            claimed = Message.objects.scheduled().filter(pk=pk).update(dispatched_at=timezone.now())
+            if not claimed:
+                return False
+            message = Message.objects.get(pk=pk)
+            scheduled = ScheduledNotification.objects.filter(message=message)
+            recipient_ids = list(scheduled.values_list("recipient_id", flat=True))
+
+        job = None
+        try:
+            if message.is_expired:
+                print(f"⌛ Scheduled message {pk} expired, not sent")
+            elif recipient_ids:
+                job = self.deliver(message, recipient_ids)
+        except Exception:
+            self.release(pk)
+            raise
+        if not isinstance(job, DispatchJob):
+            scheduled.delete()
+        self.fired += 1
+        return True
+
+    def complete(self, pk):
+        """
+        Delete the recipient rows of a delivered message.
+        """
+        from .models import ScheduledNotification
+
+        ScheduledNotification.objects.filter(message_id=pk).delete()
+        with self._lock:
+            self._held.discard(pk)
+
+    def release(self, pk):
+        """
+        Hand a claimed message back to the schedule, keeping its recipient rows.
+        """
+        from .models import Message
+
+        Message.objects.filter(pk=pk).update(dispatched_at=None)
+        with self._lock:
+            self._held.discard(pk)
+
+    def run_pending(self):
+        """
+        Reload the window if needed and fire all due messages.
+
+        Returns:
+            float: Seconds until the next due message or reload.
+        """
+        now = self.clock()
+        if self._loaded_until is None or now >= self._loaded_until.timestamp() - self.window / 2:
+            self.load()
+
+        with self._lock:
+            due = self.wheel.advance(self.clock())
+        for pk in due:
+            try:
+                self.fire(pk)
+            except Exception as e:
+                print(f"❌ Failed to deliver scheduled message {pk}: {e}")
+            finally:
+                # An unclaimed or failed (released) message is loaded again with the next window
+                with self._lock:
+                    self._loaded.discard(pk)
+
+        next_load = self._loaded_until.timestamp() - self.window / 2
+        with self._lock:
+            next_due = self.wheel.next_due()
+        wake_at = next_load if next_due is None else min(next_load, next_due)
+        return max(0, wake_at - self.clock())
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                close_old_connections()
+                timeout = self.run_pending()
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+        finally:
+            close_old_connections()
+
+    def start(self):
+        """
+        Start the scheduler thread (idempotent).
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="emqx-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the scheduler thread. Pending messages stay scheduled in the database.
+
+        Args:
+            timeout (float, optional): Maximum time to wait for the thread.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -2,7 +2,53 @@
 
 from rest_framework import serializers
 
-from .models import EMQXDevice, Notification
+from .models import BulkSendJob, EMQXDevice, Message, Notification
+from .templating import render, validate_template
+
+
+def compile_row_serializer(serializer_class):
+    """
+    Compile a serializer's fields into a function that shapes `values_list()` rows.
+
+    The serializer is instantiated once; only fields whose representation
+    differs from the database value (dates and times) are converted per row,
+    with the serializer's own field, so the output matches `serializer.data`.
+
+    Args:
+        serializer_class (type): A `ModelSerializer` with plain and dotted-source fields.
+
+    Returns:
+        tuple: The `values_list()` columns and a function turning one row into a dict.
+    """
+    fields = serializer_class().fields
+    opts = serializer_class.Meta.model._meta
+    names = list(fields)
+    columns = []
+    for field in fields.values():
+        if "." in field.source:
+            columns.append(field.source.replace(".", "__"))
+        else:
+            # Foreign keys are read as their ID column, like `PrimaryKeyRelatedField` represents them
+            columns.append(opts.get_field(field.source).attname)
+
+    converters = [
+        (index, field.to_representation)
+        for index, field in enumerate(fields.values())
+        if isinstance(field, (serializers.DateTimeField, serializers.DateField, serializers.TimeField))
+    ]
+
+    if not converters:
+        def serialize(row):
+            return dict(zip(names, row))
+    else:
+        def serialize(row):
+            row = list(row)
+            for index, convert in converters:
+                if row[index] is not None:
+                    row[index] = convert(row[index])
+            return dict(zip(names, row))
+
+    return tuple(columns), serialize
 
 class EMQXDeviceSerializer(serializers.ModelSerializer):
     """
@@ -35,8 +81,60 @@ class NotificationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['title', 'body', 'delivered_at', 'acknowledged_at', 'is_acknowledged']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.context is not None:
+            # Personalized message: title and body are templates
+            data['title'] = render(data['title'], instance.context)
+            data['body'] = render(data['body'], instance.context)
+        return data
+
     def update(self, instance, validated_data):
         if self.context['request'].data.get('acknowledge'):
             instance.acknowledge()
         return super().update(instance, validated_data)
 
+
+class BulkSendSerializer(serializers.ModelSerializer):
+    """
+    Serializer for bulk send requests: the message fields plus the audience spec.
+    """
+    audience = serializers.JSONField(write_only=True)
+
+    class Meta:
+        model = Message
+        fields = [
+            'topic', 'title', 'body', 'data', 'priority', 'expires_at', 'collapse_key', 'personalized', 'audience',
+        ]
+
+    def validate(self, attrs):
+        if attrs.get('personalized'):
+            errors = {}
+            for field in ('title', 'body'):
+                try:
+                    validate_template(attrs.get(field))
+                except ValueError as e:
+                    errors[field] = [str(e)]
+            if errors:
+                raise serializers.ValidationError(errors)
+        return attrs
+
+
+class BulkSendJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the progress of a bulk send.
+    """
+    job_id = serializers.IntegerField(source='id', read_only=True)
+
+    class Meta:
+        model = BulkSendJob
+        fields = [
+            'job_id',
+            'message',
+            'status',
+            'resolved',
+            'delivered',
+            'failed',
+            'created_at',
+            'finished_at',
+        ]
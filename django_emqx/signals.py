@@ -4,4 +4,16 @@ from django.dispatch import Signal
 
 emqx_device_connected = Signal()
 new_emqx_device_connected = Signal()
-emqx_device_disconnected = Signal()
\ No newline at end of file
+emqx_device_disconnected = Signal()
+
+# Batch variants: receivers get `events`, a list of dicts with the keyword
+# arguments of the single-event signal, collected over a short interval.
+emqx_devices_connected_batch = Signal()
+new_emqx_devices_connected_batch = Signal()
+emqx_devices_disconnected_batch = Signal()
+
+BATCH_SIGNALS = {
+    emqx_device_connected: emqx_devices_connected_batch,
+    new_emqx_device_connected: new_emqx_devices_connected_batch,
+    emqx_device_disconnected: emqx_devices_disconnected_batch,
+}
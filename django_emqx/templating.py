@@ -0,0 +1,118 @@
+## django_emqx/templating.py
+
+"""
+Per-recipient templating of personalized messages.
+
+A message with `personalized=True` is one `Message` row whose `title` and
+`body` are Jinja2 templates, e.g. "Hi {{ first_name }}". Templates are
+compiled once per distinct source and rendered in a sandbox. For each chunk
+of recipients, the user columns the templates refer to (limited to
+`EMQX_TEMPLATE_FIELDS`) are fetched with one query. Each `Notification`
+stores only these variables in `context`; the notification list renders
+title and body from them again instead of storing copies.
+"""
+
+import functools
+
+from django.contrib.auth import get_user_model
+from jinja2 import TemplateSyntaxError, meta
+from jinja2.sandbox import SandboxedEnvironment
+
+from .conf import emqx_settings
+
+TEMPLATE_CACHE_SIZE = 1024
+
+environment = SandboxedEnvironment(autoescape=False)
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(source):
+    """
+    Compile a template source, once per distinct source.
+
+    Raises:
+        TemplateSyntaxError: If the source is not a valid template.
+    """
+    return environment.from_string(source)
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def template_variables(source):
+    """
+    Return the names of the variables a template source refers to.
+    """
+    return frozenset(meta.find_undeclared_variables(environment.parse(source)))
+
+
+def validate_template(source):
+    """
+    Check that a template compiles and only refers to `EMQX_TEMPLATE_FIELDS`.
+
+    Args:
+        source (str): The template source (may be None).
+
+    Raises:
+        ValueError: If the template is invalid or refers to other variables.
+    """
+    if not source:
+        return
+    try:
+        variables = template_variables(source)
+    except TemplateSyntaxError as e:
+        raise ValueError(f"Invalid template: {e.message}")
+    unknown = variables - set(emqx_settings.EMQX_TEMPLATE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown template variables: {', '.join(sorted(unknown))}")
+
+
+def render(source, context):
+    """
+    Render a template source with a recipient's variables; empty sources stay as they are.
+    """
+    if not source:
+        return source
+    return compile_template(source).render(context)
+
+
+def recipient_contexts(message, recipient_ids):
+    """
+    Fetch the template variables of a chunk of recipients with one query.
+
+    Args:
+        message (Message): A personalized message.
+        recipient_ids (list): User IDs of the recipients.
+
+    Returns:
+        dict: The variables of each existing recipient, keyed by user ID.
+    """
+    variables = set()
+    for source in (message.title, message.body):
+        if source:
+            variables |= template_variables(source)
+    fields = sorted(variables & set(emqx_settings.EMQX_TEMPLATE_FIELDS))
+
+    rows = get_user_model().objects.filter(pk__in=recipient_ids).values_list("pk", *fields)
+    return {row[0]: dict(zip(fields, row[1:])) for row in rows}
+
+
+class PersonalizedMessage:
+    """
+    A message as seen by one recipient: rendered `title` and `body`, all other
+    attributes of the underlying message.
+
+    The MQTT payload cache of `encode_mqtt_payload` lives on this object, so
+    each recipient gets their own payload.
+
+    Args:
+        message (Message): The personalized message.
+        context (dict): The recipient's template variables.
+    """
+
+    def __init__(self, message, context):
+        self.message = message
+        self.context = context
+        self.title = render(message.title, context)
+        self.body = render(message.body, context)
+
+    def __getattr__(self, name):
+        return getattr(self.message, name)
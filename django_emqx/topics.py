@@ -0,0 +1,176 @@
+## django_emqx/topics.py
+
+"""
+MQTT topic filter matching.
+
+`TopicTrie` stores topic filters (with the `+` and `#` wildcards) level by
+level, so resolving a published topic to the values registered for all
+matching filters costs O(topic depth) instead of testing every filter.
+"""
+
+SINGLE_LEVEL_WILDCARD = "+"
+MULTI_LEVEL_WILDCARD = "#"
+
+
+def topic_matches(topic_filter, topic):
+    """
+    Check whether a topic filter matches a concrete topic name.
+
+    Args:
+        topic_filter (str): The topic filter, e.g. "user/+/alerts" or "user/#".
+        topic (str): The concrete topic name, e.g. "user/42/alerts".
+
+    Returns:
+        bool: True if the filter matches the topic.
+    """
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+
+    # Wildcards at the first level never match topics starting with "$" (MQTT 4.7.2).
+    if topic.startswith("$") and filter_levels[0] in (SINGLE_LEVEL_WILDCARD, MULTI_LEVEL_WILDCARD):
+        return False
+
+    for index, level in enumerate(filter_levels):
+        if level == MULTI_LEVEL_WILDCARD:
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != SINGLE_LEVEL_WILDCARD and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _TrieNode:
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children = {}
+        self.values = set()
+
+
+class TopicTrie:
+    """
+    In-memory trie of MQTT topic filters mapping to arbitrary hashable values.
+
+    Example:
+        trie = TopicTrie()
+        trie.add("user/+/alerts", device_id)
+        trie.match("user/42/alerts")  # -> {device_id}
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, topic_filter, value):
+        """
+        Register a value for a topic filter.
+
+        Args:
+            topic_filter (str): The topic filter.
+            value: Any hashable value, typically a device ID.
+        """
+        node = self._root
+        for level in topic_filter.split("/"):
+            node = node.children.setdefault(level, _TrieNode())
+        if value not in node.values:
+            node.values.add(value)
+            self._size += 1
+
+    def remove(self, topic_filter, value):
+        """
+        Unregister a value from a topic filter and prune empty branches.
+
+        Args:
+            topic_filter (str): The topic filter.
+            value: The value previously passed to `add`.
+
+        Returns:
+            bool: True if the value was registered for the filter.
+        """
+        path = [self._root]
+        levels = topic_filter.split("/")
+        for level in levels:
+            node = path[-1].children.get(level)
+            if node is None:
+                return False
+            path.append(node)
+
+        if value not in path[-1].values:
+            return False
+        path[-1].values.discard(value)
+        self._size -= 1
+
+        for depth in range(len(levels), 0, -1):
+            node = path[depth]
+            if node.values or node.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+        return True
+
+    def match(self, topic):
+        """
+        Resolve a published topic to the values of all matching filters.
+
+        Args:
+            topic (str): The concrete topic name.
+
+        Returns:
+            set: The union of the values registered for every matching filter.
+        """
+        levels = topic.split("/")
+        matches = set()
+        nodes = [self._root]
+
+        for depth, level in enumerate(levels):
+            next_nodes = []
+            for node in nodes:
+                # Wildcards at the first level never match topics starting with "$".
+                wildcards_allowed = depth > 0 or not level.startswith("$")
+                if wildcards_allowed:
+                    hash_node = node.children.get(MULTI_LEVEL_WILDCARD)
+                    if hash_node is not None:
+                        matches |= hash_node.values
+                    plus_node = node.children.get(SINGLE_LEVEL_WILDCARD)
+                    if plus_node is not None:
+                        next_nodes.append(plus_node)
+                exact_node = node.children.get(level)
+                if exact_node is not None:
+                    next_nodes.append(exact_node)
+            nodes = next_nodes
+            if not nodes:
+                return matches
+
+        for node in nodes:
+            matches |= node.values
+            # "a/#" also matches the parent level "a".
+            hash_node = node.children.get(MULTI_LEVEL_WILDCARD)
+            if hash_node is not None:
+                matches |= hash_node.values
+        return matches
+
+    @classmethod
+    def from_subscriptions(cls, subscriptions=None, chunk_size=10000):
+        """
+        Build a trie of device IDs from stored subscriptions.
+
+        Args:
+            subscriptions (QuerySet, optional): The subscriptions to load.
+                Defaults to all `EMQXSubscription` rows of active devices.
+            chunk_size (int, optional): Rows fetched per database round trip.
+
+        Returns:
+            TopicTrie: A trie mapping topic filters to device IDs.
+        """
+        from .models import EMQXSubscription
+
+        if subscriptions is None:
+            subscriptions = EMQXSubscription.objects.filter(device__active=True)
+
+        trie = cls()
+        for topic_filter, device_id in subscriptions.values_list("topic", "device_id").iterator(chunk_size=chunk_size):
+            trie.add(topic_filter, device_id)
+        return trie
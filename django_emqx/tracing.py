@@ -0,0 +1,359 @@
+## django_emqx/tracing.py
+
+"""
+Tracing of the webhook, fan-out and publish paths.
+
+With `EMQX_TRACING_ENABLED`, spans are recorded for webhook requests and the
+client event handlers, notification chunks (database insert, payload
+encoding), MQTT publishes from enqueue to PUBACK and Firebase calls. The
+backend is chosen by `EMQX_TRACING_BACKEND`:
+
+- "builtin": a lightweight tracer that samples new traces with probability
+  `EMQX_TRACING_SAMPLE_RATE` (child spans follow their parent's decision) and
+  passes finished spans to the exporter created from `EMQX_TRACING_EXPORTER`,
+  by default an `InMemoryExporter`.
+- "opentelemetry": spans are created with the OpenTelemetry API, so sampling
+  and export follow the configured OpenTelemetry SDK.
+
+Trace context is propagated as W3C `traceparent`, e.g. as user property of
+MQTT v5 publishes. When tracing is disabled, `get_tracer()` returns a
+`NoopTracer` whose spans are a single shared object, so instrumented code
+only pays for a method call.
+"""
+
+import contextlib
+import contextvars
+import functools
+import random
+import re
+import time
+from collections import deque
+
+from django.utils.module_loading import import_string
+
+from . import get_tracer
+from .conf import emqx_settings
+
+BACKENDS = ("builtin", "opentelemetry")
+TRACEPARENT = "traceparent"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span = contextvars.ContextVar("emqx_current_span", default=None)
+
+
+class SpanContext:
+    """
+    The identity of a span as propagated to other processes.
+
+    Args:
+        trace_id (str): 32 hex digits shared by all spans of a trace.
+        span_id (str): 16 hex digits identifying the span.
+        sampled (bool): Whether the spans of the trace are recorded.
+    """
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @property
+    def traceparent(self):
+        """The context as W3C `traceparent` header value."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value):
+    """
+    Parse a W3C `traceparent` value.
+
+    Args:
+        value (str): E.g. "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01".
+
+    Returns:
+        SpanContext or None: The remote context, or None if the value is invalid.
+    """
+    match = TRACEPARENT_PATTERN.match(value or "")
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+class NoopSpan:
+    """
+    The span of a disabled tracer; accepts everything and records nothing.
+    """
+
+    context = None
+    is_recording = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class NoopTracer:
+    """
+    The tracer used while `EMQX_TRACING_ENABLED` is off.
+    """
+
+    enabled = False
+
+    def span(self, name, parent=None, **attributes):
+        return NOOP_SPAN
+
+    def current_context(self):
+        return None
+
+    def inject(self, carrier):
+        return carrier
+
+
+class Span:
+    """
+    A timed operation of the builtin tracer.
+
+    Used as context manager, the span is the parent of all spans started
+    inside it. An exception leaving the block marks the span as failed.
+    Times are nanoseconds since the epoch, like OpenTelemetry's.
+    """
+
+    __slots__ = ("name", "context", "parent_id", "attributes", "start_time", "end_time", "status", "_tracer", "_token")
+
+    def __init__(self, tracer, name, context, parent_id, attributes):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_time = None
+        self.end_time = None
+        self.status = "ok"
+        self._tracer = tracer
+        self._token = None
+
+    @property
+    def is_recording(self):
+        return self.context.sampled
+
+    @property
+    def duration(self):
+        """Seconds between start and end of the span."""
+        return (self.end_time - self.start_time) / 1e9
+
+    def set_attribute(self, key, value):
+        if self.context.sampled:
+            self.attributes[key] = value
+
+    def record_exception(self, exc):
+        self.status = "error"
+        self.set_attribute("exception.type", type(exc).__name__)
+        self.set_attribute("exception.message", str(exc))
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start_time = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_time = time.time_ns()
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.record_exception(exc)
+        if self.context.sampled:
+            self._tracer.export(self)
+        return False
+
+    def __repr__(self):
+        return f"<Span {self.name} {self.context.traceparent}>"
+
+
+class InMemoryExporter:
+    """
+    Keep the most recent finished spans in memory, e.g. for tests or a debug view.
+
+    Args:
+        maxlen (int, optional): Spans kept. Defaults to 10000.
+    """
+
+    def __init__(self, maxlen=10000):
+        self.spans = deque(maxlen=maxlen)
+
+    def __call__(self, span):
+        self.spans.append(span)
+
+    def get_finished_spans(self, name=None):
+        """
+        Return the finished spans in the order they ended.
+
+        Args:
+            name (str, optional): Only return spans of this name.
+        """
+        return [span for span in self.spans if name is None or span.name == name]
+
+    def clear(self):
+        self.spans.clear()
+
+
+class Tracer:
+    """
+    The builtin tracer with probabilistic, parent-based sampling.
+
+    Args:
+        exporter (callable, optional): Called with every finished sampled span.
+            Defaults to a new `InMemoryExporter`.
+        sample_rate (float, optional): Probability that a new trace is recorded.
+            Defaults to `EMQX_TRACING_SAMPLE_RATE`.
+        rng (callable, optional): Returns a float in [0, 1) for sampling decisions.
+    """
+
+    enabled = True
+
+    def __init__(self, exporter=None, sample_rate=None, rng=random.random):
+        self.exporter = InMemoryExporter() if exporter is None else exporter
+        self.sample_rate = emqx_settings.EMQX_TRACING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._rng = rng
+
+    def span(self, name, parent=None, **attributes):
+        """
+        Create a span; use it as context manager to time a block.
+
+        Args:
+            name (str): The operation, e.g. "mqtt.publish".
+            parent (SpanContext or str, optional): Parent context or `traceparent` value, e.g.
+                of a job queued in another thread. Defaults to the span currently active.
+            **attributes: Attributes of the span.
+
+        Returns:
+            Span: The new span.
+        """
+        if isinstance(parent, str):
+            parent = parse_traceparent(parent)
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+
+        span_id = f"{random.getrandbits(64):016x}"
+        if parent is None:
+            context = SpanContext(f"{random.getrandbits(128):032x}", span_id, self._rng() < self.sample_rate)
+            return Span(self, name, context, None, attributes)
+        return Span(self, name, SpanContext(parent.trace_id, span_id, parent.sampled), parent.span_id, attributes)
+
+    def current_context(self):
+        """
+        Return the context of the active span, to continue the trace elsewhere.
+
+        Returns:
+            SpanContext or None: None outside of spans.
+        """
+        current = _current_span.get()
+        return current.context if current is not None else None
+
+    def inject(self, carrier):
+        """
+        Add the `traceparent` of the active span to a dict, e.g. of MQTT user properties.
+
+        Returns:
+            dict: The carrier.
+        """
+        context = self.current_context()
+        if context is not None:
+            carrier[TRACEPARENT] = context.traceparent
+        return carrier
+
+    def export(self, span):
+        try:
+            self.exporter(span)
+        except Exception as e:
+            print(f"❌ Exporting span {span.name} failed: {e}")
+
+
+class OpenTelemetryTracer:
+    """
+    Create spans with the OpenTelemetry API.
+
+    Sampling, processing and export are up to the OpenTelemetry SDK configured
+    by the project (e.g. `OTEL_TRACES_SAMPLER`); without an SDK all spans are
+    non-recording.
+
+    Raises:
+        ImportError: If `opentelemetry-api` is not installed.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        try:
+            from opentelemetry import context, propagate, trace
+        except ImportError:
+            raise ImportError("opentelemetry-api is not installed. Install it to use the opentelemetry backend.")
+        self._context = context
+        self._propagate = propagate
+        self._tracer = trace.get_tracer("django_emqx")
+
+    @contextlib.contextmanager
+    def span(self, name, parent=None, **attributes):
+        if isinstance(parent, str):
+            parent = self._propagate.extract({TRACEPARENT: parent})
+        with self._tracer.start_as_current_span(name, context=parent, attributes=attributes) as span:
+            yield span
+
+    def current_context(self):
+        return self._context.get_current()
+
+    def inject(self, carrier):
+        self._propagate.inject(carrier)
+        return carrier
+
+
+def build_tracer():
+    """
+    Create the tracer described by the `EMQX_TRACING_*` settings.
+
+    Returns:
+        NoopTracer, Tracer or OpenTelemetryTracer: The tracer.
+
+    Raises:
+        ValueError: If `EMQX_TRACING_BACKEND` is unknown.
+    """
+    if not emqx_settings.EMQX_TRACING_ENABLED:
+        return NoopTracer()
+
+    backend = emqx_settings.EMQX_TRACING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown tracing backend: '{backend}'")
+    if backend == "opentelemetry":
+        return OpenTelemetryTracer()
+
+    exporter = emqx_settings.EMQX_TRACING_EXPORTER
+    return Tracer(exporter=import_string(exporter)() if exporter else None)
+
+
+def traced(name):
+    """
+    Decorator recording a span of the given name around each call.
+
+    With tracing disabled the function is called directly.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,144 @@
+## django_emqx/tuning.py
+
+"""
+Performance tuning of generated EMQX configs.
+
+`generate_emqx_config` renders listener, TCP and webhook connector settings
+from a tuning dict. Named profiles give starting points for typical loads:
+
+- "small": a single small broker, EMQX's defaults with fewer acceptors,
+- "large-fanout": many long-lived subscribers receiving lots of messages, so
+  larger socket buffers and high watermarks,
+- "high-churn": devices connecting and disconnecting frequently, so more
+  acceptors, a higher connection rate and more webhook throughput.
+
+With the expected number of connections and the broker's CPU cores the
+connection limits, acceptors and pool sizes are derived from these counts;
+individual values can be overridden last.
+"""
+
+import re
+
+# EMQX's own defaults, as previously hardcoded in the template
+DEFAULT_TUNING = {
+    "acceptors": 16,
+    "active_n": 100,
+    "tcp_buffer": "4KB",
+    "high_watermark": "1MB",
+    "max_connections": "infinity",
+    "max_conn_rate": "infinity",
+    "webhook_pool_size": 8,
+    "webhook_pipelining": 100,
+    "action_workers": 16,
+    "action_inflight_window": 100,
+}
+
+PROFILES = {
+    "small": {
+        "acceptors": 4,
+        "webhook_pool_size": 4,
+        "action_workers": 4,
+    },
+    "large-fanout": {
+        "active_n": 200,
+        "tcp_buffer": "16KB",
+        "high_watermark": "8MB",
+        "webhook_pool_size": 16,
+    },
+    "high-churn": {
+        "acceptors": 64,
+        "max_conn_rate": "5000/s",
+        "webhook_pool_size": 64,
+        "webhook_pipelining": 200,
+        "action_workers": 32,
+        "action_inflight_window": 500,
+    },
+}
+
+# Per profile: acceptors and webhook connections per core, and the seconds in
+# which all expected connections may (re)connect
+PROFILE_FACTORS = {
+    None: {"acceptors_per_core": 2, "pool_per_core": 2, "reconnect_window": 60},
+    "small": {"acceptors_per_core": 1, "pool_per_core": 1, "reconnect_window": 60},
+    "large-fanout": {"acceptors_per_core": 2, "pool_per_core": 2, "reconnect_window": 120},
+    "high-churn": {"acceptors_per_core": 4, "pool_per_core": 8, "reconnect_window": 10},
+}
+
+CONNECTION_HEADROOM = 1.2
+
+SIZE_PATTERN = re.compile(r"^[1-9][0-9]*(KB|MB|GB)$")
+RATE_PATTERN = re.compile(r"^[1-9][0-9]*/(s|m)$")
+POSITIVE_INTEGERS = ("acceptors", "active_n", "webhook_pool_size", "webhook_pipelining",
+                     "action_workers", "action_inflight_window")
+
+
+def validate_tuning(tuning):
+    """
+    Check tuning values before they are rendered into a config.
+
+    Args:
+        tuning (dict): Values keyed like `DEFAULT_TUNING`.
+
+    Raises:
+        ValueError: If a value is missing, unknown or malformed.
+    """
+    unknown = set(tuning) - set(DEFAULT_TUNING)
+    if unknown:
+        raise ValueError(f"Unknown tuning options: {', '.join(sorted(unknown))}")
+    missing = set(DEFAULT_TUNING) - set(tuning)
+    if missing:
+        raise ValueError(f"Missing tuning options: {', '.join(sorted(missing))}")
+
+    for name in POSITIVE_INTEGERS:
+        value = tuning[name]
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError(f"'{name}' must be a positive integer, got {value!r}")
+    for name in ("tcp_buffer", "high_watermark"):
+        if not SIZE_PATTERN.match(str(tuning[name])):
+            raise ValueError(f"'{name}' must be a size like '4KB' or '1MB', got {tuning[name]!r}")
+
+    max_connections = tuning["max_connections"]
+    if max_connections != "infinity" and (not isinstance(max_connections, int) or max_connections < 1):
+        raise ValueError(f"'max_connections' must be 'infinity' or a positive integer, got {max_connections!r}")
+    if tuning["max_conn_rate"] != "infinity" and not RATE_PATTERN.match(str(tuning["max_conn_rate"])):
+        raise ValueError(f"'max_conn_rate' must be 'infinity' or a rate like '1000/s', got {tuning['max_conn_rate']!r}")
+
+
+def build_tuning(profile=None, connections=None, cores=None, overrides=None):
+    """
+    Assemble the tuning values for a broker.
+
+    Args:
+        profile (str, optional): "small", "large-fanout" or "high-churn". Defaults to EMQX's defaults.
+        connections (int, optional): Expected concurrent connections per broker.
+        cores (int, optional): CPU cores of the broker.
+        overrides (dict, optional): Values that take precedence over everything else;
+            None values are ignored.
+
+    Returns:
+        dict: Validated values keyed like `DEFAULT_TUNING`.
+
+    Raises:
+        ValueError: If the profile is unknown, a count is not positive or a value is invalid.
+    """
+    if profile is not None and profile not in PROFILES:
+        raise ValueError(f"Unknown tuning profile: '{profile}'")
+    for name, count in (("connections", connections), ("cores", cores)):
+        if count is not None and count < 1:
+            raise ValueError(f"'{name}' must be a positive integer, got {count!r}")
+
+    tuning = {**DEFAULT_TUNING, **PROFILES.get(profile, {})}
+    factors = PROFILE_FACTORS[profile]
+
+    if cores:
+        tuning["acceptors"] = max(4, cores * factors["acceptors_per_core"])
+        tuning["webhook_pool_size"] = max(4, cores * factors["pool_per_core"])
+        tuning["action_workers"] = max(4, cores * factors["pool_per_core"])
+    if connections:
+        tuning["max_connections"] = int(connections * CONNECTION_HEADROOM)
+        # Let the whole fleet reconnect within the profile's window, e.g. after a broker restart
+        tuning["max_conn_rate"] = f"{max(100, -(-connections // factors['reconnect_window']))}/s"
+
+    tuning.update({name: value for name, value in (overrides or {}).items() if value is not None})
+    validate_tuning(tuning)
+    return tuning
@@ -4,15 +4,27 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from django_emqx.views import NotificationViewSet, EMQXDeviceViewSet, EMQXTokenViewSet
+from django_emqx.conf import emqx_settings
+from django_emqx.views import (
+    NotificationViewSet, EMQXDeviceViewSet, EMQXTokenViewSet, DispatcherMetricsViewSet, RateLimitMetricsViewSet,
+    BulkSendViewSet, authorize, device_webhook,
+)
 
 
 router = DefaultRouter()
 router.register(r'devices', EMQXDeviceViewSet, basename='devices')
 router.register(r'token', EMQXTokenViewSet, basename='token')
 router.register(r'notifications', NotificationViewSet, basename='notifications')
+router.register(r'dispatcher', DispatcherMetricsViewSet, basename='dispatcher')
+router.register(r'ratelimit', RateLimitMetricsViewSet, basename='ratelimit')
+router.register(r'bulk', BulkSendViewSet, basename='bulk')
 
 urlpatterns = [
 
     path('', include(router.urls)),
+    path('authz/', authorize, name='emqx-authz'),
 ]
+
+if emqx_settings.EMQX_WEBHOOK_FAST_PATH:
+    # Same URL as the device list, so the webhook URL in emqx.conf stays valid
+    urlpatterns.insert(0, path('devices/', device_webhook))
@@ -0,0 +1,131 @@
+## django_emqx/usercache.py
+
+"""
+Per-user caches for the webhook and authorization paths.
+
+EMQX reports every connect with the user ID from the client's token. The
+webhook only has to know that the user exists before it writes `user_id` to
+the device row, so instead of loading the user on every event it remembers
+the IDs of existing users in a bounded LRU cache whose entries expire after a
+TTL. Saving or deleting a user evicts its ID in this process; the TTL bounds
+how long a user deleted by another process is still considered valid.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+
+from .conf import emqx_settings
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL.
+
+    Args:
+        maxsize (int): Maximum number of entries; 0 disables caching.
+        ttl (float): Seconds an entry stays valid.
+        clock (callable, optional): Returns the current time in seconds.
+    """
+
+    def __init__(self, maxsize, ttl, clock=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock or time.monotonic
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, now=None):
+        """
+        Return the cached value of a key, or None if it is missing or expired.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, now=None):
+        """Cache a value, evicting the least recently used entries beyond `maxsize`."""
+        if self.maxsize <= 0:
+            return
+        expires = (self.clock() if now is None else now) + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """Forget a key."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Forget all keys."""
+        with self._lock:
+            self._entries.clear()
+
+
+class UserIdCache(LRUCache):
+    """
+    Bounded LRU/TTL cache of the IDs of existing users.
+
+    Args:
+        maxsize (int, optional): Maximum number of cached IDs; 0 disables caching.
+            Defaults to `EMQX_USER_CACHE_SIZE`.
+        ttl (float, optional): Seconds a cached ID stays valid. Defaults to `EMQX_USER_CACHE_TTL`.
+        clock (callable, optional): Returns the current time in seconds.
+    """
+
+    def __init__(self, maxsize=None, ttl=None, clock=None):
+        super().__init__(
+            emqx_settings.EMQX_USER_CACHE_SIZE if maxsize is None else maxsize,
+            emqx_settings.EMQX_USER_CACHE_TTL if ttl is None else ttl,
+            clock,
+        )
+
+    def exists(self, user_id):
+        """
+        Check whether a user exists, querying the database only on a cache miss.
+
+        Args:
+            user_id (int): The user's primary key.
+
+        Returns:
+            bool: True if the user exists.
+        """
+        now = self.clock()
+        if self.get(user_id, now):
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        found = get_user_model().objects.filter(pk=user_id).exists()
+        if found:
+            self.set(user_id, True, now)
+        else:
+            self.discard(user_id)
+        return found
+
+
+def invalidate_user(sender, instance, **kwargs):
+    """
+    Receiver for `post_save` and `post_delete` of the user model.
+    """
+    from . import get_acl_cache, get_user_cache
+
+    get_user_cache().discard(instance.pk)
+    get_acl_cache().discard(instance.pk)
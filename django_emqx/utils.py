@@ -1,8 +1,10 @@
 ## django_emqx/utils.py
 
+import base64
 import json
 import secrets
 
+import paho.mqtt.client as mqtt
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 try:
@@ -12,7 +14,9 @@ try:
 except ImportError:
     firebase_installed = False
 
-from . import get_mqtt_client
+from . import get_mqtt_client, get_rate_limiter, get_tracer
+from .compression import maybe_compress
+from .conf import emqx_settings
 
 
 def generate_backend_mqtt_token():
@@ -42,37 +46,65 @@ def generate_backend_mqtt_token():
     ]
     return str(token)
 
-def generate_mqtt_access_token(user):
+def get_mqtt_acl(user):
     """
-    Generate a JWT token for a specific user for MQTT communication.
+    Return the MQTT ACL rules of a user, in EMQX's format.
 
-    The token includes the user's ID as the username and ACL rules
-    allowing subscription to topics under "user/{user.id}/#" and
-    denying publication to all topics.
+    The rules allow subscribing to topics under "user/{user.id}/#" and deny
+    publishing to all topics. With `EMQX_ACK_ENABLED`, publishing
+    acknowledgements to "ack/{user.id}" is allowed.
 
     Args:
-        user (User): The user object for whom the token is generated.
+        user (User): The user whose rules are returned.
 
     Returns:
-        str: The generated JWT token as a string.
+        list: Rules with "permission", "action" and "topic", applied in order.
     """
-    # Create a new JWT token
-    token = AccessToken.for_user(user)
-
-    # Set MQTT-specific claims
-    token["username"] = str(user.id)  # EMQX uses this for client identification
-    token["acl"] = [
+    acl = [
         {
             "permission": "allow",
             "action": "subscribe",
             "topic": f"user/{user.id}/#"
         },
+    ]
+    if emqx_settings.EMQX_ACK_ENABLED:
+        # Must come before the catch-all deny, EMQX applies the first matching rule
+        acl.append({
+            "permission": "allow",
+            "action": "publish",
+            "topic": f"ack/{user.id}"
+        })
+    acl.append(
         {
             "permission": "deny",
             "action": "publish",
             "topic": "#"
         }
-    ]
+    )
+    return acl
+
+def generate_mqtt_access_token(user):
+    """
+    Generate a JWT token for a specific user for MQTT communication.
+
+    The token includes the user's ID as the username and the ACL rules of
+    `get_mqtt_acl`. With `EMQX_AUTHZ_ENABLED`, the rules are left out, because
+    EMQX then asks the authorization endpoint instead.
+
+    Args:
+        user (User): The user object for whom the token is generated.
+
+    Returns:
+        str: The generated JWT token as a string.
+    """
+    # Create a new JWT token
+    token = AccessToken.for_user(user)
+
+    # Set MQTT-specific claims
+    token["username"] = str(user.id)  # EMQX uses this for client identification
+    if not emqx_settings.EMQX_AUTHZ_ENABLED:
+        # ACL claims are checked before any authorization source and would shadow it
+        token["acl"] = get_mqtt_acl(user)
     return str(token)
 
 def generate_mqtt_refresh_token(user):
@@ -82,33 +114,131 @@ def generate_mqtt_refresh_token(user):
     refresh = RefreshToken.for_user(user)
     return str(refresh)
 
+def encode_mqtt_payload(message, v5=False):
+    """
+    Encode a message as MQTT payload, compressing it if it is large enough.
+
+    The result is the same for every recipient, so it is cached on the message
+    instance and a fan-out encodes and compresses each message only once.
+
+    With MQTT 3.1.1 the payload is `{"msg_id", "title", "body", "data"}`, or
+    `{"msg_id", "encoding", "payload"}` with the base64 encoded compressed JSON.
+    With MQTT v5 the payload is `{"title", "body", "data"}`, or its compressed
+    bytes; the message ID and codec are returned as user properties.
+
+    Args:
+        message (Message): The message to encode.
+        v5 (bool, optional): Whether to encode for MQTT v5. Defaults to False.
+
+    Returns:
+        tuple: (payload, user properties dict or None for MQTT 3.1.1).
+    """
+    threshold = emqx_settings.EMQX_COMPRESSION_THRESHOLD
+    codec = emqx_settings.EMQX_COMPRESSION_CODEC
+    level = emqx_settings.EMQX_COMPRESSION_LEVEL
+    key = (v5, threshold, codec, level)
+    cache = message.__dict__.setdefault("_mqtt_payload_cache", {})
+    if key in cache:
+        return cache[key]
+
+    with get_tracer().span("mqtt.encode", message_id=message.id):
+        msg_id = message.id
+        title = message.title
+        body = message.body
+        data = message.data
+        content = {
+            "title": title if title is not None else "",
+            "body": body if body is not None else "",
+            "data": data if data is not None else ""
+        }
+
+        if v5:
+            # The message ID travels as a user property instead of a JSON wrapper field
+            payload = json.dumps(content)
+            user_properties = {"msg_id": msg_id}
+        else:
+            payload = json.dumps({"msg_id": msg_id, **content})
+            user_properties = None
+
+        compressed, used_codec = maybe_compress(payload.encode(), threshold, codec, level)
+        if used_codec is not None:
+            if v5:
+                payload = compressed
+                user_properties["content_encoding"] = used_codec
+            else:
+                envelope = json.dumps({
+                    "msg_id": msg_id,
+                    "encoding": used_codec,
+                    "payload": base64.b64encode(compressed).decode("ascii"),
+                })
+                # Base64 eats part of the gain, so keep the plain JSON if it is smaller
+                if len(envelope) < len(payload):
+                    payload = envelope
+
+    cache[key] = (payload, user_properties)
+    return payload, user_properties
+
+
 def send_mqtt_message(recipient, message, qos=1):
     """
     Publish a message via MQTT to a specific user's topic.
 
+    Expired messages are skipped. For messages with an expiry time, the
+    remaining TTL is passed on as MQTT v5 Message Expiry Interval, so the
+    broker discards the message from offline sessions once it expires.
+    The payload format is described in `encode_mqtt_payload`. With
+    `EMQX_RATE_LIMIT_ENABLED`, publishes are subject to the rate limiter, which
+    may delay, drop or coalesce them.
+
+    With `EMQX_COLLAPSE_RETAINED`, messages with a collapse key are published
+    as retained messages to `user/{user_id}/collapse/{collapse_key}`, so the
+    broker keeps only the latest message per key for offline clients.
+
     Args:
-        mqtt_client: The MQTT client instance used for publishing.
-        recipient (User): The recipient user object.
-        msg_id (str): The unique message ID.
-        title (str): The title of the message (str or None).
-        body (str): The body content of the message (str or None).
-        data (dict or None): Optional additional data.
-    """
-    msg_id = message.id
-    title = message.title
-    body = message.body
-    data = message.data
-    payload = json.dumps({
-        "msg_id": msg_id,
-        "title": title if title is not None else "",
-        "body": body if body is not None else "",
-        "data": data if data is not None else ""
-    })
-    user_topic = f"user/{recipient.id}/"
+        recipient (User or int): The recipient user object or its ID.
+        message (Message): The message to publish.
+        qos (int, optional): The Quality of Service level. Defaults to 1.
+    """
+    # Do not spend encoding and bandwidth on messages nobody should see anymore
+    ttl = message.remaining_ttl()
+    if ttl == 0:
+        print(f"⌛ MQTT notification {message.id} expired, not sent")
+        return
+
+    recipient_id = getattr(recipient, "id", recipient)
+    if emqx_settings.EMQX_RATE_LIMIT_ENABLED:
+        if not get_rate_limiter().admit(recipient_id, message, lambda user_id, latest: send_mqtt_message(user_id, latest, qos)):
+            return
+
+    user_topic = f"user/{recipient_id}/"
+    options = {}
+    if emqx_settings.EMQX_COLLAPSE_RETAINED and message.collapse_key:
+        user_topic = f"user/{recipient_id}/collapse/{message.collapse_key}"
+        options["retain"] = True
     mqtt_client = get_mqtt_client()
-    mqtt_client.publish(user_topic, payload, qos=qos)
-    
-    print(f"✅ MQTT notification sent: {payload}")
+
+    if mqtt_client.protocol == mqtt.MQTTv5:
+        payload, user_properties = encode_mqtt_payload(message, v5=True)
+        # Compressed payloads are raw codec bytes, not JSON
+        codec = user_properties.get("content_encoding")
+        mqtt_client.publish(
+            user_topic,
+            payload,
+            qos=qos,
+            expiry_interval=ttl,
+            user_properties=user_properties,
+            content_type=f"application/{codec}" if codec else "application/json",
+            **options,
+        )
+    else:
+        payload, _ = encode_mqtt_payload(message)
+        mqtt_client.publish(user_topic, payload, qos=qos, expiry_interval=ttl, **options)
+
+    if isinstance(payload, bytes):
+        print(f"✅ MQTT notification sent: {len(payload)} compressed bytes")
+    else:
+        print(f"✅ MQTT notification sent: {payload}")
+
 
 def send_firebase_notification(token, title, body):
     """
@@ -135,7 +265,8 @@ def send_firebase_notification(token, title, body):
             body=body,
         )
     )
-    response = messaging.send(message)
+    with get_tracer().span("fcm.send"):
+        response = messaging.send(message)
     print(f"✅ Firebase notification sent: {response}")
     return response
 
@@ -173,7 +304,8 @@ def send_firebase_data_message(token, msg_id, title, body):
             ),
         ),        
     )
-    response = messaging.send(message)
+    with get_tracer().span("fcm.send"):
+        response = messaging.send(message)
     print(f"✅ Firebase data message sent: {response}")
     return response
 
@@ -1,27 +1,120 @@
 ## django_emqx/views.py
 
+import functools
+import hmac
 import json
 
+try:
+    import orjson
+    orjson_installed = True
+except ImportError:
+    orjson_installed = False
+
 from rest_framework import status
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.decorators import action
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 
 from django.contrib.auth import get_user_model
-
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.utils import timezone
+
+from . import get_acl_cache, get_dispatcher, get_rate_limiter, get_tracer
 from .conf import emqx_settings
-from .models import EMQXDevice, Notification
-from .serializers import EMQXDeviceSerializer, NotificationSerializer
-from .mixins import ClientEventMixin
+from .models import BulkSendJob, EMQXDevice, Notification
+from .bulk import AudienceError, send_bulk
+from .serializers import (
+    BulkSendJobSerializer, BulkSendSerializer, EMQXDeviceSerializer, NotificationSerializer, compile_row_serializer,
+)
+from .mixins import ClientEventMixin, ConditionalListMixin
+from .templating import render as render_template
+from .tracing import traced
 from .utils import generate_mqtt_access_token, generate_mqtt_refresh_token
-from .signals import emqx_device_connected, new_emqx_device_connected, emqx_device_disconnected
 
 User = get_user_model()
 
+# Columns needed to serialize a device; everything else (e.g. subscribed_topics) is never loaded.
+DEVICE_LIST_FIELDS = ("id", "user_id", "client_id", "active", "last_status", "last_connected_at")
+DEVICE_EXPORT_CHUNK_SIZE = 2000
+
+# Response bodies of the raw webhook view, encoded once like DRF renders them
+WEBHOOK_RESPONSES = {
+    tuple(body.items()): json.dumps(body, separators=(",", ":")).encode()
+    for body in (
+        {"status": "success"},
+        {"error": "Invalid data"},
+        {"error": "Invalid JSON"},
+        {"error": "Unknown event"},
+        {"error": "Forbidden"},
+        {"error": "Payload too large"},
+        {"error": "Not found"},
+        {"result": "allow"},
+        {"result": "deny"},
+        {"result": "ignore"},
+    )
+}
+
+
+def json_loads(data):
+    """
+    Decode a JSON request body, with `orjson` if installed.
+
+    Raises:
+        ValueError: If the body is not valid JSON or not UTF-8.
+    """
+    if orjson_installed:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(data):
+    """
+    Encode data exactly like DRF's `JSONRenderer` (compact, UTF-8, U+2028 and U+2029
+    escaped), with `orjson` if installed.
+
+    Returns:
+        bytes: The encoded JSON.
+    """
+    if orjson_installed:
+        try:
+            content = orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            # e.g. lone surrogates, which `json` passes through
+            content = None
+        if content is not None:
+            return content.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+    content = JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode(data)
+    return content.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+
+
+row_serializer = functools.cache(compile_row_serializer)
+
+
+def use_list_fast_path(request):
+    """
+    Whether a list is rendered without the serializer: enabled and JSON was negotiated.
+    """
+    return emqx_settings.EMQX_LIST_FAST_PATH and request.accepted_renderer.format == "json"
+
+
+def is_valid_webhook_token(token):
+    """
+    Compare a webhook token with `EMQX_WEBHOOK_SECRET` in constant time.
+    """
+    if not token:
+        return False
+    return hmac.compare_digest(token.encode(), str(emqx_settings.EMQX_WEBHOOK_SECRET).encode())
+
 
-class NotificationViewSet(ViewSet):
+class NotificationViewSet(ViewSet, ConditionalListMixin):
     """
     A ViewSet for managing user notifications. Allows authenticated users to list their notifications.
     """
@@ -32,15 +125,38 @@ class NotificationViewSet(ViewSet):
         """
         Retrieve a list of notifications for the authenticated user.
 
+        Notifications of expired messages are left out (filtered through the
+        index on `Message.expires_at`).
+
         Args:
             request: The HTTP request object.
 
         Returns:
-            Response: A JSON response containing the list of notifications.
+            Response: A JSON response containing the list of notifications, or
+            `304 Not Modified` if the client's ETag is still current.
         """
-        notifications = Notification.objects.filter(recipient=request.user).select_related("message")
-        serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+        notifications = Notification.objects.filter(recipient=request.user).filter(
+            Q(message__expires_at__isnull=True) | Q(message__expires_at__gt=timezone.now())
+        )
+
+        def render():
+            if use_list_fast_path(request):
+                columns, serialize = row_serializer(NotificationSerializer)
+                data = []
+                for *row, context in notifications.values_list(*columns, "context"):
+                    item = serialize(row)
+                    if context is not None:
+                        item["title"] = render_template(item["title"], context)
+                        item["body"] = render_template(item["body"], context)
+                    data.append(item)
+                return HttpResponse(json_dumps(data), content_type="application/json")
+
+            serializer = NotificationSerializer(notifications.select_related("message"), many=True)
+            return Response(serializer.data)
+
+        return self.conditional_list_response(
+            request, notifications, ("delivered_at", "acknowledged_at"), render
+        )
 
 class EMQXTokenViewSet(ViewSet):
     """
@@ -95,7 +211,126 @@ class EMQXTokenViewSet(ViewSet):
         except (TokenError, User.DoesNotExist):
             return Response({"error": "Invalid or expired refresh token."}, status=status.HTTP_401_UNAUTHORIZED)
 
-class EMQXDeviceViewSet(ViewSet, ClientEventMixin):
+class DispatcherMetricsViewSet(ViewSet):
+    """
+    A ViewSet exposing the per-lane metrics of the background notification dispatcher (staff only).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        """
+        Retrieve queue depth, counters and delivery latencies of each priority lane.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            Response: A JSON response with the metrics keyed by lane.
+        """
+        if not emqx_settings.EMQX_DISPATCH_ENABLED:
+            return Response({"error": "Dispatcher disabled"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(get_dispatcher().metrics())
+
+class RateLimitMetricsViewSet(ViewSet):
+    """
+    A ViewSet exposing the counters of the MQTT publish rate limiter (staff only).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        """
+        Retrieve how many publishes were allowed, delayed, dropped or coalesced.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            Response: A JSON response with the rate limiter counters.
+        """
+        if not emqx_settings.EMQX_RATE_LIMIT_ENABLED:
+            return Response({"error": "Rate limiting disabled"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(get_rate_limiter().metrics())
+
+class BulkSendViewSet(ViewSet):
+    """
+    A ViewSet for sending a message to a server-side audience and polling the progress (staff only).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def create(self, request):
+        """
+        Create a message and queue its delivery to an audience.
+
+        The body holds the message fields (`topic`, `title`, `body`, `data`,
+        `priority`, `expires_at`, `collapse_key`) and an `audience` with either
+        `user_ids`, a `group` name or a named `filter` with optional `params`.
+        A request repeated with the same `Idempotency-Key` header (or
+        `idempotency_key` field) returns the job of the first request instead of
+        sending again.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            Response: `202 Accepted` with the job ID and progress counters, or `200 OK`
+            with the earlier job for a repeated idempotency key.
+        """
+        key = request.headers.get("Idempotency-Key") or request.data.get("idempotency_key")
+        if key is not None and (not isinstance(key, str) or not 0 < len(key) <= 255):
+            return Response({"error": "Invalid idempotency key"}, status=status.HTTP_400_BAD_REQUEST)
+        if key:
+            job = self.get_job_for_key(key)
+            if job is not None:
+                return Response(BulkSendJobSerializer(job).data, status=status.HTTP_200_OK)
+
+        serializer = BulkSendSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        audience = serializer.validated_data.pop("audience")
+        try:
+            with transaction.atomic():
+                message = serializer.save(created_by=request.user, idempotency_key=key or None)
+                try:
+                    job = send_bulk(message, audience, created_by=request.user)
+                except AudienceError as e:
+                    transaction.set_rollback(True)
+                    return Response({"audience": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            # A concurrent request with the same key won the race
+            job = self.get_job_for_key(key) if key else None
+            if job is None:
+                raise
+            return Response(BulkSendJobSerializer(job).data, status=status.HTTP_200_OK)
+
+        return Response(BulkSendJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    def get_job_for_key(self, key):
+        """
+        Return the job of an earlier send with the same idempotency key, or None.
+        """
+        return BulkSendJob.objects.filter(message__idempotency_key=key).order_by("pk").first()
+
+    def retrieve(self, request, pk=None):
+        """
+        Retrieve the status and progress counters of a bulk send.
+
+        Args:
+            request: The HTTP request object.
+            pk: The job ID.
+
+        Returns:
+            Response: The job, or `404 Not Found`.
+        """
+        job = BulkSendJob.objects.filter(pk=pk).first()
+        if job is None:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(BulkSendJobSerializer(job).data)
+
+class EMQXDeviceViewSet(ViewSet, ClientEventMixin, ConditionalListMixin):
     """
     A ViewSet for managing EMQX devices and handling client events.
     """
@@ -109,29 +344,131 @@ class EMQXDeviceViewSet(ViewSet, ClientEventMixin):
         """
         if self.action == 'list':
             permission_classes = [IsAuthenticated]
+        elif self.action == 'export':
+            permission_classes = [IsAdminUser]
         elif self.action == 'create':
             permission_classes = [AllowAny]
         else:
             permission_classes = []  # Default or customize as needed
         return [permission() for permission in permission_classes]
 
+    def filter_devices(self, request, devices):
+        """
+        Apply the `active` and `last_status` query parameter filters.
+
+        Args:
+            request: The HTTP request object.
+            devices (QuerySet): The devices to filter.
+
+        Returns:
+            tuple: The filtered queryset and an error message (or None).
+        """
+        active = request.query_params.get("active")
+        if active is not None:
+            if active.lower() not in ("true", "false", "1", "0"):
+                return devices, "Invalid value for 'active'"
+            devices = devices.filter(active=active.lower() in ("true", "1"))
+
+        last_status = request.query_params.get("last_status")
+        if last_status is not None:
+            if last_status not in dict(EMQXDevice._meta.get_field("last_status").choices):
+                return devices, "Invalid value for 'last_status'"
+            devices = devices.filter(last_status=last_status)
+
+        return devices, None
+
     def list(self, request):
         """
-        Retrieve a list of all EMQX devices.
+        Retrieve a page of EMQX devices.
+
+        Regular users only see their own devices. Staff users can pass `scope=all`
+        to list the devices of all users. Results are ordered by ID and paginated
+        with a keyset: pass `after=<last id>` and an optional `limit` to get the next
+        page, which is also advertised in a `Link: <...>; rel="next"` header.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            Response: A JSON response containing the list of devices, or
+            `304 Not Modified` if the client's ETag is still current.
+        """
+        if request.query_params.get("scope") == "all":
+            if not request.user.is_staff:
+                return Response({"error": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+            devices = EMQXDevice.objects.all()
+        else:
+            devices = EMQXDevice.objects.filter(user=request.user)
+
+        devices, error = self.filter_devices(request, devices)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.query_params.get("limit", emqx_settings.EMQX_DEVICE_PAGE_SIZE))
+            after = request.query_params.get("after")
+            after = int(after) if after is not None else None
+        except ValueError:
+            return Response({"error": "Invalid pagination parameters"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, emqx_settings.EMQX_DEVICE_MAX_PAGE_SIZE))
+
+        def render():
+            page = devices.order_by("id")
+            if after is not None:
+                page = page.filter(id__gt=after)
+
+            if use_list_fast_path(request):
+                columns, serialize = row_serializer(EMQXDeviceSerializer)
+                rows = list(page.values_list(*columns)[:limit + 1])
+                data = [serialize(row) for row in rows[:limit]]
+                response = HttpResponse(json_dumps(data), content_type="application/json")
+            else:
+                rows = list(page.only(*DEVICE_LIST_FIELDS)[:limit + 1])
+                data = EMQXDeviceSerializer(rows[:limit], many=True).data
+                response = Response(data, status=status.HTTP_200_OK)
+
+            if len(rows) > limit:
+                url = replace_query_param(request.build_absolute_uri(), "after", data[-1]["id"])
+                response.headers["Link"] = f'<{url}>; rel="next"'
+            return response
+
+        return self.conditional_list_response(request, devices, ("updated_at",), render)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Stream all EMQX devices as newline-delimited JSON (staff only).
+
+        Rows are fetched with a server-side iterator and written one line at a
+        time, so memory use stays constant regardless of the table size. The
+        `active` and `last_status` filters of the list endpoint apply here as well.
 
         Args:
             request: The HTTP request object.
 
         Returns:
-            Response: A JSON response containing the list of devices.
+            StreamingHttpResponse: An `application/x-ndjson` response with one device per line.
         """
-        devices = EMQXDevice.objects.all()
-        serializer = EMQXDeviceSerializer(devices, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        devices, error = self.filter_devices(request, EMQXDevice.objects.all())
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = ["user" if field == "user_id" else field for field in DEVICE_LIST_FIELDS]
+        rows = devices.order_by("id").values_list(*DEVICE_LIST_FIELDS).iterator(chunk_size=DEVICE_EXPORT_CHUNK_SIZE)
+        encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
 
+        def stream():
+            for row in rows:
+                yield encoder.encode(dict(zip(fields, row))) + "\n"
+
+        return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
+    @traced("emqx.webhook")
     def create(self, request):
         """
-        Handle webhook events for EMQX devices, such as client connections and disconnections.
+        Handle webhook events for EMQX devices, such as client connections and disconnections
+        and topic subscriptions (`session.subscribed` / `session.unsubscribed`, with either a
+        single `topic` or a `topics` list).
 
         Args:
             request: The HTTP request object containing webhook data.
@@ -139,41 +476,102 @@ class EMQXDeviceViewSet(ViewSet, ClientEventMixin):
         Returns:
             Response: A JSON response indicating the success or failure of the operation.
         """
-        token = request.headers.get("X-Webhook-Token")
-        if not token or token != emqx_settings.EMQX_WEBHOOK_SECRET:
+        if not is_valid_webhook_token(request.headers.get("X-Webhook-Token")):
             return Response({"error": "Forbidden"}, status=403)
 
         try:
-            body = request.body
-            decoded_str = body.decode("utf-8")
-            data = json.loads(decoded_str)
-
-            event = data.get("event")
-            client_id = data.get("clientid")
-            user_id = data.get("user_id")
-            ip_address = data.get("ip_address", None)
-
-            if not client_id or not user_id:
-                return Response({"error": "Invalid data"}, status=400)
-
-            if user_id == "backend":
-                return Response({"status": "success"})
-
-            if event == "client.connected":
-                created = self.handle_client_connected(user_id, client_id, ip_address)
-                if created:
-                    new_emqx_device_connected.send(sender=EMQXDevice, user_id=user_id, client_id=client_id, ip_address=ip_address)    
-                else:
-                    emqx_device_connected.send(sender=EMQXDevice, user_id=user_id, client_id=client_id, ip_address=ip_address)
-            elif event == "client.disconnected":
-                updated = self.handle_client_disconnected(user_id, client_id)
-                if updated:
-                    emqx_device_disconnected.send(sender=EMQXDevice, user_id=user_id, client_id=client_id, ip_address=ip_address)
-    
-            else:
-                return Response({"error": "Unknown event"}, status=400)
+            data = json_loads(request.body)
+        except ValueError:
+            return Response({"error": "Invalid JSON"}, status=400)
 
-            return Response({"status": "success"})
+        result, status_code = self.handle_webhook_event(data)
+        return Response(result, status=status_code)
 
-        except json.JSONDecodeError:
-            return Response({"error": "Invalid JSON"}, status=400)
+
+_webhook_handler = ClientEventMixin()
+_device_view = None
+
+
+def _webhook_response(data, status_code):
+    return HttpResponse(WEBHOOK_RESPONSES[tuple(data.items())], status=status_code, content_type="application/json")
+
+
+@csrf_exempt
+def device_webhook(request, *args, **kwargs):
+    """
+    Raw Django view for EMQX webhook events on the device list URL.
+
+    Used instead of `EMQXDeviceViewSet.create` if `EMQX_WEBHOOK_FAST_PATH` is enabled. It
+    skips DRF's authentication, content negotiation and rendering, rejects bodies larger
+    than `EMQX_WEBHOOK_MAX_BODY_SIZE` and answers with prebuilt response bodies. All other
+    methods are passed on to `EMQXDeviceViewSet`.
+
+    Args:
+        request: The HTTP request object containing webhook data.
+
+    Returns:
+        HttpResponse: A JSON response indicating the success or failure of the operation.
+    """
+    if request.method != "POST":
+        global _device_view
+        if _device_view is None:
+            _device_view = EMQXDeviceViewSet.as_view({"get": "list"})
+        return _device_view(request, *args, **kwargs)
+
+    if not is_valid_webhook_token(request.headers.get("X-Webhook-Token")):
+        return _webhook_response({"error": "Forbidden"}, 403)
+
+    max_size = emqx_settings.EMQX_WEBHOOK_MAX_BODY_SIZE
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_size:
+        return _webhook_response({"error": "Payload too large"}, 413)
+
+    # Read at most one byte beyond the limit, in case Content-Length was missing or wrong
+    body = request.read(max_size + 1)
+    if len(body) > max_size:
+        return _webhook_response({"error": "Payload too large"}, 413)
+
+    try:
+        data = json_loads(body)
+    except ValueError:
+        return _webhook_response({"error": "Invalid JSON"}, 400)
+
+    with get_tracer().span("emqx.webhook"):
+        return _webhook_response(*_webhook_handler.handle_webhook_event(data))
+
+
+@csrf_exempt
+@require_POST
+def authorize(request):
+    """
+    EMQX HTTP authorization endpoint.
+
+    EMQX posts `{"username", "action", "topic"}` for publish and subscribe checks and
+    receives `{"result": "allow" | "deny" | "ignore"}`. Decisions come from the cached,
+    compiled ACL of the user (see `django_emqx.authz`). Returns 404 unless
+    `EMQX_AUTHZ_ENABLED` is set.
+
+    Args:
+        request: The HTTP request object sent by EMQX.
+
+    Returns:
+        HttpResponse: A JSON response with the authorization result.
+    """
+    if not emqx_settings.EMQX_AUTHZ_ENABLED:
+        return _webhook_response({"error": "Not found"}, 404)
+
+    if not is_valid_webhook_token(request.headers.get("X-Webhook-Token")):
+        return _webhook_response({"error": "Forbidden"}, 403)
+
+    try:
+        data = json_loads(request.body)
+    except ValueError:
+        return _webhook_response({"error": "Invalid JSON"}, 400)
+    if not isinstance(data, dict) or not isinstance(data.get("topic"), str):
+        return _webhook_response({"error": "Invalid data"}, 400)
+
+    result = get_acl_cache().authorize(str(data.get("username") or ""), data.get("action"), data["topic"])
+    return _webhook_response({"result": result}, 200)
@@ -0,0 +1,116 @@
+import unittest
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from unittest.mock import patch, MagicMock
+
+from django_emqx.acks import ACK_MAX_ATTEMPTS, AckBuffer, parse_ack
+from django_emqx.models import Message, Notification
+from django_emqx.utils import generate_mqtt_access_token
+
+User = get_user_model()
+
+
+class TestParseAck(unittest.TestCase):
+
+    def test_single_message(self):
+        self.assertEqual(parse_ack("ack/5", b'{"msg_id": 7}'), (5, [7]))
+
+    def test_several_messages(self):
+        self.assertEqual(parse_ack("ack/5", '{"msg_ids": [7, "8"]}'), (5, [7, 8]))
+
+    def test_invalid(self):
+        for topic, payload in [
+            ("user/5/", b'{"msg_id": 7}'),
+            ("ack/abc", b'{"msg_id": 7}'),
+            ("ack/5", b"not json"),
+            ("ack/5", b"[7]"),
+            ("ack/5", b"{}"),
+            ("ack/5", b'{"msg_ids": ["x"]}'),
+        ]:
+            with self.assertRaises(ValueError):
+                parse_ack(topic, payload)
+
+
+class AckBufferTests(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pw")
+        self.bob = User.objects.create_user(username="bob", password="pw")
+        self.first = Message.objects.create(title="First")
+        self.second = Message.objects.create(title="Second")
+        for message in (self.first, self.second):
+            for user in (self.alice, self.bob):
+                Notification.objects.create(message=message, recipient=user)
+        self.buffer = AckBuffer(flush_interval=60, batch_size=100)
+
+    def test_flush_applies_acks_in_one_update_per_message(self):
+        self.buffer.add(self.alice.id, [self.first.id, self.second.id])
+        self.buffer.add(self.bob.id, [self.first.id])
+        self.buffer.add(self.bob.id, [self.first.id])  # duplicates are coalesced
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.buffer.flush(), 3)
+
+        acknowledged = set(Notification.objects.filter(is_acknowledged=True).values_list("recipient_id", "message_id"))
+        self.assertEqual(acknowledged, {
+            (self.alice.id, self.first.id),
+            (self.alice.id, self.second.id),
+            (self.bob.id, self.first.id),
+        })
+        self.assertTrue(all(Notification.objects.filter(is_acknowledged=True).values_list("acknowledged_at", flat=True)))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_acks_of_other_users_are_ignored(self):
+        self.buffer.add(999, [self.first.id])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_handle_message(self):
+        self.buffer.handle_message(None, None, MagicMock(topic=f"ack/{self.bob.id}", payload=b'{"msg_id": %d}' % self.second.id))
+        self.buffer.handle_message(None, None, MagicMock(topic="ack/x", payload=b"{}"))
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertTrue(Notification.objects.get(recipient=self.bob, message=self.second).is_acknowledged)
+
+    def test_failed_flush_keeps_acks(self):
+        self.buffer.add(self.alice.id, [self.first.id])
+        with patch("django_emqx.models.Notification.objects.filter", side_effect=RuntimeError("db down")):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    @patch("django_emqx.acks.ACK_UPDATE_SIZE", 1)
+    def test_recipients_are_updated_in_groups(self):
+        self.buffer.add(self.alice.id, [self.first.id])
+        self.buffer.add(self.bob.id, [self.first.id])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.buffer.flush(), 2)
+
+    @patch("builtins.print")
+    def test_repeatedly_failing_acks_are_dropped(self, mock_print):
+        self.buffer.add(self.alice.id, [self.first.id])
+        with patch("django_emqx.models.Notification.objects.filter", side_effect=RuntimeError("db down")):
+            for _ in range(ACK_MAX_ATTEMPTS):
+                self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer._failures, {})
+        self.assertFalse(Notification.objects.filter(is_acknowledged=True).exists())
+
+
+class AckAccessTokenTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pw")
+
+    def acl(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        return AccessToken(generate_mqtt_access_token(self.user))["acl"]
+
+    def test_ack_topic_denied_by_default(self):
+        self.assertNotIn(f"ack/{self.user.id}", [rule["topic"] for rule in self.acl()])
+
+    @override_settings(EMQX_ACK_ENABLED=True)
+    def test_ack_topic_allowed_before_deny(self):
+        acl = self.acl()
+        self.assertEqual(acl[1], {"permission": "allow", "action": "publish", "topic": f"ack/{self.user.id}"})
+        self.assertEqual(acl[-1]["permission"], "deny")
@@ -1,6 +1,11 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.admin.sites import site
-from django_emqx.admin import EMQXDeviceAdmin, MessageAdmin, NotificationAdmin
+from django_emqx.admin import EMQXDeviceAdmin, EstimatedCountPaginator, MessageAdmin, NotificationAdmin
 from django_emqx.models import EMQXDevice, Message, Notification
 
 
@@ -33,7 +38,7 @@ class AdminSiteTests(TestCase):
             "created_at",
         ))
         self.assertEqual(admin_instance.list_filter, ("active", "last_status", "created_at"))
-        self.assertEqual(admin_instance.search_fields, ("client_id", "user__username", "ip_address"))
+        self.assertEqual(admin_instance.search_fields, ("client_id__startswith", "user__username__exact"))
         self.assertEqual(admin_instance.readonly_fields, ("created_at", "last_connected_at"))
 
     def test_message_admin_configuration(self):
@@ -45,7 +50,9 @@ class AdminSiteTests(TestCase):
             "created_by",
             "created_at",
         ))
-        self.assertEqual(admin_instance.search_fields, ("title", "topic", "body", "created_by__username"))
+        self.assertEqual(
+            admin_instance.search_fields, ("title__startswith", "topic__exact", "created_by__username__exact")
+        )
         self.assertEqual(admin_instance.list_filter, ("created_at",))
         self.assertEqual(admin_instance.readonly_fields, ("created_at",))
 
@@ -60,5 +67,81 @@ class AdminSiteTests(TestCase):
             "acknowledged_at",
         ))
         self.assertEqual(admin_instance.list_filter, ("is_acknowledged", "delivered_at"))
-        self.assertEqual(admin_instance.search_fields, ("recipient__username", "message__title", "message__topic"))
+        self.assertEqual(
+            admin_instance.search_fields,
+            ("recipient__username__exact", "message__title__startswith", "message__topic__exact"),
+        )
         self.assertEqual(admin_instance.readonly_fields, ("delivered_at", "acknowledged_at"))
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.admin_user = get_user_model().objects.create_superuser(username="admin", password="secret")
+        self.request = RequestFactory().get("/admin/django_emqx/notification/")
+        self.request.user = self.admin_user
+
+    def test_paginator_uses_estimate_for_large_tables(self):
+        paginator = EstimatedCountPaginator(Message.objects.order_by("pk"), 100)
+        with patch("django_emqx.admin.estimated_count", return_value=2_000_000):
+            self.assertEqual(paginator.count, 2_000_000)
+        self.assertEqual(paginator.num_pages, 20_000)
+
+    def test_paginator_counts_small_or_unknown_tables_exactly(self):
+        Message.objects.create(title="Hello")
+        for estimate in (None, 50):
+            paginator = EstimatedCountPaginator(Message.objects.order_by("pk"), 100)
+            with patch("django_emqx.admin.estimated_count", return_value=estimate):
+                self.assertEqual(paginator.count, 1)
+
+    def test_notification_changelist_query_count_is_constant(self):
+        users = [get_user_model().objects.create(username=f"user{i}") for i in range(20)]
+        for user in users:
+            message = Message.objects.create(title=f"Hello {user.username}", created_by=self.admin_user)
+            Notification.objects.create(message=message, recipient=user)
+
+        model_admin = site._registry[Notification]
+        with CaptureQueriesContext(connection) as queries:
+            changelist = model_admin.get_changelist_instance(self.request)
+            rows = [(str(n.recipient), str(n.message)) for n in changelist.result_list]
+        self.assertEqual(len(rows), 20)
+        # One COUNT for the filtered total and one joined SELECT; no per-row queries
+        self.assertLessEqual(len(queries), 3)
+        self.assertFalse(model_admin.show_full_result_count)
+
+    def test_message_search_uses_prefix_and_exact_lookups(self):
+        Message.objects.create(title="Firmware update", topic="fw", body="needle")
+        Message.objects.create(title="Update firmware", topic="other")
+        model_admin = site._registry[Message]
+        queryset, _ = model_admin.get_search_results(self.request, Message.objects.all(), "Firmware")
+        self.assertEqual([m.title for m in queryset], ["Firmware update"])
+        queryset, _ = model_admin.get_search_results(self.request, Message.objects.all(), "fw")
+        self.assertEqual(queryset.count(), 1)
+
+    def test_searched_and_filtered_columns_are_indexed(self):
+        def indexed(model, field):
+            return any(index.fields[:1] == [field] for index in model._meta.indexes) or (
+                model._meta.get_field(field).db_index or model._meta.get_field(field).unique
+            )
+
+        for model in (EMQXDevice, Message, Notification):
+            model_admin = site._registry[model]
+            for lookup in model_admin.search_fields:
+                *path, field, lookup_name = lookup.split("__")
+                self.assertIn(lookup_name, ("exact", "startswith"))
+                target = model
+                for name in path:
+                    target = target._meta.get_field(name).related_model
+                self.assertTrue(indexed(target, field), lookup)
+            for field in model_admin.list_filter:
+                self.assertTrue(indexed(model, field) or field in ("active", "last_status", "is_acknowledged"), field)
+
+    def test_notification_search_matches_recipient_and_message(self):
+        alice = get_user_model().objects.create(username="alice")
+        message = Message.objects.create(title="Firmware update", topic="fw")
+        Notification.objects.create(message=message, recipient=alice)
+        Notification.objects.create(message=Message.objects.create(title="Other"), recipient=self.admin_user)
+
+        model_admin = site._registry[Notification]
+        for term in ("alice", "Firmware", "fw"):
+            queryset, _ = model_admin.get_search_results(self.request, Notification.objects.all(), term)
+            self.assertEqual([n.recipient for n in queryset], [alice], term)
@@ -0,0 +1,111 @@
+## tests/test_authz.py
+
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from django_emqx import get_acl_cache
+from django_emqx.authz import AclCache, CompiledACL
+from django_emqx.utils import generate_mqtt_access_token
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+User = get_user_model()
+
+
+def group_acl(user):
+    if user.groups.filter(name="sensors").exists():
+        return [{"permission": "allow", "action": "publish", "topic": "sensors/#"}]
+    return []
+
+
+class CompiledACLTests(TestCase):
+    def setUp(self):
+        self.acl = CompiledACL([
+            {"permission": "allow", "action": "subscribe", "topic": "user/5/#"},
+            {"permission": "allow", "action": "all", "topics": ["ack/5", "status/5"]},
+            {"permission": "deny", "action": "publish", "topic": "#"},
+        ])
+
+    def test_first_matching_rule_wins(self):
+        self.assertEqual(self.acl.check("publish", "ack/5"), "allow")
+        self.assertEqual(self.acl.check("publish", "user/5/alerts"), "deny")
+        self.assertEqual(self.acl.check("subscribe", "status/5"), "allow")
+
+    def test_subscribed_filters_need_an_equally_broad_rule(self):
+        self.assertEqual(self.acl.check("subscribe", "user/5/+"), "allow")
+        self.assertEqual(self.acl.check("subscribe", "user/#"), "ignore")
+        self.assertEqual(self.acl.check("subscribe", "user/6/alerts"), "ignore")
+
+
+class AclCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="test")
+        self.cache = AclCache(maxsize=10, ttl=30)
+
+    def test_decisions_are_served_from_the_cache(self):
+        username = str(self.user.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.authorize(username, "subscribe", f"user/{username}/#"), "allow")
+            self.assertEqual(self.cache.authorize(username, "publish", f"user/{username}/x"), "deny")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_backend_and_unknown_users(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.authorize("backend", "publish", "user/1/x"), "allow")
+            self.assertEqual(self.cache.authorize("mallory", "subscribe", "#"), "deny")
+            self.assertEqual(self.cache.authorize("9999", "subscribe", "user/9999/#"), "deny")
+
+    def test_inactive_users_are_denied(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.cache.authorize(str(self.user.id), "subscribe", f"user/{self.user.id}/#"), "deny")
+
+    @override_settings(EMQX_AUTHZ_ACL_FUNCTION="tests.test_authz.group_acl")
+    def test_permission_changes_invalidate_the_cache(self):
+        cache = get_acl_cache()
+        cache.clear()
+        username = str(self.user.id)
+        self.assertEqual(cache.authorize(username, "publish", "sensors/1"), "ignore")
+
+        group = Group.objects.create(name="sensors")
+        self.user.groups.add(group)
+        self.assertEqual(cache.authorize(username, "publish", "sensors/1"), "allow")
+
+        group.user_set.remove(self.user)
+        self.assertEqual(cache.authorize(username, "publish", "sensors/1"), "ignore")
+
+
+@override_settings(EMQX_AUTHZ_ENABLED=True, EMQX_WEBHOOK_SECRET="your_webhook_secret")
+class AuthorizeViewTests(TestCase):
+    def setUp(self):
+        get_acl_cache().clear()
+        self.user = User.objects.create_user(username="tester", password="test")
+        self.url = reverse("emqx-authz")
+
+    def post(self, data, token="your_webhook_secret"):
+        return self.client.post(self.url, json.dumps(data), content_type="application/json", HTTP_X_WEBHOOK_TOKEN=token)
+
+    def test_returns_acl_decisions(self):
+        username = str(self.user.id)
+        response = self.post({"username": username, "action": "subscribe", "topic": f"user/{username}/#"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"result": "allow"})
+
+        response = self.post({"username": username, "action": "publish", "topic": "user/1/x"})
+        self.assertEqual(response.json(), {"result": "deny"})
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.post({"username": "1", "action": "publish", "topic": "a"}, token="x").status_code, 403)
+        self.assertEqual(self.post({"username": "1", "action": "publish"}).status_code, 400)
+
+    def test_disabled(self):
+        with self.settings(EMQX_AUTHZ_ENABLED=False):
+            self.assertEqual(self.post({"username": "1", "action": "publish", "topic": "a"}).status_code, 404)
+
+    def test_access_tokens_carry_no_acl(self):
+        token = AccessToken(generate_mqtt_access_token(self.user))
+        self.assertNotIn("acl", token.payload)
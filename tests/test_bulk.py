@@ -0,0 +1,226 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django_emqx.bulk import (
+    AudienceError, AudienceIterator, record_progress, resolve_audience, run_bulk_job, send_bulk,
+)
+from django_emqx.dispatch import NotificationDispatcher
+from django_emqx.models import BulkSendJob, Message, Notification
+
+User = get_user_model()
+
+
+def staff_audience(min_id=0):
+    return User.objects.filter(is_staff=True, pk__gte=min_id)
+
+
+class InlineThread:
+    """Runs the thread target on `start()`, so tests see the result synchronously."""
+
+    def __init__(self, target, args=(), **kwargs):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+class ResolveAudienceTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"user{i}") for i in range(4)]
+        self.users[3].is_active = False
+        self.users[3].save()
+        self.users[0].is_staff = True
+        self.users[0].save()
+        group = Group.objects.create(name="beta")
+        group.user_set.add(self.users[1], self.users[2], self.users[3])
+
+    def test_user_ids(self):
+        ids = [self.users[2].pk, self.users[0].pk, self.users[3].pk]
+        self.assertEqual(list(resolve_audience({"user_ids": ids})), [self.users[0].pk, self.users[2].pk])
+
+    def test_group_skips_inactive_users(self):
+        self.assertEqual(list(resolve_audience({"group": "beta"})), [self.users[1].pk, self.users[2].pk])
+
+    @override_settings(EMQX_BULK_AUDIENCES={"staff": "tests.test_bulk.staff_audience"})
+    def test_named_filter(self):
+        self.assertEqual(list(resolve_audience({"filter": "staff"})), [self.users[0].pk])
+        self.assertEqual(list(resolve_audience({"filter": "staff", "params": {"min_id": self.users[1].pk}})), [])
+
+    def test_is_lazy(self):
+        with self.assertNumQueries(0):
+            recipient_ids = resolve_audience({"group": "beta"})
+        with self.assertNumQueries(1):
+            next(recipient_ids)
+
+    def test_pages_with_keyset_queries(self):
+        recipient_ids = AudienceIterator(User.objects.all(), page_size=3)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(recipient_ids), [user.pk for user in self.users])
+        self.assertEqual(len(queries), 2)
+        self.assertIn(f"> {self.users[2].pk}", queries[1]["sql"])
+
+    def test_invalid_specs(self):
+        for audience in (
+            None,
+            {},
+            {"user_ids": [1], "group": "beta"},
+            {"user_ids": "1,2"},
+            {"user_ids": [True]},
+            {"group": ""},
+            {"filter": "unknown"},
+            {"filter": ["staff"]},
+        ):
+            with self.subTest(audience=audience), self.assertRaises(AudienceError):
+                resolve_audience(audience)
+
+    @override_settings(EMQX_BULK_AUDIENCES={"staff": "tests.test_bulk.staff_audience"})
+    def test_invalid_filter_params(self):
+        with self.assertRaises(AudienceError):
+            resolve_audience({"filter": "staff", "params": {"unknown": 1}})
+
+    def test_group_requires_a_groups_relation(self):
+        # Group stands in for a custom user model without `groups`
+        with patch("django_emqx.bulk.get_user_model", return_value=Group):
+            with self.assertRaises(AudienceError):
+                resolve_audience({"group": "beta"})
+
+
+@patch("django_emqx.mixins.send_mqtt_message")
+@patch("django_emqx.mixins.firebase_installed", False)
+@patch("django_emqx.bulk.threading.Thread", InlineThread)
+class SendBulkTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"user{i}") for i in range(5)]
+        self.ids = [user.pk for user in self.users]
+
+    def test_runs_after_commit_and_records_progress(self, send_mqtt_message):
+        message = Message.objects.create(title="Hello")
+        with self.captureOnCommitCallbacks(execute=True):
+            job = send_bulk(message, {"user_ids": self.ids})
+            self.assertEqual(Notification.objects.count(), 0)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.resolved, job.delivered, job.failed), ("done", 5, 5, 0))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(Notification.objects.filter(message=message).count(), 5)
+        self.assertEqual(send_mqtt_message.call_count, 5)
+
+    def test_chunks_and_failures(self, send_mqtt_message):
+        message = Message.objects.create(title="Hello")
+        job = BulkSendJob.objects.create(message=message, audience={})
+        failing = self.ids[4]
+
+        def publish(recipient_id, message):
+            if recipient_id == failing:
+                raise RuntimeError("broker down")
+
+        send_mqtt_message.side_effect = publish
+
+        run_bulk_job(job.pk, message, iter(self.ids), chunk_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.resolved, job.delivered, job.failed), ("done", 5, 4, 1))
+
+    def test_expired_message_stops(self, send_mqtt_message):
+        message = Message.objects.create(title="Old", expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        job = BulkSendJob.objects.create(message=message, audience={})
+
+        run_bulk_job(job.pk, message, iter(self.ids))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.resolved), ("expired", 0))
+        send_mqtt_message.assert_not_called()
+
+    def test_late_chunk_keeps_job_done(self, send_mqtt_message):
+        message = Message.objects.create(title="Hello")
+        job = BulkSendJob.objects.create(message=message, audience={})
+
+        record_progress(job.pk, message, 2, 2, 0, True)
+        record_progress(job.pk, message, 2, 1, 1, False)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.resolved, job.delivered, job.failed), ("done", 4, 3, 1))
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(EMQX_DISPATCH_ENABLED=True)
+    def test_collapsing_message_is_submitted_from_a_thread(self, send_mqtt_message):
+        dispatcher = NotificationDispatcher(workers=1, chunk_size=2)
+        message = Message.objects.create(title="Count", collapse_key="unread")
+        with patch("django_emqx.get_dispatcher", return_value=dispatcher):
+            with patch("django_emqx.bulk.threading.Thread", wraps=InlineThread) as thread:
+                with self.captureOnCommitCallbacks(execute=True):
+                    job = send_bulk(message, {"user_ids": self.ids})
+
+        thread.assert_called_once()
+        self.assertEqual(dispatcher.drain(), 3)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.delivered), ("done", 5))
+
+    @override_settings(EMQX_DISPATCH_ENABLED=True)
+    def test_dispatcher_reports_progress(self, send_mqtt_message):
+        dispatcher = NotificationDispatcher(workers=1, chunk_size=2)
+        message = Message.objects.create(title="Hello")
+        with patch("django_emqx.get_dispatcher", return_value=dispatcher):
+            with self.captureOnCommitCallbacks(execute=True):
+                job = send_bulk(message, {"user_ids": self.ids})
+
+        self.assertEqual(dispatcher.drain(), 3)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.resolved, job.delivered), ("done", 5, 5))
+
+
+@patch("django_emqx.mixins.send_mqtt_message")
+@patch("django_emqx.mixins.firebase_installed", False)
+@patch("django_emqx.bulk.threading.Thread", InlineThread)
+class BulkSendViewSetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username="admin", password="secret", is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+        self.users = [User.objects.create(username=f"user{i}") for i in range(3)]
+
+    def test_create_and_poll(self, send_mqtt_message):
+        body = {"title": "Hi", "priority": "bulk", "audience": {"user_ids": [user.pk for user in self.users]}}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("bulk-list"), body, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "queued")
+        message = Message.objects.get(pk=response.data["message"])
+        self.assertEqual((message.title, message.priority, message.created_by), ("Hi", "bulk", self.admin))
+
+        response = self.client.get(reverse("bulk-detail", args=[response.data["job_id"]]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["status"], response.data["delivered"]), ("done", 3))
+
+    def test_invalid_audience_creates_nothing(self, send_mqtt_message):
+        response = self.client.post(reverse("bulk-list"), {"title": "Hi", "audience": {"filter": "x"}}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("audience", response.data)
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(BulkSendJob.objects.exists())
+
+    def test_missing_audience(self, send_mqtt_message):
+        response = self.client.post(reverse("bulk-list"), {"title": "Hi"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self, send_mqtt_message):
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.post(reverse("bulk-list"), {"title": "Hi", "audience": {"group": "g"}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_job(self, send_mqtt_message):
+        response = self.client.get(reverse("bulk-detail", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,37 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from django_emqx.compression import compress, decompress, maybe_compress, resolve_codec
+
+
+class CompressionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data = b'{"title": "Test", "body": "Message", "data": "' + b"x" * 2000 + b'"}'
+
+    def test_round_trip(self):
+        self.assertEqual(decompress(compress(self.data, "zlib"), "zlib"), self.data)
+
+    def test_below_threshold_is_not_compressed(self):
+        self.assertEqual(maybe_compress(self.data, len(self.data) + 1), (self.data, None))
+
+    def test_disabled_without_threshold(self):
+        self.assertEqual(maybe_compress(self.data, None), (self.data, None))
+
+    def test_compresses_above_threshold(self):
+        payload, codec = maybe_compress(self.data, 1024)
+        self.assertEqual(codec, "zlib")
+        self.assertLess(len(payload), len(self.data))
+
+    def test_incompressible_data_is_kept(self):
+        data = os.urandom(512)
+        self.assertEqual(maybe_compress(data, 1), (data, None))
+
+    def test_zstd_falls_back_to_zlib_when_missing(self):
+        with patch("django_emqx.compression.zstd_installed", False):
+            self.assertEqual(resolve_codec("zstd"), "zlib")
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            resolve_codec("lz4")
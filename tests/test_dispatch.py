@@ -0,0 +1,225 @@
+import threading
+import unittest
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from unittest.mock import patch, MagicMock
+
+from django_emqx.dispatch import NotificationDispatcher
+from django_emqx.mixins import NotificationSenderMixin
+from django_emqx.models import Message, Notification
+
+User = get_user_model()
+
+
+class FakeMessage:
+    def __init__(self, pk, priority="normal", is_expired=False, collapse_key=None):
+        self.pk = pk
+        self.priority = priority
+        self.is_expired = is_expired
+        self.collapse_key = collapse_key
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.delivered = []
+        self.dispatcher = NotificationDispatcher(
+            deliver=lambda message, recipient_ids: self.delivered.append((message.pk, list(recipient_ids))),
+            workers=2,
+            chunk_size=2,
+            weights={"critical": 8, "normal": 3, "bulk": 1},
+            reserved={"critical": 1},
+        )
+
+    def test_delivers_in_chunks(self):
+        self.dispatcher.submit(FakeMessage(1), range(5))
+
+        self.assertEqual(self.dispatcher.drain(), 3)
+        self.assertEqual(self.delivered, [(1, [0, 1]), (1, [2, 3]), (1, [4])])
+
+    def test_reports_progress_per_chunk(self):
+        progress = []
+        self.dispatcher.submit(FakeMessage(1), range(4), on_progress=lambda *counts: progress.append(counts))
+        self.dispatcher.drain()
+
+        # The last chunk is empty, but still reports that the job is done
+        self.assertEqual(progress, [(2, 2, 0, False), (2, 2, 0, False), (0, 0, 0, True)])
+
+    def test_done_is_reported_by_the_last_chunk_to_finish(self):
+        progress = []
+
+        def deliver(message, recipient_ids):
+            if recipient_ids == [0, 1]:
+                # Another worker delivers the short last chunk meanwhile
+                dispatcher.process_next()
+
+        dispatcher = NotificationDispatcher(deliver=deliver, workers=2, chunk_size=2, reserved={})
+        dispatcher.submit(FakeMessage(1), range(3), on_progress=lambda *counts: progress.append(counts))
+        dispatcher.drain()
+
+        self.assertEqual(progress, [(1, 1, 0, False), (2, 2, 0, True)])
+
+    def test_critical_overtakes_bulk(self):
+        self.dispatcher.submit(FakeMessage(1, "bulk"), range(10))
+        self.dispatcher.process_next()
+        self.dispatcher.submit(FakeMessage(2, "critical"), [42])
+        self.dispatcher.drain()
+
+        order = [pk for pk, _ in self.delivered]
+        self.assertEqual(order[:2], [1, 2])
+        self.assertEqual(order.count(1), 5)
+
+    def test_weighted_fair_share(self):
+        self.dispatcher.submit(FakeMessage(1, "bulk"), range(20))
+        self.dispatcher.submit(FakeMessage(2, "normal"), range(20))
+        for _ in range(8):
+            self.dispatcher.process_next()
+
+        order = [pk for pk, _ in self.delivered]
+        self.assertEqual(order.count(2), 6)
+        self.assertEqual(order.count(1), 2)
+
+    def test_newer_message_with_collapse_key_replaces_queued_one(self):
+        self.dispatcher.submit(FakeMessage(1, collapse_key="unread"), [1, 2, 3])
+        self.dispatcher.submit(FakeMessage(2, collapse_key="unread"), [2, 3, 4])
+        self.dispatcher.submit(FakeMessage(3, collapse_key="other"), [1])
+        self.dispatcher.drain()
+
+        delivered = {(pk, recipient_id) for pk, chunk in self.delivered for recipient_id in chunk}
+        self.assertEqual(delivered, {(1, 1), (2, 2), (2, 3), (2, 4), (3, 1)})
+        self.assertEqual(self.dispatcher.metrics()["normal"]["collapsed"], 2)
+
+    def test_collapse_key_after_delivery_is_not_collapsed(self):
+        self.dispatcher.submit(FakeMessage(1, collapse_key="unread"), [1])
+        self.dispatcher.drain()
+        self.dispatcher.submit(FakeMessage(2, collapse_key="unread"), [1])
+        self.dispatcher.drain()
+        self.assertEqual(self.delivered, [(1, [1]), (2, [1])])
+
+    def test_expired_messages_are_dropped(self):
+        message = FakeMessage(1)
+        self.dispatcher.submit(message, range(5))
+        self.dispatcher.process_next()
+        message.is_expired = True
+        self.dispatcher.drain()
+
+        self.assertEqual(self.delivered, [(1, [0, 1])])
+        self.assertEqual(self.dispatcher.metrics()["normal"]["expired"], 1)
+
+    def test_collapse_entries_of_ended_jobs_are_dropped(self):
+        expired = FakeMessage(1, collapse_key="unread")
+        self.dispatcher.submit(expired, range(5))
+        self.dispatcher.submit(FakeMessage(2, collapse_key="unread"), [4])
+        self.dispatcher.process_next()
+        expired.is_expired = True
+        self.dispatcher.drain()
+
+        self.assertEqual(self.delivered, [(1, [0, 1]), (2, [4])])
+        self.assertEqual(self.dispatcher._latest, {})
+
+    @patch("builtins.print")
+    def test_collapse_entries_of_failed_jobs_are_dropped(self, mock_print):
+        job = self.dispatcher.submit(FakeMessage(1, collapse_key="unread"), [1, 2])
+        with patch.object(job, "take", side_effect=RuntimeError("boom")):
+            self.dispatcher.drain()
+
+        self.assertEqual(self.dispatcher._latest, {})
+
+    def test_unknown_lane(self):
+        with self.assertRaises(ValueError):
+            self.dispatcher.submit(FakeMessage(1), [1], lane="urgent")
+
+    def test_metrics(self):
+        self.dispatcher.submit(FakeMessage(1, "critical"), range(3))
+        self.dispatcher.drain()
+
+        metrics = self.dispatcher.metrics()
+        self.assertEqual(metrics["critical"]["submitted"], 1)
+        self.assertEqual(metrics["critical"]["delivered"], 3)
+        self.assertEqual(metrics["critical"]["queued"], 0)
+        self.assertIsNotNone(metrics["critical"]["latency_p95"])
+        self.assertIsNone(metrics["bulk"]["latency_p50"])
+
+    @patch("builtins.print")
+    def test_failed_chunks_are_counted(self, mock_print):
+        dispatcher = NotificationDispatcher(deliver=MagicMock(side_effect=RuntimeError("boom")), chunk_size=2)
+        dispatcher.submit(FakeMessage(1), range(3))
+        dispatcher.drain()
+
+        self.assertEqual(dispatcher.metrics()["normal"]["failed"], 3)
+
+    def test_reserved_worker_serves_critical_lane(self):
+        release = threading.Event()
+        critical_done = threading.Event()
+
+        def deliver(message, recipient_ids):
+            if message.priority == "critical":
+                critical_done.set()
+            else:
+                release.wait(5)
+
+        dispatcher = NotificationDispatcher(deliver=deliver, workers=2, chunk_size=1, reserved={"critical": 1})
+        dispatcher.submit(FakeMessage(1, "bulk"), range(10))
+        dispatcher.start()
+        try:
+            dispatcher.submit(FakeMessage(2, "critical"), [1])
+            self.assertTrue(critical_done.wait(2))
+            self.assertEqual(dispatcher.metrics()["bulk"]["busy"], 1)
+        finally:
+            release.set()
+            dispatcher.stop(timeout=5)
+
+
+class NotificationSenderDispatchTests(TestCase):
+    def setUp(self):
+        self.mixin = NotificationSenderMixin()
+        self.users = [User.objects.create_user(username=f"user{i}", password="test") for i in range(3)]
+        self.message = Message.objects.create(title="Hello", body="World", priority="critical")
+
+    @override_settings(EMQX_DISPATCH_ENABLED=True)
+    @patch("django_emqx.mixins.get_dispatcher")
+    def test_send_all_notifications_submits_to_dispatcher(self, mock_get_dispatcher):
+        self.mixin.send_all_notifications(self.message, User.objects.order_by("id"))
+
+        message, recipient_ids = mock_get_dispatcher.return_value.submit.call_args[0]
+        self.assertEqual(message, self.message)
+        self.assertEqual(list(recipient_ids), [user.id for user in self.users])
+
+    @patch("django_emqx.mixins.firebase_installed", False)
+    @patch("django_emqx.mixins.send_mqtt_message")
+    def test_send_notification_chunk(self, mock_send_mqtt):
+        recipient_ids = [user.id for user in self.users]
+        # The lookup of already notified recipients and the bulk insert
+        with self.assertNumQueries(2):
+            self.mixin.send_notification_chunk(self.message, recipient_ids)
+
+        self.assertEqual(
+            sorted(Notification.objects.filter(message=self.message).values_list("recipient_id", flat=True)),
+            recipient_ids,
+        )
+        self.assertEqual(mock_send_mqtt.call_count, 3)
+
+
+class DispatcherMetricsViewSetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="staff", password="test", is_staff=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_metrics_disabled(self):
+        response = self.client.get(reverse("dispatcher-list"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(EMQX_DISPATCH_ENABLED=True)
+    @patch("django_emqx.views.get_dispatcher")
+    def test_metrics(self, mock_get_dispatcher):
+        mock_get_dispatcher.return_value.metrics.return_value = {"critical": {"queued": 0}}
+        response = self.client.get(reverse("dispatcher-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"critical": {"queued": 0}})
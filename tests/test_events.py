@@ -0,0 +1,116 @@
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from django_emqx.events import SignalDispatcher
+from django_emqx.models import EMQXDevice
+from django_emqx.signals import (
+    emqx_device_connected,
+    emqx_device_disconnected,
+    emqx_devices_connected_batch,
+    emqx_devices_disconnected_batch,
+)
+
+
+class SignalDispatcherTests(TestCase):
+
+    def connect(self, signal, receiver):
+        signal.connect(receiver, weak=False)
+        self.addCleanup(signal.disconnect, receiver)
+
+    def test_sync_mode_sends_inline(self):
+        received = []
+        self.connect(emqx_device_connected, lambda sender, **kwargs: received.append(kwargs["client_id"]))
+
+        SignalDispatcher(mode="sync").send(emqx_device_connected, EMQXDevice, user_id="1", client_id="a")
+        self.assertEqual(received, ["a"])
+
+    def test_async_mode_runs_receivers_after_commit_on_pool(self):
+        release = threading.Event()
+        done = threading.Event()
+        threads = []
+
+        def slow_receiver(sender, **kwargs):
+            threads.append(threading.current_thread().name)
+            release.wait(5)
+            done.set()
+
+        self.connect(emqx_device_connected, slow_receiver)
+        dispatcher = SignalDispatcher(mode="async", workers=1, queue_size=10)
+        self.addCleanup(dispatcher.stop)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatcher.send(emqx_device_connected, EMQXDevice, user_id="1", client_id="a")
+        # The caller returned although the receiver is still running
+        self.assertFalse(done.is_set())
+        release.set()
+        self.assertTrue(done.wait(5))
+        self.assertTrue(threads[0].startswith("emqx-signals"))
+
+    def test_async_mode_runs_inline_when_saturated(self):
+        release = threading.Event()
+        threads = []
+
+        def receiver(sender, **kwargs):
+            threads.append(threading.current_thread())
+            if kwargs["client_id"] == "a":
+                release.wait(5)
+
+        self.connect(emqx_device_connected, receiver)
+        dispatcher = SignalDispatcher(mode="async", workers=1, queue_size=1)
+        self.addCleanup(dispatcher.stop)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatcher.send(emqx_device_connected, EMQXDevice, user_id="1", client_id="a")
+            dispatcher.send(emqx_device_connected, EMQXDevice, user_id="1", client_id="b")
+        self.assertIn(threading.current_thread(), threads)
+        release.set()
+
+    @patch("builtins.print")
+    def test_failing_receiver_is_reported(self, mock_print):
+        def failing(sender, **kwargs):
+            raise RuntimeError("boom")
+
+        self.connect(emqx_device_connected, failing)
+        dispatcher = SignalDispatcher(mode="async", workers=1)
+        self.addCleanup(dispatcher.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatcher.send(emqx_device_connected, EMQXDevice, user_id="1", client_id="a")
+        dispatcher.stop()
+        mock_print.assert_any_call("❌ Signal receiver failing failed: boom")
+
+    def test_batch_signals_collect_events(self):
+        batches = []
+        self.connect(emqx_devices_connected_batch, lambda sender, events, **kwargs: batches.append(("connected", events)))
+        self.connect(emqx_devices_disconnected_batch, lambda sender, events, **kwargs: batches.append(("disconnected", events)))
+
+        dispatcher = SignalDispatcher(mode="sync", batch_interval=60, batch_size=100)
+        self.addCleanup(dispatcher.stop)
+        for client_id in ("a", "b"):
+            dispatcher.send(emqx_device_connected, EMQXDevice, user_id="1", client_id=client_id, ip_address=None)
+        dispatcher.send(emqx_device_disconnected, EMQXDevice, user_id="1", client_id="c", ip_address=None)
+
+        self.assertEqual(dispatcher.flush(), 3)
+        self.assertEqual(sorted(batches), [
+            ("connected", [
+                {"user_id": "1", "client_id": "a", "ip_address": None},
+                {"user_id": "1", "client_id": "b", "ip_address": None},
+            ]),
+            ("disconnected", [{"user_id": "1", "client_id": "c", "ip_address": None}]),
+        ])
+        self.assertEqual(dispatcher.flush(), 0)
+
+    def test_batch_size_triggers_early_flush(self):
+        delivered = threading.Event()
+        self.connect(emqx_devices_connected_batch, lambda sender, events, **kwargs: delivered.set())
+
+        dispatcher = SignalDispatcher(mode="sync", batch_interval=60, batch_size=2)
+        self.addCleanup(dispatcher.stop)
+        dispatcher.send(emqx_device_connected, EMQXDevice, user_id="1", client_id="a")
+        dispatcher.send(emqx_device_connected, EMQXDevice, user_id="1", client_id="b")
+        self.assertTrue(delivered.wait(5))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            SignalDispatcher(mode="celery")
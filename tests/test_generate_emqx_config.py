@@ -0,0 +1,106 @@
+## tests/test_generate_emqx_config.py
+
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from django_emqx.utils import generate_mqtt_access_token
+
+
+def load_config(path):
+    with open(path) as f:
+        # The template contains commented-out lines, which are valid HOCON but not JSON
+        return json.loads("\n".join(line for line in f if not line.strip().startswith("#")))
+
+
+@override_settings(SIMPLE_JWT={"SIGNING_KEY": "key"}, EMQX_NODE_COOKIE="cookie")
+class GenerateEMQXConfigTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.output = os.path.join(self.dir, "emqx.conf")
+
+    def call(self, *args):
+        out = StringIO()
+        with override_settings(BASE_DIR=self.dir):
+            call_command("generate_emqx_config", "--output", self.output, *args, stdout=out)
+        return out.getvalue()
+
+    def generate(self, *args):
+        self.call(*args)
+        return load_config(self.output)
+
+    def test_renders_tuning(self):
+        config = self.generate("--profile", "high-churn", "--connections", "50000", "--webhook-pipelining", "300")
+
+        listener = config["listeners"]["tcp"]["default"]
+        self.assertEqual(listener["acceptors"], 64)
+        self.assertEqual(listener["max_connections"], 60000)
+        self.assertEqual(listener["max_conn_rate"], "5000/s")
+        connector = config["connectors"]["http"]["client_connected_WH_D"]
+        self.assertEqual((connector["pool_size"], connector["enable_pipelining"]), (64, 300))
+        self.assertEqual(config["actions"]["http"]["client_connected_WH_D"]["resource_opts"]["worker_pool_size"], 32)
+
+    def test_invalid_tuning_raises_command_error(self):
+        with self.assertRaises(CommandError):
+            self.generate("--tcp-buffer", "big")
+
+    def test_single_node_has_no_cluster(self):
+        config = self.generate()
+        self.assertEqual(config["node"]["name"], "emqx@127.0.0.1")
+        self.assertNotIn("cluster", config)
+
+    def test_static_cluster_writes_one_config_per_node(self):
+        self.call("--nodes", "emqx1,emqx2,emqx3", "--base-url", "http://web1:8000,http://web2:8000")
+
+        configs = [load_config(os.path.join(self.dir, f"emqx-emqx{index}.conf")) for index in (1, 2, 3)]
+        self.assertEqual([config["node"]["name"] for config in configs], ["emqx@emqx1", "emqx@emqx2", "emqx@emqx3"])
+        self.assertEqual({config["node"]["cookie"] for config in configs}, {"cookie"})
+        self.assertEqual(configs[0]["cluster"]["static"]["seeds"], ["emqx@emqx1", "emqx@emqx2", "emqx@emqx3"])
+        urls = [config["connectors"]["http"]["client_connected_WH_D"]["url"] for config in configs]
+        self.assertEqual(urls, ["http://web1:8000/api/devices/", "http://web2:8000/api/devices/", "http://web1:8000/api/devices/"])
+
+    def test_dns_cluster(self):
+        self.call("--nodes", "emqx1", "--discovery", "dns", "--dns-name", "emqx.internal", "--dns-record-type", "srv")
+
+        cluster = load_config(os.path.join(self.dir, "emqx-emqx1.conf"))["cluster"]
+        self.assertEqual(cluster["discovery_strategy"], "dns")
+        self.assertEqual(cluster["dns"], {"name": "emqx.internal", "record_type": "srv"})
+
+        with self.assertRaises(CommandError):
+            self.call("--nodes", "emqx1", "--discovery", "dns")
+
+    def test_dry_run_diffs_without_writing(self):
+        output = self.call("--dry-run")
+        self.assertIn("would be created", output)
+        self.assertFalse(os.path.exists(self.output))
+
+        self.call()
+        self.assertIn("is up to date", self.call("--dry-run"))
+
+        output = self.call("--dry-run", "--acceptors", "32")
+        self.assertIn('-        "acceptors": 16,', output)
+        self.assertIn('+        "acceptors": 32,', output)
+        self.assertEqual(load_config(self.output)["listeners"]["tcp"]["default"]["acceptors"], 16)
+
+    def test_authz_binds_username_to_token(self):
+        self.assertEqual(self.generate()["authentication"][0]["verify_claims"], {})
+
+        with override_settings(EMQX_AUTHZ_ENABLED=True):
+            config = self.generate()
+        self.assertIn("authorization", config)
+        # EMQX rejects a connection whose MQTT username differs from the token's claim
+        self.assertEqual(config["authentication"][0]["verify_claims"], {"username": "${username}"})
+
+        user = get_user_model().objects.create(username="alice")
+        with override_settings(EMQX_AUTHZ_ENABLED=True):
+            token = AccessToken(generate_mqtt_access_token(user))
+        self.assertEqual(token["username"], str(user.pk))
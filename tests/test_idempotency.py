@@ -0,0 +1,168 @@
+import itertools
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from django_emqx.idempotency import IdempotencyGuard
+from django_emqx.mixins import ClientEventMixin, NotificationSenderMixin
+from django_emqx.models import BulkSendJob, EMQXDevice, EMQXSubscription, Message, Notification
+
+User = get_user_model()
+
+event_ids = itertools.count()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@override_settings(CACHES={"dedupe": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "t"}})
+class IdempotencyGuardTests(TestCase):
+    def test_claim_and_release(self):
+        guard = IdempotencyGuard(window=60, maxsize=10)
+
+        self.assertTrue(guard.claim("a"))
+        self.assertFalse(guard.claim("a"))
+        self.assertEqual(guard.duplicates, 1)
+        guard.release("a")
+        self.assertTrue(guard.claim("a"))
+
+    def test_keys_expire_after_window(self):
+        clock = FakeClock()
+        guard = IdempotencyGuard(window=60, maxsize=10, clock=clock)
+        guard.claim("a")
+
+        clock.now += 61
+        self.assertTrue(guard.claim("a"))
+
+    def test_shared_cache_spans_processes(self):
+        first = IdempotencyGuard(window=60, maxsize=10, cache_alias="dedupe")
+        second = IdempotencyGuard(window=60, maxsize=10, cache_alias="dedupe")
+
+        self.assertTrue(first.claim("shared"))
+        self.assertFalse(second.claim("shared"))
+        first.release("shared")
+        self.assertTrue(IdempotencyGuard(window=60, maxsize=10, cache_alias="dedupe").claim("shared"))
+
+
+@patch("django_emqx.mixins.get_signal_dispatcher")
+class WebhookDeduplicationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="secret")
+        self.mixin = ClientEventMixin()
+
+    def event(self, event="client.connected", **extra):
+        return {"event": event, "clientid": "c1", "user_id": str(self.user.pk), **extra}
+
+    def test_retried_event_is_applied_once(self, get_signal_dispatcher):
+        data = self.event(event_id=f"node:{next(event_ids)}")
+
+        with patch.object(ClientEventMixin, "handle_client_connected", return_value=True) as connected:
+            self.assertEqual(self.mixin.handle_webhook_event(data), ({"status": "success"}, 200))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.mixin.handle_webhook_event(data), ({"status": "success"}, 200))
+
+        connected.assert_called_once()
+        self.assertEqual(get_signal_dispatcher.return_value.send.call_count, 1)
+
+    def test_events_without_id_are_always_applied(self, get_signal_dispatcher):
+        self.mixin.handle_webhook_event(self.event())
+        self.mixin.handle_webhook_event(self.event())
+        self.assertEqual(get_signal_dispatcher.return_value.send.call_count, 2)
+
+    def test_failed_event_is_applied_on_retry(self, get_signal_dispatcher):
+        data = self.event(event_id=f"node:{next(event_ids)}")
+
+        with patch.object(ClientEventMixin, "handle_client_connected", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.mixin.handle_webhook_event(data)
+        self.mixin.handle_webhook_event(data)
+
+        self.assertTrue(EMQXDevice.objects.filter(client_id="c1").exists())
+
+    def test_subscriptions_sharing_a_timestamp(self, get_signal_dispatcher):
+        EMQXDevice.objects.create(client_id="c1", user=self.user)
+        event_id = f"node:{next(event_ids)}"
+        for topic in ("a", "b"):
+            self.mixin.handle_webhook_event(self.event("session.subscribed", topic=topic, event_id=event_id))
+
+        self.assertEqual(sorted(EMQXSubscription.objects.values_list("topic", flat=True)), ["a", "b"])
+
+
+@patch("django_emqx.mixins.firebase_installed", False)
+@patch("django_emqx.mixins.send_mqtt_message")
+class SendDeduplicationTests(TestCase):
+    def setUp(self):
+        self.mixin = NotificationSenderMixin()
+        self.users = [User.objects.create(username=f"user{i}") for i in range(3)]
+        self.ids = [user.pk for user in self.users]
+        self.message = Message.objects.create(title="Hello")
+
+    def test_retried_chunk_is_skipped(self, send_mqtt_message):
+        self.mixin.send_notification_chunk(self.message, self.ids[:2])
+        self.mixin.send_notification_chunk(self.message, self.ids)
+
+        self.assertEqual(Notification.objects.filter(message=self.message).count(), 3)
+        self.assertEqual(sorted(call.args[0] for call in send_mqtt_message.call_args_list), self.ids)
+
+    def test_fully_sent_chunk_costs_one_query(self, send_mqtt_message):
+        self.mixin.send_notification_chunk(self.message, self.ids)
+        with self.assertNumQueries(1):
+            self.mixin.send_notification_chunk(self.message, self.ids)
+
+    def test_inline_send_is_not_repeated(self, send_mqtt_message):
+        self.mixin.send_all_notifications(self.message, self.users)
+        self.mixin.send_all_notifications(self.message, self.users)
+
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(send_mqtt_message.call_count, 3)
+
+
+@patch("django_emqx.bulk.start_bulk_job")
+class BulkSendIdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username="admin", password="secret", is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+
+    def post(self, key=None, **body):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        body = {"title": "Hi", "audience": {"user_ids": [self.admin.pk]}, **body}
+        return self.client.post(reverse("bulk-list"), body, format="json", **headers)
+
+    def test_repeated_key_returns_first_job(self, start_bulk_job):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.post("send-1")
+            second = self.post("send-1")
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data["job_id"], second.data["job_id"])
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(start_bulk_job.call_count, 1)
+
+    def test_key_in_body(self, start_bulk_job):
+        self.post(idempotency_key="send-2")
+        self.post(idempotency_key="send-2")
+        self.assertEqual(BulkSendJob.objects.count(), 1)
+        self.assertEqual(Message.objects.get().idempotency_key, "send-2")
+
+    def test_without_key_every_request_sends(self, start_bulk_job):
+        self.post()
+        self.post()
+        self.assertEqual(BulkSendJob.objects.count(), 2)
+
+    def test_invalid_key(self, start_bulk_job):
+        response = self.post(idempotency_key="x" * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content), {"error": "Invalid idempotency key"})
@@ -1,12 +1,15 @@
 ## tests/test_mixins.py
 
+from datetime import timedelta
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from unittest.mock import patch, MagicMock
 
-from django_emqx import utils
-from django_emqx.models import EMQXDevice, Message
+from django_emqx import get_user_cache, utils
+from django_emqx.models import EMQXDevice, EMQXSubscription, Message, Notification
 from django_emqx.mixins import NotificationSenderMixin, ClientEventMixin
 
 User = get_user_model()
@@ -38,9 +41,51 @@ class NotificationSenderMixinTests(TestCase):
 
         mock_send_mqtt.assert_called_once_with(self.user, self.message)
 
+    @patch("django_emqx.mixins.firebase_installed", False)
+    @patch("django_emqx.mixins.send_mqtt_message")
+    def test_collapse_key_replaces_pending_notifications(self, mock_send_mqtt):
+        other = User.objects.create_user(username="other", password="test")
+        old = Message.objects.create(title="3 unread", collapse_key="unread")
+        read = Message.objects.create(title="2 unread", collapse_key="unread")
+        Notification.objects.create(message=old, recipient=self.user)
+        Notification.objects.create(message=old, recipient=other)
+        Notification.objects.create(message=read, recipient=self.user, is_acknowledged=True)
+
+        new = Message.objects.create(title="4 unread", collapse_key="unread")
+        self.mixin.send_all_notifications(message=new, recipients=[self.user])
+
+        remaining = set(Notification.objects.values_list("message_id", "recipient_id"))
+        self.assertEqual(remaining, {(old.id, other.id), (read.id, self.user.id), (new.id, self.user.id)})
+
+    @patch("django_emqx.mixins.FCMDevice", create=True)
+    @patch("django_emqx.mixins.firebase_installed", True)
+    @patch("django_emqx.mixins.send_mqtt_message")
+    def test_expired_message_is_not_sent(self, mock_send_mqtt, mock_fcm_device):
+        expired = Message.objects.create(title="Sale", expires_at=timezone.now() - timedelta(seconds=1))
+        personalized = Message.objects.create(
+            title="Hi {{ user.username }}", personalized=True, expires_at=expired.expires_at
+        )
+
+        self.mixin.send_all_notifications(message=expired, recipients=[self.user])
+        self.mixin.send_notification_chunk(expired, [self.user.id])
+        self.mixin.send_notification_chunk(personalized, [self.user.id])
+
+        self.assertFalse(Notification.objects.exists())
+        mock_send_mqtt.assert_not_called()
+        mock_fcm_device.objects.filter.assert_not_called()
+
+    def test_build_fcm_message_sets_collapse_key(self):
+        if not utils.firebase_installed:
+            self.skipTest("Firebase is not installed")
+        fcm_message = self.mixin.build_fcm_message(Message(title="4 unread", collapse_key="unread"))
+        self.assertEqual(fcm_message.android.collapse_key, "unread")
+        self.assertEqual(fcm_message.apns.headers, {"apns-collapse-id": "unread"})
+        self.assertIsNone(self.mixin.build_fcm_message(self.message).android)
+
 
 class ClientEventMixinTests(TestCase):
     def setUp(self):
+        get_user_cache().clear()
         self.user = User.objects.create_user(username="tester", password="test")
         self.mixin = ClientEventMixin()
 
@@ -92,8 +137,47 @@ class ClientEventMixinTests(TestCase):
 
         self.assertFalse(EMQXDevice.objects.filter(client_id="no-user-device").exists())
 
+    def test_handle_client_connected_caches_user_id(self):
+        user_id = self.user.id
+        self.mixin.handle_client_connected(user_id=user_id, client_id="device123")
+
+        with self.assertNumQueries(0):
+            self.assertTrue(get_user_cache().exists(user_id))
+
+        # Deleting the user evicts it, so the next connect does not write a dangling user_id
+        self.user.delete()
+        self.mixin.handle_client_connected(user_id=user_id, client_id="device123")
+        self.assertFalse(EMQXDevice.objects.exists())
+
     def test_handle_client_disconnected_ignores_missing_user(self):
         # No exception should be raised
         self.mixin.handle_client_disconnected(user_id=9999, client_id="no-user-device")
 
         self.assertEqual(EMQXDevice.objects.count(), 0)
+
+    def test_handle_client_subscribed_records_topics(self):
+        device = EMQXDevice.objects.create(client_id="device789", user=self.user)
+
+        created = self.mixin.handle_client_subscribed(self.user.id, "device789", ["a/#", "b/+"], qos=1)
+        self.assertEqual(created, 2)
+        # Re-subscribing updates the QoS instead of duplicating the row
+        self.mixin.handle_client_subscribed(self.user.id, "device789", ["a/#"], qos=2)
+
+        self.assertEqual(
+            set(device.subscriptions.values_list("topic", "qos")),
+            {("a/#", 2), ("b/+", 1)},
+        )
+
+    def test_handle_client_subscribed_ignores_unknown_device(self):
+        self.assertEqual(self.mixin.handle_client_subscribed(self.user.id, "missing", ["a/#"]), 0)
+        self.assertEqual(EMQXSubscription.objects.count(), 0)
+
+    def test_handle_client_unsubscribed_removes_topics(self):
+        device = EMQXDevice.objects.create(client_id="device789", user=self.user)
+        EMQXSubscription.objects.create(device=device, topic="a/#")
+        EMQXSubscription.objects.create(device=device, topic="b/+")
+
+        deleted = self.mixin.handle_client_unsubscribed(self.user.id, "device789", ["a/#"])
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(list(device.subscriptions.values_list("topic", flat=True)), ["b/+"])
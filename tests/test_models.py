@@ -1,5 +1,10 @@
 ## tests/test_models.py
 
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.utils.timezone import now
@@ -140,4 +145,39 @@ class NotificationModelTests(TestCase):
     def test_user_notification_fields(self):
         self.assertEqual(self.notification.message, self.message)
         self.assertEqual(self.notification.recipient, self.user)
-        self.assertIsNotNone(self.notification.delivered_at)
\ No newline at end of file
+        self.assertIsNotNone(self.notification.delivered_at)
+
+
+class MessageExpiryTests(TestCase):
+    def setUp(self):
+        self.expired = Message.objects.create(title="Old", expires_at=now() - timedelta(minutes=1))
+        self.fresh = Message.objects.create(title="Fresh", expires_at=now() + timedelta(minutes=10))
+        self.forever = Message.objects.create(title="Forever")
+
+    def test_is_expired(self):
+        self.assertTrue(self.expired.is_expired)
+        self.assertFalse(self.fresh.is_expired)
+        self.assertFalse(self.forever.is_expired)
+
+    def test_remaining_ttl(self):
+        self.assertEqual(self.expired.remaining_ttl(), 0)
+        self.assertAlmostEqual(self.fresh.remaining_ttl(), 600, delta=5)
+        self.assertIsNone(self.forever.remaining_ttl())
+
+    def test_remaining_ttl_rounds_up(self):
+        with patch("django_emqx.models.timezone.now", return_value=self.fresh.expires_at - timedelta(seconds=0.5)):
+            self.assertFalse(self.fresh.is_expired)
+            self.assertEqual(self.fresh.remaining_ttl(), 1)
+
+    def test_queryset_helpers(self):
+        self.assertEqual(list(Message.objects.expired()), [self.expired])
+        self.assertEqual(set(Message.objects.unexpired()), {self.fresh, self.forever})
+
+    def test_purge_expired_messages_command(self):
+        user = User.objects.create_user(username="testuser", password="testpassword")
+        Notification.objects.create(message=self.expired, recipient=user)
+
+        call_command("purge_expired_messages", chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(set(Message.objects.all()), {self.fresh, self.forever})
+        self.assertFalse(Notification.objects.exists())
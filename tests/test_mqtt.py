@@ -1,6 +1,140 @@
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
-from django_emqx.mqtt import MQTTClient
+import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.reasoncodes import ReasonCode
+from django_emqx.mqtt import MQTTClient, TopicAliasMap
+
+
+class TestTopicAliasMap(unittest.TestCase):
+
+    def test_disabled_without_maximum(self):
+        aliases = TopicAliasMap()
+        self.assertEqual(aliases.resolve("user/1/"), ("user/1/", None))
+
+    def test_repeated_topic_sends_alias_only(self):
+        aliases = TopicAliasMap(maximum=2)
+        self.assertEqual(aliases.resolve("user/1/"), ("user/1/", 1))
+        self.assertEqual(aliases.resolve("user/1/"), ("", 1))
+        self.assertEqual(aliases.resolve("user/2/"), ("user/2/", 2))
+
+    def test_least_recently_used_alias_is_rebound(self):
+        aliases = TopicAliasMap(maximum=2)
+        aliases.resolve("user/1/")
+        aliases.resolve("user/2/")
+        aliases.resolve("user/1/")
+        self.assertEqual(aliases.resolve("user/3/"), ("user/3/", 2))
+        self.assertEqual(aliases.resolve("user/1/"), ("", 1))
+
+    def test_reset(self):
+        aliases = TopicAliasMap(maximum=2)
+        aliases.resolve("user/1/")
+        aliases.reset()
+        self.assertEqual(aliases.resolve("user/1/"), ("user/1/", 1))
+
+
+@patch('django_emqx.mqtt.mqtt.Client')
+@patch('django_emqx.mqtt.generate_backend_mqtt_token', return_value="mock_token")
+class TestMQTTClientV5(unittest.TestCase):
+
+    def connect(self, client, topic_alias_maximum=10):
+        properties = Properties(PacketTypes.CONNACK)
+        properties.TopicAliasMaximum = topic_alias_maximum
+        client.on_connect(client.client, None, None, ReasonCode(PacketTypes.CONNACK, identifier=0), properties)
+
+    def test_initialization(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+
+        mock_mqtt_client.assert_called_once_with(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2, protocol=mqtt.MQTTv5
+        )
+        properties = client.client.connect.call_args.kwargs["properties"]
+        self.assertEqual(properties.SessionExpiryInterval, 0)
+
+    def test_publish_uses_topic_alias_and_properties(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        self.connect(client)
+
+        client.publish("user/1/", "{}", user_properties={"msg_id": 5}, content_type="application/json")
+        args, kwargs = client.client.publish.call_args
+        self.assertEqual(args[0], "user/1/")
+        self.assertEqual(kwargs["properties"].TopicAlias, 1)
+        self.assertEqual(kwargs["properties"].UserProperty, [("msg_id", "5")])
+        self.assertEqual(kwargs["properties"].ContentType, "application/json")
+
+        client.publish("user/1/", "{}")
+        args, kwargs = client.client.publish.call_args
+        self.assertEqual(args[0], "")
+        self.assertEqual(kwargs["properties"].TopicAlias, 1)
+
+    def test_reconnect_resends_aliased_publish_with_full_topic(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        client.client._out_message_mutex = threading.RLock()
+        client.client._out_messages = {}
+        self.connect(client)
+        client.publish("user/1/", "{}")
+
+        def reconnect_before_puback():
+            # Paho keeps the unacknowledged message as passed to publish()
+            args, kwargs = client.client.publish.call_args
+            message = mqtt.MQTTMessage(mid=info.mid, topic=args[0].encode())
+            message.properties = kwargs["properties"]
+            client.client._out_messages[info.mid] = message
+            client.on_disconnect(client.client, None, ReasonCode(PacketTypes.DISCONNECT, identifier=0x80))
+            self.connect(client)
+
+        info = client.client.publish.return_value
+        info.mid = 7
+        info.wait_for_publish.side_effect = reconnect_before_puback
+        client.publish("user/1/", "{}")
+
+        self.assertEqual(client.client.publish.call_args.args[0], "")
+        resent = client.client._out_messages[7]
+        self.assertEqual(resent.topic, "user/1/")
+        self.assertFalse(hasattr(resent.properties, "TopicAlias"))
+        self.assertEqual(client._aliased, {})
+        # The alias map starts over on the new connection
+        self.assertEqual(client.topic_aliases.resolve("user/1/"), ("user/1/", 1))
+
+    def test_topic_alias_maximum_capped_by_setting(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        self.connect(client, topic_alias_maximum=65535)
+        self.assertEqual(client.topic_aliases.maximum, 1024)
+
+    def test_publish_rejected_by_broker(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        info = client.client.publish.return_value
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+
+        def reject():
+            client._on_publish_v2(client.client, None, info.mid, ReasonCode(PacketTypes.PUBACK, identifier=0x87), None)
+        info.wait_for_publish.side_effect = reject
+
+        self.assertFalse(client.publish("user/1/", "{}"))
+
+    def test_auth_failure_refreshes_token(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        mock_generate_token.return_value = "new_token"
+
+        client.on_disconnect(client.client, None, ReasonCode(PacketTypes.DISCONNECT, identifier=0x87))
+
+        client.client.username_pw_set.assert_called_with(username='backend', password="new_token")
+        client.client.reconnect.assert_called_once()
+
+    def test_session_taken_over_does_not_reconnect(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        client.on_disconnect(client.client, None, ReasonCode(PacketTypes.DISCONNECT, identifier=0x8E))
+        client.client.reconnect.assert_not_called()
+
+    def test_falls_back_to_v311(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        client._fall_back_to_v311()
+
+        self.assertEqual(client.protocol, mqtt.MQTTv311)
+        mock_mqtt_client.assert_called_with(protocol=mqtt.MQTTv311)
+        client.client.connect.assert_called_with("test_broker", 1883, 60)
 
 
 class TestMQTTClient(unittest.TestCase):
@@ -30,6 +164,31 @@ class TestMQTTClient(unittest.TestCase):
 
         mock_client_instance.publish.assert_called_with("test/topic", "test_message", 1)
 
+    @patch('django_emqx.mqtt.mqtt.Client')
+    def test_publish_retained(self, mock_mqtt_client):
+        mock_client_instance = MagicMock()
+        mock_mqtt_client.return_value = mock_client_instance
+
+        client = MQTTClient(broker="test_broker")
+        client.publish(topic="test/topic", payload="test_message", qos=1, retain=True)
+
+        mock_client_instance.publish.assert_called_with("test/topic", "test_message", 1, retain=True)
+
+    @patch('django_emqx.mqtt.mqtt.Client')
+    def test_publish_expiry_interval_v5(self, mock_mqtt_client):
+        mock_client_instance = MagicMock()
+        mock_mqtt_client.return_value = mock_client_instance
+
+        client = MQTTClient(broker="test_broker")
+        client.publish(topic="test/topic", payload="test_message", qos=1, expiry_interval=60)
+        # MQTT 3.1.1 has no message expiry
+        mock_client_instance.publish.assert_called_with("test/topic", "test_message", 1)
+
+        client.protocol = mqtt.MQTTv5
+        client.publish(topic="test/topic", payload="test_message", qos=1, expiry_interval=60)
+        properties = mock_client_instance.publish.call_args.kwargs["properties"]
+        self.assertEqual(properties.MessageExpiryInterval, 60)
+
     @patch('django_emqx.mqtt.mqtt.Client')
     def test_disconnect(self, mock_mqtt_client):
         mock_client_instance = MagicMock()
@@ -63,3 +222,22 @@ class TestMQTTClient(unittest.TestCase):
 
         # Verify reconnection attempt
         mock_client_instance.reconnect.assert_called_once()
+
+
+class TestMQTTClientSubscribe(unittest.TestCase):
+
+    @patch('django_emqx.mqtt.mqtt.Client')
+    def test_shared_subscription_restored_on_connect(self, mock_mqtt_client):
+        mock_client_instance = MagicMock()
+        mock_mqtt_client.return_value = mock_client_instance
+        callback = MagicMock()
+
+        client = MQTTClient(broker="test_broker")
+        client.subscribe("ack/+", callback, qos=1, share_group="django_emqx")
+
+        mock_client_instance.message_callback_add.assert_called_with("ack/+", callback)
+        mock_client_instance.subscribe.assert_called_with("$share/django_emqx/ack/+", 1)
+
+        mock_client_instance.subscribe.reset_mock()
+        client.on_connect(mock_client_instance, None, None, 0)
+        mock_client_instance.subscribe.assert_called_once_with("$share/django_emqx/ack/+", 1)
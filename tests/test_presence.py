@@ -0,0 +1,119 @@
+## tests/test_presence.py
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from django_emqx.models import EMQXDevice
+from django_emqx.presence import EMQXAPIClient, reconcile_presence
+
+User = get_user_model()
+
+
+class FakeEMQXAPI(ThreadingHTTPServer):
+    """Local stand-in of the EMQX v5 clients API."""
+
+    def __init__(self, connected):
+        super().__init__(("127.0.0.1", 0), FakeEMQXHandler)
+        self.connected = list(connected)
+        self.connections = 0
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v5"
+
+
+class FakeEMQXHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.server.requests.append(url.path)
+        if url.path == "/api/v5/clients":
+            query = parse_qs(url.query)
+            page, limit = int(query["page"][0]), int(query["limit"][0])
+            clients = self.server.connected[(page - 1) * limit:page * limit]
+            hasnext = page * limit < len(self.server.connected)
+            self.send_json(200, {"data": [{"clientid": c} for c in clients], "meta": {"page": page, "hasnext": hasnext}})
+        elif unquote(url.path.rsplit("/", 1)[-1]) in self.server.connected:
+            self.send_json(200, {"connected": True})
+        else:
+            self.send_json(404, {"code": "CLIENTID_NOT_FOUND"})
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PresenceReconciliationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="test")
+        for index in range(10):
+            EMQXDevice.objects.create(
+                client_id=f"device-{index}", user=self.user,
+                active=index % 2 == 0, last_status="online" if index % 2 == 0 else "offline",
+            )
+
+    def start_api(self, connected):
+        server = FakeEMQXAPI(connected)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_pages_through_clients_over_one_connection(self):
+        server = self.start_api([f"device-{index}" for index in range(25)])
+        client = EMQXAPIClient(base_url=server.url)
+
+        clients = list(client.iter_connected_clients(page_size=10))
+        client.close()
+
+        self.assertEqual(len(clients), 25)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(server.connections, 1)
+
+    def test_reconcile_fixes_drift_in_chunks(self):
+        # Devices 0-3 are online, 4-9 are not; 42 has no device
+        connected = {f"device-{index}" for index in range(4)} | {"device-42"}
+
+        stats = reconcile_presence(connected, chunk_size=3)
+
+        self.assertEqual(stats, {"checked": 10, "marked_online": 2, "marked_offline": 3, "unknown": 1})
+        online = set(EMQXDevice.objects.filter(last_status="online", active=True).values_list("client_id", flat=True))
+        self.assertEqual(online, {f"device-{index}" for index in range(4)})
+
+    def test_verify_keeps_devices_missed_while_paging(self):
+        stats = reconcile_presence(set(), verify=lambda client_id: client_id == "device-0", dry_run=True)
+        self.assertEqual(stats["marked_offline"], 4)
+        self.assertEqual(EMQXDevice.objects.filter(last_status="online").count(), 5)
+
+    def test_command(self):
+        server = self.start_api(["device-1"])
+        out = StringIO()
+
+        call_command("reconcile_emqx_presence", "--api-url", server.url, stdout=out)
+
+        self.assertEqual(
+            list(EMQXDevice.objects.filter(last_status="online").values_list("client_id", flat=True)), ["device-1"]
+        )
+        self.assertIn("1 marked online, 5 marked offline", out.getvalue())
+        self.assertEqual(server.connections, 1)
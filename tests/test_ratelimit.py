@@ -0,0 +1,159 @@
+import unittest
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from unittest.mock import patch, MagicMock
+
+from django_emqx.ratelimit import CacheBucketStore, LocalBucketStore, RateLimiter
+from django_emqx.utils import send_mqtt_message
+
+User = get_user_model()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_refill(self):
+        store = LocalBucketStore()
+        for _ in range(3):
+            self.assertEqual(store.take("a", rate=2, burst=3, now=0), 0)
+        self.assertAlmostEqual(store.take("a", rate=2, burst=3, now=0), 0.5)
+        self.assertEqual(store.take("a", rate=2, burst=3, now=0.5), 0)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cache_store(self):
+        store = CacheBucketStore("default")
+        self.assertEqual(store.take("b", rate=1, burst=1, now=0), 0)
+        self.assertAlmostEqual(store.take("b", rate=1, burst=1, now=0), 1)
+        self.assertEqual(store.take("b", rate=1, burst=1, now=1), 0)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.send = MagicMock()
+
+    _unset = object()
+
+    def limiter(self, policy, per_recipient=_unset, global_limit=None, max_delay=5):
+        if per_recipient is self._unset:
+            per_recipient = {"rate": 1, "burst": 2}
+        return RateLimiter(
+            per_recipient=per_recipient, global_limit=global_limit, policy=policy,
+            max_delay=max_delay, store=LocalBucketStore(), clock=self.clock, sleep=self.clock.sleep,
+        )
+
+    def test_drop(self):
+        limiter = self.limiter("drop")
+        results = [limiter.admit(1, MagicMock(id=i), self.send) for i in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertTrue(limiter.admit(2, MagicMock(id=4), self.send))
+        self.assertEqual(limiter.metrics()["dropped"], 1)
+        self.assertEqual(limiter.metrics()["allowed"], 3)
+
+    def test_delay(self):
+        limiter = self.limiter("delay")
+        for i in range(3):
+            self.assertTrue(limiter.admit(1, MagicMock(id=i), self.send))
+        self.assertEqual(self.clock.now, 1001.0)
+        self.assertEqual(limiter.metrics()["delayed"], 1)
+        self.assertAlmostEqual(limiter.metrics()["delay_seconds"], 1.0)
+
+    def test_delay_beyond_max_delay_drops(self):
+        limiter = self.limiter("delay", per_recipient={"rate": 0.1, "burst": 1}, max_delay=5)
+        self.assertTrue(limiter.admit(1, MagicMock(id=1), self.send))
+        self.assertFalse(limiter.admit(1, MagicMock(id=2), self.send))
+        self.assertEqual(limiter.metrics()["dropped"], 1)
+
+    def test_invalid_limits_are_rejected(self):
+        for per_recipient in ({"rate": 0, "burst": 2}, {"rate": -1, "burst": 2}, {"rate": 1, "burst": 0}, {"burst": 1}):
+            with self.assertRaises(ImproperlyConfigured):
+                self.limiter("drop", per_recipient=per_recipient)
+        with self.assertRaises(ImproperlyConfigured):
+            self.limiter("drop", global_limit={"rate": 0, "burst": 10})
+
+    def test_global_bucket(self):
+        limiter = self.limiter("drop", per_recipient=None, global_limit={"rate": 1, "burst": 2})
+        results = [limiter.admit(user_id, MagicMock(id=user_id), self.send) for user_id in range(3)]
+        self.assertEqual(results, [True, True, False])
+
+    def test_global_bucket_refunds_recipient_token(self):
+        limiter = self.limiter("drop", per_recipient={"rate": 1, "burst": 1}, global_limit={"rate": 1, "burst": 1})
+        self.assertTrue(limiter.admit(1, MagicMock(id=1), self.send))
+        self.assertFalse(limiter.admit(2, MagicMock(id=2), self.send))
+        self.clock.now += 1
+        self.assertTrue(limiter.admit(2, MagicMock(id=3), self.send))
+
+    @patch("django_emqx.ratelimit.threading.Timer")
+    def test_coalesce_publishes_only_latest(self, mock_timer):
+        limiter = self.limiter("coalesce", per_recipient={"rate": 1, "burst": 1})
+        messages = [MagicMock(id=i) for i in range(4)]
+        self.assertTrue(limiter.admit(1, messages[0], self.send))
+        for message in messages[1:]:
+            self.assertFalse(limiter.admit(1, message, self.send))
+
+        mock_timer.assert_called_once()
+        self.assertEqual(limiter.metrics()["coalesced"], 2)
+        self.assertEqual(limiter.metrics()["pending"], 1)
+
+        # The timer fires once a token is available again
+        _, kwargs = mock_timer.call_args
+        limiter._flush_pending(*kwargs["args"])
+        self.send.assert_called_once_with(1, messages[3])
+        self.assertEqual(limiter.metrics()["pending"], 0)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.limiter("queue")
+
+
+class SendMQTTMessageRateLimitTests(unittest.TestCase):
+
+    @override_settings(EMQX_RATE_LIMIT_ENABLED=True)
+    @patch("django_emqx.utils.get_rate_limiter")
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_throttled_message_not_published(self, mock_get_mqtt_client, mock_get_rate_limiter):
+        mock_get_rate_limiter.return_value.admit.return_value = False
+        message = MagicMock(id=1, title="Test", body="Message", data=None)
+        message.remaining_ttl.return_value = None
+
+        send_mqtt_message(123, message)
+
+        mock_get_rate_limiter.return_value.admit.assert_called_once()
+        mock_get_mqtt_client.return_value.publish.assert_not_called()
+
+
+class RateLimitMetricsViewSetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="staff", password="test", is_staff=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_metrics_disabled(self):
+        response = self.client.get(reverse("ratelimit-list"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(EMQX_RATE_LIMIT_ENABLED=True)
+    @patch("django_emqx.views.get_rate_limiter")
+    def test_metrics(self, mock_get_rate_limiter):
+        mock_get_rate_limiter.return_value.metrics.return_value = {"dropped": 3}
+        response = self.client.get(reverse("ratelimit-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"dropped": 3})
@@ -0,0 +1,205 @@
+import random
+import unittest
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from unittest.mock import patch, MagicMock
+
+from django_emqx.dispatch import NotificationDispatcher
+from django_emqx.mixins import NotificationSenderMixin
+from django_emqx.models import Message, Notification, ScheduledNotification
+from django_emqx.scheduler import MessageScheduler, TimerWheel
+
+User = get_user_model()
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def test_fires_in_order_with_millisecond_precision(self):
+        wheel = TimerWheel(start=100.0)
+        wheel.schedule(100.0025, "b")
+        wheel.schedule(100.001, "a")
+        wheel.schedule(160.0, "c")
+
+        self.assertEqual(wheel.advance(100.0009), [])
+        self.assertEqual(wheel.advance(100.001), ["a"])
+        self.assertEqual(wheel.advance(100.0024), [])
+        self.assertEqual(wheel.advance(100.003), ["b"])
+        self.assertAlmostEqual(wheel.next_due(), 160.0, places=6)
+        self.assertEqual(wheel.advance(159.999), [])
+        self.assertEqual(wheel.advance(160.0), ["c"])
+        self.assertEqual(len(wheel), 0)
+        self.assertIsNone(wheel.next_due())
+
+    def test_overdue_items_fire_immediately(self):
+        wheel = TimerWheel(start=100.0)
+        wheel.schedule(50.0, "late")
+        self.assertEqual(wheel.advance(100.0), ["late"])
+
+    def test_cascades_and_overflow(self):
+        rng = random.Random(0)
+        wheel = TimerWheel(start=0.0, slots=(4, 4, 4))
+        due = {item: rng.random() * 2 for item in range(1000)}
+        for item, at in due.items():
+            wheel.schedule(at, item)
+
+        now, fired = 0.0, {}
+        while len(wheel):
+            now += rng.random() * 0.01
+            for item in wheel.advance(now):
+                fired[item] = now
+        self.assertEqual(set(fired), set(due))
+        for item, at in due.items():
+            self.assertGreaterEqual(fired[item], at - 0.001)
+            self.assertLess(fired[item] - at, 0.011)
+
+
+class MessageSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"user{i}", password="test") for i in range(3)]
+        self.now = timezone.now()
+        self.clock = MagicMock(return_value=self.now.timestamp())
+        self.deliver = MagicMock()
+        self.scheduler = MessageScheduler(deliver=self.deliver, window=60, clock=self.clock)
+
+    def schedule(self, seconds, **kwargs):
+        message = Message.objects.create(title="Later", send_at=self.now + timedelta(seconds=seconds), **kwargs)
+        NotificationSenderMixin().schedule_notifications(message, User.objects.all())
+        return message
+
+    def test_send_all_notifications_schedules_future_messages(self):
+        message = Message.objects.create(title="Later", send_at=self.now + timedelta(hours=1))
+        with patch("django_emqx.mixins.send_mqtt_message") as mock_send:
+            NotificationSenderMixin().send_all_notifications(message, User.objects.all())
+        mock_send.assert_not_called()
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(ScheduledNotification.objects.filter(message=message).count(), 3)
+
+    def test_fires_due_messages_once(self):
+        soon = self.schedule(0.5)
+        later = self.schedule(30)
+        beyond_window = self.schedule(3600)
+
+        self.assertEqual(self.scheduler.load(), 2)
+        self.assertAlmostEqual(self.scheduler.run_pending(), 0.5, places=2)
+        self.deliver.assert_not_called()
+
+        self.clock.return_value += 0.501
+        self.scheduler.run_pending()
+        message, recipient_ids = self.deliver.call_args[0]
+        self.assertEqual(message, soon)
+        self.assertEqual(sorted(recipient_ids), sorted(user.id for user in self.users))
+        self.assertFalse(ScheduledNotification.objects.filter(message=soon).exists())
+
+        soon.refresh_from_db()
+        self.assertIsNotNone(soon.dispatched_at)
+        self.assertFalse(self.scheduler.fire(soon.pk))
+        self.assertEqual(set(Message.objects.scheduled()), {later, beyond_window})
+
+    def test_survives_restart(self):
+        overdue = self.schedule(-10)
+        restarted = MessageScheduler(deliver=self.deliver, window=60, clock=self.clock)
+        restarted.run_pending()
+        self.assertEqual(self.deliver.call_args[0][0], overdue)
+
+    @patch("django_emqx.scheduler.print")
+    def test_expired_scheduled_message_is_dropped(self, mock_print):
+        message = self.schedule(-10, expires_at=self.now - timedelta(seconds=1))
+        self.assertTrue(self.scheduler.fire(message.pk))
+        self.deliver.assert_not_called()
+
+    def test_failed_delivery_is_fired_again(self):
+        message = self.schedule(-1)
+        self.deliver.side_effect = RuntimeError("broker down")
+        with patch("django_emqx.scheduler.print"):
+            self.scheduler.run_pending()
+
+        message.refresh_from_db()
+        self.assertIsNone(message.dispatched_at)
+        self.assertEqual(ScheduledNotification.objects.filter(message=message).count(), 3)
+
+        self.deliver.side_effect = None
+        self.assertTrue(self.scheduler.fire(message.pk))
+        self.assertFalse(ScheduledNotification.objects.filter(message=message).exists())
+
+    @override_settings(EMQX_DISPATCH_CHUNK_SIZE=2)
+    @patch("django_emqx.mixins.NotificationSenderMixin.send_notification_chunk")
+    def test_retry_only_sends_undelivered_chunks(self, mock_send_chunk):
+        scheduler = MessageScheduler(window=60, clock=self.clock)
+        message = self.schedule(-1)
+        recipient_ids = list(
+            ScheduledNotification.objects.filter(message=message).values_list("recipient_id", flat=True)
+        )
+        mock_send_chunk.side_effect = [None, RuntimeError("broker down")]
+
+        with self.assertRaises(RuntimeError):
+            scheduler.fire(message.pk)
+        message.refresh_from_db()
+        self.assertIsNone(message.dispatched_at)
+        self.assertEqual(
+            list(ScheduledNotification.objects.filter(message=message).values_list("recipient_id", flat=True)),
+            recipient_ids[2:],
+        )
+
+        mock_send_chunk.side_effect = None
+        mock_send_chunk.reset_mock()
+        self.assertTrue(scheduler.fire(message.pk))
+        mock_send_chunk.assert_called_once_with(message, recipient_ids[2:])
+        self.assertFalse(ScheduledNotification.objects.filter(message=message).exists())
+
+    def test_stale_claims_are_released(self):
+        message = self.schedule(-120)
+        Message.objects.filter(pk=message.pk).update(dispatched_at=self.now - timedelta(seconds=90))
+
+        self.scheduler.load()
+        message.refresh_from_db()
+        self.assertIsNone(message.dispatched_at)
+
+    @override_settings(EMQX_DISPATCH_ENABLED=True)
+    @patch("django_emqx.mixins.firebase_installed", False)
+    @patch("django_emqx.mixins.send_mqtt_message")
+    def test_dispatched_rows_are_deleted_after_delivery(self, mock_send_mqtt):
+        dispatcher = NotificationDispatcher(workers=1, chunk_size=2)
+        scheduler = MessageScheduler(window=60, clock=self.clock)
+        message = self.schedule(-1)
+
+        with patch("django_emqx.get_dispatcher", return_value=dispatcher):
+            self.assertTrue(scheduler.fire(message.pk))
+        self.assertEqual(ScheduledNotification.objects.filter(message=message).count(), 3)
+        # Held by this process's dispatcher, so not released as stale
+        self.assertEqual(scheduler.release_stale(before=self.now + timedelta(hours=1)), 0)
+
+        mock_send_mqtt.side_effect = [None, None, RuntimeError("broker down")]
+        dispatcher.drain()
+        message.refresh_from_db()
+        self.assertIsNone(message.dispatched_at)
+        self.assertEqual(ScheduledNotification.objects.filter(message=message).count(), 3)
+
+        mock_send_mqtt.side_effect = None
+        with patch("django_emqx.get_dispatcher", return_value=dispatcher):
+            scheduler.fire(message.pk)
+        dispatcher.drain()
+        self.assertFalse(ScheduledNotification.objects.filter(message=message).exists())
+        self.assertEqual(Notification.objects.filter(message=message).count(), 3)
+
+    def test_schedule_within_loaded_window(self):
+        self.scheduler.load()
+        message = self.schedule(5)
+        self.scheduler.schedule(message)
+        self.assertEqual(len(self.scheduler.wheel), 1)
+
+    @patch("django_emqx.mixins.firebase_installed", False)
+    @patch("django_emqx.mixins.send_mqtt_message")
+    def test_run_message_scheduler_once(self, mock_send_mqtt):
+        message = self.schedule(-1)
+        out = StringIO()
+        call_command("run_message_scheduler", "--once", stdout=out)
+        self.assertIn("Delivered 1 scheduled messages", out.getvalue())
+        self.assertEqual(Notification.objects.filter(message=message).count(), 3)
+        self.assertEqual(mock_send_mqtt.call_count, 3)
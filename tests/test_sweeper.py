@@ -0,0 +1,130 @@
+## tests/test_sweeper.py
+
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from django_emqx.models import ArchivedEMQXDevice, EMQXDevice, EMQXSubscription
+from django_emqx.presence import EMQXAPIError
+
+User = get_user_model()
+
+
+class SweepEMQXDevicesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tester", password="test")
+        now = timezone.now()
+        self.fresh = self.create("fresh", "online", now)
+        self.silent = self.create("silent", "online", now - timedelta(hours=2))
+        self.stale = self.create("stale", "offline", now - timedelta(days=40))
+        self.recent = self.create("recent", "offline", now - timedelta(days=2))
+        EMQXSubscription.objects.create(device=self.stale, topic="user/1/#")
+        patcher = patch("django_emqx.management.commands.sweep_emqx_devices.EMQXAPIClient")
+        self.api_client = patcher.start().return_value
+        self.api_client.is_connected.return_value = False
+        self.addCleanup(patcher.stop)
+
+    def create(self, client_id, status, last_event_at):
+        device = EMQXDevice.objects.create(client_id=client_id, user=self.user, active=status == "online", last_status=status)
+        EMQXDevice.objects.filter(pk=device.pk).update(last_event_at=last_event_at)
+        return device
+
+    def sweep(self, *args):
+        out = StringIO()
+        call_command("sweep_emqx_devices", "--chunk-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_marks_silent_devices_offline(self):
+        output = self.sweep("--heartbeat-timeout", "3600")
+
+        self.assertIn("1 devices were marked offline", output)
+        self.assertEqual(
+            list(EMQXDevice.objects.filter(last_status="online").values_list("client_id", flat=True)), ["fresh"]
+        )
+
+    def test_keeps_devices_connected_to_emqx_online(self):
+        self.api_client.is_connected.side_effect = lambda client_id: client_id == "silent"
+
+        output = self.sweep("--heartbeat-timeout", "3600")
+
+        self.assertIn("0 devices were marked offline", output)
+        self.api_client.is_connected.assert_called_once_with("silent")
+        self.api_client.close.assert_called_once()
+        self.assertEqual(EMQXDevice.objects.filter(last_status="online").count(), 2)
+
+    def test_device_reconnecting_after_the_check_stays_online(self):
+        def is_connected(client_id):
+            # The device reconnects right after EMQX reported it as gone
+            EMQXDevice.objects.filter(client_id=client_id).update(last_event_at=timezone.now())
+            return False
+
+        self.api_client.is_connected.side_effect = is_connected
+
+        output = self.sweep("--heartbeat-timeout", "3600")
+
+        self.assertIn("0 devices were marked offline", output)
+        self.assertEqual(EMQXDevice.objects.filter(last_status="online").count(), 2)
+
+    def test_no_verify_skips_emqx(self):
+        output = self.sweep("--heartbeat-timeout", "3600", "--no-verify")
+
+        self.assertIn("1 devices were marked offline", output)
+        self.api_client.is_connected.assert_not_called()
+
+    def test_marking_offline_bumps_updated_at(self):
+        before = timezone.now()
+        self.sweep("--heartbeat-timeout", "3600")
+
+        self.silent.refresh_from_db()
+        self.assertGreaterEqual(self.silent.updated_at, before)
+        self.assertLess(self.silent.last_event_at, before - timedelta(hours=1))
+
+    def test_api_errors_abort(self):
+        self.api_client.is_connected.side_effect = EMQXAPIError("EMQX answered 503")
+
+        with self.assertRaises(CommandError):
+            self.sweep("--heartbeat-timeout", "3600")
+        self.api_client.close.assert_called_once()
+
+    def test_falls_back_to_older_timestamps(self):
+        # Rows from before `last_event_at` existed, some also without `updated_at`
+        EMQXDevice.objects.update(last_event_at=None)
+        EMQXDevice.objects.filter(client_id="stale").update(updated_at=None)
+        EMQXDevice.objects.filter(client_id="recent").update(updated_at=None, created_at=timezone.now())
+        ancient = timezone.now() - timedelta(days=40)
+        EMQXDevice.objects.filter(client_id="stale").update(last_connected_at=ancient)
+
+        self.sweep("--inactive-days", "30")
+
+        self.assertEqual(set(EMQXDevice.objects.values_list("client_id", flat=True)), {"fresh", "silent", "recent"})
+
+    def test_deletes_inactive_devices(self):
+        self.sweep("--inactive-days", "30")
+
+        self.assertEqual(set(EMQXDevice.objects.values_list("client_id", flat=True)), {"fresh", "silent", "recent"})
+        self.assertFalse(EMQXSubscription.objects.exists())
+        self.assertFalse(ArchivedEMQXDevice.objects.exists())
+
+    def test_archives_inactive_devices(self):
+        self.sweep("--inactive-days", "30", "--archive")
+
+        archived = ArchivedEMQXDevice.objects.get()
+        self.assertEqual((archived.device_id, archived.client_id, archived.user), (self.stale.pk, "stale", self.user))
+        self.assertFalse(EMQXDevice.objects.filter(client_id="stale").exists())
+
+    def test_dry_run(self):
+        output = self.sweep("--heartbeat-timeout", "3600", "--inactive-days", "30", "--dry-run")
+
+        self.assertIn("1 devices would be marked offline, 1 inactive devices would be deleted", output)
+        self.assertEqual(EMQXDevice.objects.count(), 4)
+        self.assertEqual(EMQXDevice.objects.filter(last_status="online").count(), 2)
+
+    def test_requires_an_action(self):
+        with self.assertRaises(CommandError):
+            self.sweep()
@@ -0,0 +1,109 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from django_emqx.mixins import NotificationSenderMixin
+from django_emqx.models import Message, Notification
+from django_emqx.serializers import BulkSendSerializer
+from django_emqx.templating import (
+    PersonalizedMessage, compile_template, recipient_contexts, render, validate_template,
+)
+from django_emqx.utils import encode_mqtt_payload
+
+User = get_user_model()
+
+
+class TemplateTests(TestCase):
+    def test_compiled_once_per_source(self):
+        self.assertIs(compile_template("Hi {{ first_name }}"), compile_template("Hi {{ first_name }}"))
+
+    def test_render(self):
+        self.assertEqual(render("Hi {{ first_name }}", {"first_name": "Ada"}), "Hi Ada")
+        self.assertEqual(render("Hi {{ first_name }}", {}), "Hi ")
+        self.assertIsNone(render(None, {"first_name": "Ada"}))
+
+    def test_sandboxed(self):
+        self.assertEqual(render("{{ ''.__class__ }}", {}), "")
+
+    def test_validate_template(self):
+        validate_template("Hi {{ first_name }} {{ last_name|upper }}")
+        validate_template(None)
+        with self.assertRaisesRegex(ValueError, "Unknown template variables: password"):
+            validate_template("{{ password }}")
+        with self.assertRaisesRegex(ValueError, "Invalid template"):
+            validate_template("Hi {{ first_name")
+
+    def test_personalized_message_has_own_payload(self):
+        message = Message.objects.create(title="Hi {{ first_name }}", body="Static", data={"k": 1}, personalized=True)
+        ada = PersonalizedMessage(message, {"first_name": "Ada"})
+        bob = PersonalizedMessage(message, {"first_name": "Bob"})
+
+        self.assertEqual((ada.title, ada.body, ada.pk, ada.data), ("Hi Ada", "Static", message.pk, {"k": 1}))
+        self.assertEqual(json.loads(encode_mqtt_payload(ada)[0])["title"], "Hi Ada")
+        self.assertEqual(json.loads(encode_mqtt_payload(bob)[0])["title"], "Hi Bob")
+
+
+@patch("django_emqx.mixins.firebase_installed", False)
+@patch("django_emqx.mixins.send_mqtt_message")
+class PersonalizedDeliveryTests(TestCase):
+    def setUp(self):
+        self.ada = User.objects.create(username="ada", first_name="Ada", last_name="Lovelace")
+        self.bob = User.objects.create(username="bob", first_name="Bob", email="bob@example.com")
+        self.message = Message.objects.create(
+            title="Hi {{ first_name }}", body="Your name is {{ username }}", personalized=True
+        )
+
+    def test_contexts_fetch_only_referenced_fields(self, send_mqtt_message):
+        with self.assertNumQueries(1):
+            contexts = recipient_contexts(self.message, [self.ada.pk, self.bob.pk, 999])
+
+        self.assertEqual(contexts, {
+            self.ada.pk: {"first_name": "Ada", "username": "ada"},
+            self.bob.pk: {"first_name": "Bob", "username": "bob"},
+        })
+
+    def test_chunk_stores_variables_and_publishes_rendered(self, send_mqtt_message):
+        NotificationSenderMixin().send_notification_chunk(self.message, [self.ada.pk, self.bob.pk])
+
+        notification = Notification.objects.get(recipient=self.ada)
+        self.assertEqual(notification.message, self.message)
+        self.assertEqual(notification.context, {"first_name": "Ada", "username": "ada"})
+        self.assertEqual(Message.objects.count(), 1)
+
+        published = {call.args[0]: call.args[1] for call in send_mqtt_message.call_args_list}
+        self.assertEqual(published[self.ada.pk].title, "Hi Ada")
+        self.assertEqual(published[self.bob.pk].body, "Your name is bob")
+
+    def test_send_all_notifications_inline(self, send_mqtt_message):
+        NotificationSenderMixin().send_all_notifications(self.message, User.objects.all())
+
+        self.assertEqual(Notification.objects.filter(message=self.message).count(), 2)
+        self.assertEqual(send_mqtt_message.call_count, 2)
+
+    def test_notification_list_renders_for_recipient(self, send_mqtt_message):
+        NotificationSenderMixin().send_notification_chunk(self.message, [self.ada.pk])
+        client = APIClient()
+        client.force_authenticate(user=self.ada)
+
+        for fast_path in (False, True):
+            with self.subTest(fast_path=fast_path), override_settings(EMQX_LIST_FAST_PATH=fast_path):
+                data = json.loads(client.get(reverse("notifications-list")).content)
+                self.assertEqual((data[0]["title"], data[0]["body"]), ("Hi Ada", "Your name is ada"))
+
+
+class BulkSendTemplateValidationTests(TestCase):
+    def test_rejects_unknown_variables(self):
+        serializer = BulkSendSerializer(data={
+            "title": "Hi {{ email }}", "personalized": True, "audience": {"user_ids": [1]},
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("title", serializer.errors)
+
+    def test_plain_messages_are_not_templates(self):
+        serializer = BulkSendSerializer(data={"title": "{{ email }}", "audience": {"user_ids": [1]}})
+        self.assertTrue(serializer.is_valid())
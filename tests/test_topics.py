@@ -0,0 +1,80 @@
+import unittest
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from django_emqx.models import EMQXDevice, EMQXSubscription
+from django_emqx.topics import TopicTrie, topic_matches
+
+User = get_user_model()
+
+
+class TestTopicMatches(unittest.TestCase):
+
+    def test_exact_match(self):
+        self.assertTrue(topic_matches("user/1/alerts", "user/1/alerts"))
+        self.assertFalse(topic_matches("user/1/alerts", "user/2/alerts"))
+        self.assertFalse(topic_matches("user/1", "user/1/alerts"))
+
+    def test_single_level_wildcard(self):
+        self.assertTrue(topic_matches("user/+/alerts", "user/1/alerts"))
+        self.assertFalse(topic_matches("user/+", "user/1/alerts"))
+        self.assertTrue(topic_matches("user/+/", "user/1/"))
+
+    def test_multi_level_wildcard(self):
+        self.assertTrue(topic_matches("user/1/#", "user/1/alerts/new"))
+        self.assertTrue(topic_matches("user/1/#", "user/1"))
+        self.assertTrue(topic_matches("#", "user/1"))
+
+    def test_wildcards_do_not_match_system_topics(self):
+        self.assertFalse(topic_matches("#", "$SYS/broker"))
+        self.assertFalse(topic_matches("+/broker", "$SYS/broker"))
+        self.assertTrue(topic_matches("$SYS/#", "$SYS/broker"))
+
+
+class TestTopicTrie(unittest.TestCase):
+
+    def setUp(self):
+        self.trie = TopicTrie()
+        self.trie.add("user/1/#", "a")
+        self.trie.add("user/+/alerts", "b")
+        self.trie.add("user/1/alerts", "c")
+        self.trie.add("#", "d")
+
+    def test_match(self):
+        self.assertEqual(self.trie.match("user/1/alerts"), {"a", "b", "c", "d"})
+        self.assertEqual(self.trie.match("user/2/alerts"), {"b", "d"})
+        self.assertEqual(self.trie.match("user/1"), {"a", "d"})
+        self.assertEqual(self.trie.match("$SYS/broker"), set())
+
+    def test_match_agrees_with_topic_matches(self):
+        filters = ["user/1/#", "user/+/alerts", "user/1/alerts", "#", "+", "+/+", "user/+/#", "user//x"]
+        topics = ["user/1/alerts", "user/2", "user", "user//x", "user/1", "a/b/c", "$SYS/x"]
+        trie = TopicTrie()
+        for topic_filter in filters:
+            trie.add(topic_filter, topic_filter)
+        for topic in topics:
+            expected = {f for f in filters if topic_matches(f, topic)}
+            self.assertEqual(trie.match(topic), expected, topic)
+
+    def test_remove(self):
+        self.assertEqual(len(self.trie), 4)
+        self.assertTrue(self.trie.remove("user/1/alerts", "c"))
+        self.assertFalse(self.trie.remove("user/1/alerts", "c"))
+        self.assertFalse(self.trie.remove("user/3/alerts", "b"))
+        self.assertEqual(len(self.trie), 3)
+        self.assertEqual(self.trie.match("user/1/alerts"), {"a", "b", "d"})
+
+
+class TopicTrieFromSubscriptionsTests(TestCase):
+
+    def test_from_subscriptions(self):
+        user = User.objects.create_user(username="tester", password="test")
+        device = EMQXDevice.objects.create(client_id="device1", user=user)
+        inactive = EMQXDevice.objects.create(client_id="device2", user=user, active=False)
+        EMQXSubscription.objects.create(device=device, topic=f"user/{user.id}/#")
+        EMQXSubscription.objects.create(device=inactive, topic=f"user/{user.id}/#")
+
+        trie = TopicTrie.from_subscriptions()
+
+        self.assertEqual(trie.match(f"user/{user.id}/"), {device.id})
@@ -0,0 +1,185 @@
+import unittest
+from unittest.mock import patch
+
+import paho.mqtt.client as mqtt
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from django_emqx import get_tracer
+from django_emqx.dispatch import NotificationDispatcher
+from django_emqx.mixins import NotificationSenderMixin
+from django_emqx.models import Message
+from django_emqx.mqtt import MQTTClient
+from django_emqx.tracing import (
+    NOOP_SPAN, InMemoryExporter, NoopTracer, OpenTelemetryTracer, Tracer, build_tracer, parse_traceparent,
+)
+
+try:
+    import opentelemetry  # noqa: F401
+    opentelemetry_installed = True
+except ImportError:
+    opentelemetry_installed = False
+
+User = get_user_model()
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class CustomExporter(InMemoryExporter):
+    pass
+
+
+class TracerTests(TestCase):
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+        self.tracer = Tracer(self.exporter, sample_rate=1.0)
+
+    def test_nested_spans_share_the_trace(self):
+        with self.tracer.span("outer", kind="test") as outer:
+            with self.tracer.span("inner") as inner:
+                self.assertEqual(self.tracer.inject({}), {"traceparent": inner.context.traceparent})
+
+        self.assertEqual(self.exporter.get_finished_spans(), [inner, outer])
+        self.assertEqual(inner.context.trace_id, outer.context.trace_id)
+        self.assertEqual(inner.parent_id, outer.context.span_id)
+        self.assertIsNone(outer.parent_id)
+        self.assertEqual(outer.attributes, {"kind": "test"})
+        self.assertGreaterEqual(outer.duration, inner.duration)
+        self.assertIsNone(self.tracer.current_context())
+
+    def test_continues_remote_trace(self):
+        with self.tracer.span("remote", parent=TRACEPARENT) as span:
+            pass
+        self.assertEqual(span.context.trace_id, "4bf92f3577b34da6a3ce929d0e0e4736")
+        self.assertEqual(span.parent_id, "00f067aa0ba902b7")
+
+    def test_sampling_decision_is_inherited(self):
+        tracer = Tracer(self.exporter, sample_rate=0.5, rng=iter([0.7, 0.2]).__next__)
+        with tracer.span("dropped") as dropped:
+            with tracer.span("child"):
+                pass
+        with tracer.span("kept"):
+            pass
+
+        self.assertEqual([span.name for span in self.exporter.get_finished_spans()], ["kept"])
+        self.assertTrue(dropped.context.traceparent.endswith("-00"))
+
+        with self.tracer.span("unsampled", parent=TRACEPARENT[:-2] + "00"):
+            pass
+        self.assertEqual(self.exporter.get_finished_spans("unsampled"), [])
+
+    def test_exception_marks_span(self):
+        with self.assertRaises(RuntimeError):
+            with self.tracer.span("failing"):
+                raise RuntimeError("broker down")
+
+        span = self.exporter.get_finished_spans()[0]
+        self.assertEqual(span.status, "error")
+        self.assertEqual(span.attributes["exception.message"], "broker down")
+
+    def test_parse_traceparent(self):
+        context = parse_traceparent(TRACEPARENT)
+        self.assertEqual((context.span_id, context.sampled), ("00f067aa0ba902b7", True))
+        self.assertEqual(context.traceparent, TRACEPARENT)
+        for value in (None, "", "01-" + TRACEPARENT[3:], TRACEPARENT.upper(), TRACEPARENT + "-x"):
+            self.assertIsNone(parse_traceparent(value))
+
+    def test_build_tracer(self):
+        self.assertIsInstance(build_tracer(), NoopTracer)
+        with override_settings(EMQX_TRACING_ENABLED=True, EMQX_TRACING_EXPORTER="tests.test_tracing.CustomExporter"):
+            self.assertIsInstance(build_tracer().exporter, CustomExporter)
+        with override_settings(EMQX_TRACING_ENABLED=True, EMQX_TRACING_BACKEND="zipkin"):
+            with self.assertRaises(ValueError):
+                build_tracer()
+
+    def test_disabled_tracer_has_no_spans(self):
+        tracer = NoopTracer()
+        self.assertIs(tracer.span("a", topic="t"), NOOP_SPAN)
+        with tracer.span("a") as span:
+            span.set_attribute("k", 1)
+        self.assertEqual(tracer.inject({}), {})
+
+
+@unittest.skipUnless(opentelemetry_installed, "opentelemetry-api is not installed")
+class OpenTelemetryTracerTests(TestCase):
+    def test_propagates_remote_context(self):
+        tracer = OpenTelemetryTracer()
+        with tracer.span("remote", parent=TRACEPARENT, topic="t") as span:
+            span.set_attribute("k", 1)
+            carrier = tracer.inject({})
+        self.assertEqual(carrier["traceparent"].split("-")[1], "4bf92f3577b34da6a3ce929d0e0e4736")
+
+    @override_settings(EMQX_TRACING_ENABLED=True, EMQX_TRACING_BACKEND="opentelemetry")
+    def test_build_tracer(self):
+        self.assertIsInstance(build_tracer(), OpenTelemetryTracer)
+
+
+class TracedPathTests(TestCase):
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+        patcher = patch("django_emqx._tracer", Tracer(self.exporter, sample_rate=1.0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self):
+        return [span.name for span in self.exporter.get_finished_spans()]
+
+    @override_settings(EMQX_WEBHOOK_SECRET="your_webhook_secret")
+    @patch("django_emqx.mixins.get_signal_dispatcher")
+    def test_webhook_handler_is_child_of_request(self, get_signal_dispatcher):
+        user = User.objects.create_user(username="testuser", password="secret")
+        body = {"event": "client.connected", "clientid": "c1", "user_id": str(user.pk)}
+        response = APIClient().post(
+            reverse("devices-list"), body, format="json", **{"HTTP_X-Webhook-Token": "your_webhook_secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        handler, request = self.exporter.get_finished_spans()
+        self.assertEqual((handler.name, request.name), ("emqx.client_connected", "emqx.webhook"))
+        self.assertEqual(handler.parent_id, request.context.span_id)
+
+    @patch("django_emqx.mixins.firebase_installed", False)
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_dispatched_chunk_continues_submitter_trace(self, get_mqtt_client):
+        get_mqtt_client.return_value.protocol = mqtt.MQTTv311
+        users = [User.objects.create(username=f"user{i}") for i in range(2)]
+        message = Message.objects.create(title="Hello")
+        dispatcher = NotificationDispatcher(workers=1, chunk_size=10)
+
+        with get_tracer().span("send") as root:
+            dispatcher.submit(message, [user.pk for user in users])
+        dispatcher.drain()
+
+        self.assertEqual(
+            self.names(),
+            ["send", "db.insert_notifications", "mqtt.encode", "emqx.send_chunk", "emqx.dispatch_chunk"],
+        )
+        spans = {span.name: span for span in self.exporter.get_finished_spans()}
+        self.assertEqual(spans["emqx.dispatch_chunk"].parent_id, root.context.span_id)
+        self.assertEqual(spans["emqx.send_chunk"].attributes, {"message_id": message.pk, "recipients": 2})
+        self.assertEqual(spans["mqtt.encode"].parent_id, spans["emqx.send_chunk"].context.span_id)
+
+    @patch("django_emqx.mixins.firebase_installed", False)
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_inline_send(self, get_mqtt_client):
+        get_mqtt_client.return_value.protocol = mqtt.MQTTv311
+        User.objects.create(username="user")
+        NotificationSenderMixin().send_all_notifications(Message.objects.create(title="Hello"), User.objects.all())
+        self.assertEqual(self.names(), ["db.insert_notifications", "mqtt.encode", "emqx.send_all"])
+
+    @patch("django_emqx.mqtt.mqtt.Client")
+    @patch("django_emqx.mqtt.generate_backend_mqtt_token", return_value="mock_token")
+    def test_publish_carries_traceparent(self, mock_generate_token, mock_mqtt_client):
+        client = MQTTClient(broker="test_broker", protocol=mqtt.MQTTv5)
+        client.client.publish.return_value.rc = mqtt.MQTT_ERR_SUCCESS
+
+        client.publish("user/1/", "{}", user_properties={"msg_id": 5})
+
+        self.assertEqual(self.names(), ["mqtt.enqueue", "mqtt.puback", "mqtt.publish"])
+        publish = self.exporter.get_finished_spans("mqtt.publish")[0]
+        self.assertEqual(publish.attributes, {"topic": "user/1/", "qos": 1})
+        properties = client.client.publish.call_args.kwargs["properties"]
+        self.assertEqual(properties.UserProperty, [("msg_id", "5"), ("traceparent", publish.context.traceparent)])
@@ -0,0 +1,40 @@
+## tests/test_tuning.py
+
+from django.test import TestCase
+
+from django_emqx.tuning import DEFAULT_TUNING, build_tuning
+
+
+class BuildTuningTests(TestCase):
+    def test_defaults_match_emqx(self):
+        self.assertEqual(build_tuning(), DEFAULT_TUNING)
+
+    def test_profile_values(self):
+        tuning = build_tuning("large-fanout")
+        self.assertEqual(tuning["tcp_buffer"], "16KB")
+        self.assertEqual(tuning["acceptors"], DEFAULT_TUNING["acceptors"])
+
+    def test_values_derived_from_connections_and_cores(self):
+        tuning = build_tuning("high-churn", connections=100000, cores=8)
+
+        self.assertEqual(tuning["max_connections"], 120000)
+        self.assertEqual(tuning["max_conn_rate"], "10000/s")
+        self.assertEqual(tuning["acceptors"], 32)
+        self.assertEqual(tuning["webhook_pool_size"], 64)
+
+    def test_overrides_win(self):
+        tuning = build_tuning("small", cores=8, overrides={"acceptors": 2, "tcp_buffer": None})
+        self.assertEqual(tuning["acceptors"], 2)
+        self.assertEqual(tuning["tcp_buffer"], "4KB")
+
+    def test_invalid_values(self):
+        for kwargs in (
+            {"profile": "huge"},
+            {"connections": 0},
+            {"overrides": {"acceptors": 0}},
+            {"overrides": {"tcp_buffer": "4 kilobytes"}},
+            {"overrides": {"max_conn_rate": "fast"}},
+            {"overrides": {"max_connections": -1}},
+        ):
+            with self.assertRaises(ValueError):
+                build_tuning(**kwargs)
@@ -0,0 +1,66 @@
+## tests/test_usercache.py
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from django_emqx.usercache import UserIdCache
+
+User = get_user_model()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class UserIdCacheTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.users = [User.objects.create_user(username=f"user{i}", password="test") for i in range(3)]
+        self.cache = UserIdCache(maxsize=2, ttl=60, clock=self.clock)
+
+    def test_exists_queries_only_on_miss(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.cache.exists(self.users[0].id))
+            self.assertTrue(self.cache.exists(self.users[0].id))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_missing_users_are_not_cached(self):
+        with self.assertNumQueries(2):
+            self.assertFalse(self.cache.exists(9999))
+            self.assertFalse(self.cache.exists(9999))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_id_is_evicted(self):
+        first, second, third = (user.id for user in self.users)
+        self.cache.exists(first)
+        self.cache.exists(second)
+        self.cache.exists(first)
+        self.cache.exists(third)
+
+        self.assertEqual(list(self.cache._entries), [first, third])
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.exists(self.users[0].id)
+        self.clock.now += 61
+
+        with self.assertNumQueries(1):
+            self.assertTrue(self.cache.exists(self.users[0].id))
+
+    def test_zero_size_disables_cache(self):
+        cache = UserIdCache(maxsize=0, ttl=60, clock=self.clock)
+        with self.assertNumQueries(2):
+            cache.exists(self.users[0].id)
+            cache.exists(self.users[0].id)
+
+    def test_saving_a_user_evicts_it(self):
+        from django_emqx import get_user_cache
+
+        cache = get_user_cache()
+        cache.exists(self.users[0].id)
+        self.users[0].save()
+
+        self.assertNotIn(self.users[0].id, cache)
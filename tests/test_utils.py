@@ -1,6 +1,12 @@
+import base64
+import json
 import unittest
 from unittest.mock import patch, MagicMock
+import paho.mqtt.client as mqtt
+from django.test import override_settings
+from django_emqx.compression import decompress, maybe_compress
 from django_emqx.utils import (
+    encode_mqtt_payload,
     generate_backend_mqtt_token,
     generate_mqtt_access_token,
     send_mqtt_message,
@@ -54,8 +60,94 @@ class TestUtils(unittest.TestCase):
         mock_recipient = MagicMock(id=123)
         mock_json_dumps.return_value = '{"msg_id": "1", "title": "Test", "body": "Message", "data": "Data"}'
         message = MagicMock()
+        message.remaining_ttl.return_value = None
         send_mqtt_message(mock_recipient, message)
-        mqtt_client.publish.assert_called_with("user/123/", '{"msg_id": "1", "title": "Test", "body": "Message", "data": "Data"}', qos = 1)
+        mqtt_client.publish.assert_called_with("user/123/", '{"msg_id": "1", "title": "Test", "body": "Message", "data": "Data"}', qos = 1, expiry_interval=None)
+
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_send_mqtt_message_passes_remaining_ttl(self, mock_get_mqtt_client):
+        mqtt_client = MagicMock()
+        mock_get_mqtt_client.return_value = mqtt_client
+        message = MagicMock(id=1, title="Test", body="Message", data=None)
+        message.remaining_ttl.return_value = 30
+        send_mqtt_message(123, message)
+        self.assertEqual(mqtt_client.publish.call_args.kwargs["expiry_interval"], 30)
+
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_send_mqtt_message_v5_metadata(self, mock_get_mqtt_client):
+        mqtt_client = MagicMock(protocol=mqtt.MQTTv5)
+        mock_get_mqtt_client.return_value = mqtt_client
+        message = MagicMock(id=7, title="Test", body="Message", data=None)
+        message.remaining_ttl.return_value = None
+        send_mqtt_message(123, message)
+
+        args, kwargs = mqtt_client.publish.call_args
+        self.assertEqual(args[0], "user/123/")
+        self.assertEqual(json.loads(args[1]), {"title": "Test", "body": "Message", "data": ""})
+        self.assertEqual(kwargs["user_properties"], {"msg_id": 7})
+        self.assertEqual(kwargs["content_type"], "application/json")
+
+        message.data = {"blob": "x" * 4000}
+        with override_settings(EMQX_COMPRESSION_THRESHOLD=1024):
+            send_mqtt_message(123, message)
+
+        args, kwargs = mqtt_client.publish.call_args
+        self.assertEqual(kwargs["user_properties"], {"msg_id": 7, "content_encoding": "zlib"})
+        self.assertEqual(kwargs["content_type"], "application/zlib")
+        self.assertEqual(json.loads(decompress(args[1], "zlib"))["data"], {"blob": "x" * 4000})
+
+    @override_settings(EMQX_COMPRESSION_THRESHOLD=1024)
+    def test_encode_mqtt_payload_compresses_large_payloads(self):
+        message = MagicMock(id=7, title="Test", body="Message", data={"blob": "x" * 4000})
+
+        payload, user_properties = encode_mqtt_payload(message)
+        envelope = json.loads(payload)
+        self.assertIsNone(user_properties)
+        self.assertEqual(envelope["msg_id"], 7)
+        self.assertEqual(envelope["encoding"], "zlib")
+        content = json.loads(decompress(base64.b64decode(envelope["payload"]), "zlib"))
+        self.assertEqual(content["data"], {"blob": "x" * 4000})
+
+        payload, user_properties = encode_mqtt_payload(message, v5=True)
+        self.assertEqual(user_properties, {"msg_id": 7, "content_encoding": "zlib"})
+        self.assertEqual(json.loads(decompress(payload, "zlib"))["data"], {"blob": "x" * 4000})
+
+    @override_settings(EMQX_COMPRESSION_THRESHOLD=1024)
+    def test_encode_mqtt_payload_small_payload_uncompressed(self):
+        message = MagicMock(id=7, title="Test", body="Message", data=None)
+        payload, _ = encode_mqtt_payload(message)
+        self.assertEqual(json.loads(payload), {"msg_id": 7, "title": "Test", "body": "Message", "data": ""})
+
+    @override_settings(EMQX_COMPRESSION_THRESHOLD=1024)
+    @patch("django_emqx.utils.maybe_compress", wraps=maybe_compress)
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_send_mqtt_message_compresses_once_per_message(self, mock_get_mqtt_client, mock_compress):
+        message = MagicMock(id=7, title="Test", body="Message", data={"blob": "x" * 4000})
+        message.remaining_ttl.return_value = None
+        for recipient_id in range(3):
+            send_mqtt_message(recipient_id, message)
+
+        mock_compress.assert_called_once()
+        payloads = {call.args[1] for call in mock_get_mqtt_client.return_value.publish.call_args_list}
+        self.assertEqual(len(payloads), 1)
+
+    @override_settings(EMQX_COLLAPSE_RETAINED=True)
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_send_mqtt_message_collapse_key_retained(self, mock_get_mqtt_client):
+        message = MagicMock(id=1, title="Test", body="Message", data=None, collapse_key="unread")
+        message.remaining_ttl.return_value = None
+        send_mqtt_message(123, message)
+
+        args, kwargs = mock_get_mqtt_client.return_value.publish.call_args
+        self.assertEqual(args[0], "user/123/collapse/unread")
+        self.assertTrue(kwargs["retain"])
+
+    @patch("django_emqx.utils.get_mqtt_client")
+    def test_send_mqtt_message_skips_expired(self, mock_get_mqtt_client):
+        message = MagicMock()
+        message.remaining_ttl.return_value = 0
+        send_mqtt_message(MagicMock(id=123), message)
+        mock_get_mqtt_client.return_value.publish.assert_not_called()
 
     @patch("django_emqx.utils.messaging.send")
     def test_send_firebase_notification(self, mock_send):
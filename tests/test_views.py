@@ -1,15 +1,23 @@
 ## tests/test_views.py
 
-from django.test import TestCase
+import json
+import time
+from datetime import timedelta
+
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.http import http_date
 
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, force_authenticate
 from rest_framework import status
+from rest_framework.response import Response
 
 from unittest.mock import patch
 
 from django_emqx.models import EMQXDevice, Message, Notification
+from django_emqx.views import device_webhook
 from django_emqx.signals import emqx_device_connected, new_emqx_device_connected, emqx_device_disconnected
 from django.dispatch import Signal
 from django.test import override_settings
@@ -35,6 +43,53 @@ class NotificationViewSetTests(TestCase):
         self.assertEqual(response.json()[0]["title"], "Test Title")
         self.assertEqual(response.json()[0]["body"], "Test Body")
 
+    def test_list_notifications_hides_expired(self):
+        expired = Message.objects.create(title="Expired", expires_at=timezone.now() - timedelta(seconds=1))
+        Notification.objects.create(message=expired, recipient=self.user)
+
+        response = self.client.get(reverse("notifications-list"), format="json")
+
+        self.assertEqual([n["title"] for n in response.json()], ["Test Title"])
+
+    def test_list_notifications_not_modified(self):
+        url = reverse("notifications-list")
+        response = self.client.get(url, format="json")
+        etag = response.headers["ETag"]
+        self.assertNotIn("Last-Modified", response.headers)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_list_notifications_ignores_if_modified_since(self):
+        url = reverse("notifications-list")
+        second = Message.objects.create(title="Second", created_by=self.user)
+        Notification.objects.create(message=second, recipient=self.user)
+        self.client.get(url, format="json")
+
+        # Deleting a row leaves the latest timestamp unchanged
+        self.notification.delete()
+        response = self.client.get(url, format="json", HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([n["title"] for n in response.json()], ["Second"])
+
+    def test_list_notifications_etag_changes(self):
+        url = reverse("notifications-list")
+        etag = self.client.get(url, format="json").headers["ETag"]
+
+        self.notification.acknowledge()
+        response = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        etag = response.headers["ETag"]
+        second = Message.objects.create(title="Second", created_by=self.user)
+        Notification.objects.create(message=second, recipient=self.user)
+        response = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 2)
+
 
 class EMQXTokenViewSetTests(TestCase):
     def setUp(self):
@@ -87,6 +142,81 @@ class EMQXDeviceViewSetTests(TestCase):
         self.assertEqual(len(response.json()), 1)
         self.assertEqual(response.json()[0]["client_id"], "test_client_id")
 
+    def test_list_devices_scoped_to_user(self):
+        other = User.objects.create_user(username="other", password="otherpassword")
+        EMQXDevice.objects.create(client_id="other_client_id", user=other)
+
+        url = reverse("devices-list")
+        response = self.client.get(url, format="json")
+        self.assertEqual([d["client_id"] for d in response.json()], ["test_client_id"])
+
+        response = self.client.get(url, {"scope": "all"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url, {"scope": "all"}, format="json")
+        self.assertEqual(len(response.json()), 2)
+
+    def test_list_devices_filters(self):
+        EMQXDevice.objects.create(client_id="offline_client_id", user=self.user, active=False, last_status="offline")
+        url = reverse("devices-list")
+
+        response = self.client.get(url, {"active": "false"}, format="json")
+        self.assertEqual([d["client_id"] for d in response.json()], ["offline_client_id"])
+
+        response = self.client.get(url, {"last_status": "online"}, format="json")
+        self.assertEqual([d["client_id"] for d in response.json()], ["test_client_id"])
+
+        response = self.client.get(url, {"last_status": "sleeping"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_devices_keyset_pagination(self):
+        for i in range(4):
+            EMQXDevice.objects.create(client_id=f"client_{i}", user=self.user)
+        url = reverse("devices-list")
+
+        response = self.client.get(url, {"limit": 2}, format="json")
+        first_page = response.json()
+        self.assertEqual(len(first_page), 2)
+        self.assertIn('rel="next"', response.headers["Link"])
+
+        response = self.client.get(url, {"limit": 2, "after": first_page[-1]["id"]}, format="json")
+        second_page = response.json()
+        self.assertEqual(len(second_page), 2)
+        self.assertGreater(second_page[0]["id"], first_page[-1]["id"])
+
+        response = self.client.get(url, {"limit": 2, "after": second_page[-1]["id"]}, format="json")
+        self.assertEqual(len(response.json()), 1)
+        self.assertNotIn("Link", response.headers)
+
+    def test_export_devices(self):
+        url = reverse("devices-export")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["client_id"], "test_client_id")
+        self.assertEqual(json.loads(lines[0])["user"], self.user.id)
+
+    def test_list_devices_not_modified(self):
+        url = reverse("devices-list")
+        etag = self.client.get(url, format="json").headers["ETag"]
+
+        response = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        EMQXDevice.objects.filter(pk=self.device.pk).delete()
+        response = self.client.get(url, format="json", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
+
     @patch("django_emqx.views.EMQXDeviceViewSet.handle_client_connected")
     def test_webhook_client_connected(self, mock_handle_client_connected):
         url = reverse("devices-list")  # Updated to match the new basename
@@ -159,6 +289,58 @@ class EMQXDeviceViewSetTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.json(), {"error": "Unknown event"})
 
+    def test_webhook_session_subscribed(self):
+        url = reverse("devices-list")
+        headers = {"HTTP_X-Webhook-Token": "your_webhook_secret"}
+        data = {
+            "event": "session.subscribed",
+            "clientid": "test_client_id",
+            "user_id": str(self.user.id),
+            "topic": f"user/{self.user.id}/#",
+            "qos": 1,
+        }
+        with self.settings(EMQX_WEBHOOK_SECRET="your_webhook_secret"):
+            response = self.client.post(url, data, format="json", **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(list(self.device.subscriptions.values_list("topic", "qos")), [(f"user/{self.user.id}/#", 1)])
+
+            data["event"] = "session.unsubscribed"
+            response = self.client.post(url, data, format="json", **headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(self.device.subscriptions.exists())
+
+    def test_webhook_session_subscribed_missing_topic(self):
+        url = reverse("devices-list")
+        data = {
+            "event": "session.subscribed",
+            "clientid": "test_client_id",
+            "user_id": str(self.user.id),
+        }
+        headers = {"HTTP_X-Webhook-Token": "your_webhook_secret"}
+        with self.settings(EMQX_WEBHOOK_SECRET="your_webhook_secret"):
+            response = self.client.post(url, data, format="json", **headers)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {"error": "Invalid data"})
+
+    def test_webhook_session_subscribed_invalid_qos(self):
+        url = reverse("devices-list")
+        headers = {"HTTP_X-Webhook-Token": "your_webhook_secret"}
+        for qos in ("high", 3, [1]):
+            data = {
+                "event": "session.subscribed",
+                "clientid": "test_client_id",
+                "user_id": str(self.user.id),
+                "topic": f"user/{self.user.id}/#",
+                "qos": qos,
+            }
+            with self.settings(EMQX_WEBHOOK_SECRET="your_webhook_secret"):
+                response = self.client.post(url, data, format="json", **headers)
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json(), {"error": "Invalid data"})
+        self.assertFalse(self.device.subscriptions.exists())
+
     def test_webhook_backend_user(self):
         url = reverse("devices-list")
         data = {
@@ -250,3 +432,96 @@ class EMQXDeviceViewSetTests(TestCase):
             signal.disconnect(handler.handler)
         self.assertTrue(handler.called, f"Signal {signal} was not sent.")
         print(f"Signal {signal} sent with args: {handler.signal_args}")  # Debugging output
+
+
+@override_settings(EMQX_WEBHOOK_SECRET="your_webhook_secret")
+class DeviceWebhookFastPathTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+
+    def post(self, body, token="your_webhook_secret"):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        request = self.factory.post("/api/devices/", body, content_type="application/json", HTTP_X_WEBHOOK_TOKEN=token)
+        return device_webhook(request)
+
+    def test_client_connected_creates_device(self):
+        response = self.post({"event": "client.connected", "clientid": "fast", "user_id": str(self.user.id)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"status":"success"}')
+        self.assertTrue(EMQXDevice.objects.filter(client_id="fast", user=self.user, active=True).exists())
+
+    def test_invalid_token(self):
+        response = self.post({"event": "client.connected"}, token="your_webhook_secreT")
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(json.loads(response.content), {"error": "Forbidden"})
+
+    def test_invalid_json_and_data(self):
+        self.assertEqual(json.loads(self.post("invalid_json").content), {"error": "Invalid JSON"})
+        self.assertEqual(json.loads(self.post([1, 2]).content), {"error": "Invalid data"})
+
+    @override_settings(EMQX_WEBHOOK_MAX_BODY_SIZE=64)
+    def test_rejects_large_bodies(self):
+        response = self.post({"event": "client.connected", "clientid": "x" * 100, "user_id": str(self.user.id)})
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(EMQXDevice.objects.exists())
+
+    def test_other_methods_use_the_viewset(self):
+        request = self.factory.get("/api/devices/")
+        force_authenticate(request, user=self.user)
+
+        response = device_webhook(request)
+
+        self.assertEqual(response.status_code, 200)
+
+
+class ListFastPathTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="testuser", password="testpassword")
+        self.client.force_authenticate(user=self.user)
+        # Non-ASCII, line separators and missing values must be rendered like DRF does
+        texts = [("Grüße", "Zeile\u2028zwei \"quoted\" \\ 😀"), ("Plain", None), ("", "\x00\x1f")]
+        for index, (title, body) in enumerate(texts):
+            message = Message.objects.create(title=title, body=body, created_by=self.user)
+            notification = Notification.objects.create(message=message, recipient=self.user)
+            if index == 0:
+                notification.acknowledge()
+        now = timezone.now()
+        EMQXDevice.objects.create(client_id="dévice-1", user=self.user, active=True, last_connected_at=now)
+        EMQXDevice.objects.create(client_id="device-2", user=self.user, last_connected_at=now.replace(microsecond=0))
+        EMQXDevice.objects.create(client_id="device-3", user=self.user)
+
+    def get_both(self, url, **params):
+        with override_settings(EMQX_LIST_FAST_PATH=False):
+            serialized = self.client.get(url, params)
+        with override_settings(EMQX_LIST_FAST_PATH=True):
+            fast = self.client.get(url, params)
+        return serialized, fast
+
+    def test_notifications_are_byte_compatible(self):
+        serialized, fast = self.get_both(reverse("notifications-list"))
+
+        self.assertEqual(fast.status_code, 200)
+        self.assertNotIsInstance(fast, Response)
+        self.assertIsInstance(serialized, Response)
+        self.assertEqual(fast.content, serialized.content)
+        self.assertEqual(fast["Content-Type"], serialized["Content-Type"])
+        self.assertEqual(len(json.loads(fast.content)), 3)
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_devices_are_byte_compatible(self):
+        serialized, fast = self.get_both(reverse("devices-list"))
+
+        self.assertEqual(fast.content, serialized.content)
+        self.assertEqual(fast["ETag"], serialized["ETag"])
+
+    def test_device_pagination_matches(self):
+        serialized, fast = self.get_both(reverse("devices-list"), limit=2)
+
+        self.assertEqual(fast.content, serialized.content)
+        self.assertEqual(fast["Link"], serialized["Link"])